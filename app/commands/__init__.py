@@ -0,0 +1,158 @@
+"""
+Sistema de Tickets - Comandos CLI
+Tareas de mantenimiento: flask --app main <grupo> <comando>
+"""
+
+import os
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy.schema import CreateColumn
+from app.models import User, UserType, db
+from app.utils.rollups import SalesRollups
+from app.utils.sketches import BuyerSketches
+from app.utils.leaderboard import SalesLeaderboard
+from app.utils.sessions import session_store
+from app.utils.signing import SigningKeys
+from app.utils.dataset import DatabaseSink, DatasetGenerator, LoadDataSink
+
+rollups_cli = AppGroup('rollups', help='Sales rollup maintenance')
+sessions_cli = AppGroup('sessions', help='Refresh-token session maintenance')
+jwt_cli = AppGroup('jwt', help='JWT signing key management')
+dataset_cli = AppGroup('dataset', help='Synthetic data for benchmarks')
+schema_cli = AppGroup('schema', help='Schema upgrades for existing databases')
+
+
+@rollups_cli.command('backfill')
+@click.option('--company-id', type=int, default=None, help='Only rebuild this company')
+@click.option('--batch-size', type=int, default=5000, show_default=True)
+def backfill_rollups(company_id, batch_size):
+    """Rebuild hourly and daily sales rollups and leaderboards from order items"""
+    processed = SalesRollups.backfill(company_id, batch_size)
+    SalesLeaderboard.backfill(company_id, batch_size)
+    db.session.commit()
+    click.echo(f'✅ Rollups and leaderboards rebuilt from {processed} order items')
+
+
+@rollups_cli.command('sketches')
+@click.option('--company-id', type=int, default=None, help='Only rebuild this company')
+@click.option('--batch-size', type=int, default=5000, show_default=True)
+def backfill_sketches(company_id, batch_size):
+    """Rebuild distinct-buyer sketches from orders"""
+    if company_id:
+        company_ids = [company_id]
+    else:
+        company_ids = [row.id for row in db.session.query(User.id).filter_by(user_type=UserType.COMPANY)]
+
+    processed = 0
+    for company in company_ids:
+        processed += BuyerSketches.backfill(company, batch_size)
+        db.session.commit()
+    click.echo(f'✅ Buyer sketches rebuilt for {len(company_ids)} companies from {processed} order items')
+
+
+@sessions_cli.command('purge')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+def purge_sessions(batch_size):
+    """Delete expired and revoked refresh-token sessions in chunks"""
+    deleted = session_store().purge(batch_size)
+    click.echo(f'✅ {deleted} expired or revoked sessions deleted')
+
+
+@jwt_cli.command('rotate')
+@click.option('--now', 'immediate', is_flag=True, help='Sign with the new key immediately (skips the publish lead)')
+def rotate_signing_key(immediate):
+    """Create a new RS256/EdDSA signing key (run from cron every JWT_KEY_ROTATION_DAYS)"""
+    key = SigningKeys.generate() if immediate else SigningKeys.rotate()
+    click.echo(f'✅ Key {key.kid} ({key.algorithm}) signs from {key.activates_at:%Y-%m-%d %H:%M} UTC, retires {key.retires_at:%Y-%m-%d}')
+
+
+@schema_cli.command('upgrade')
+def upgrade_schema():
+    """Add tables, columns and indexes missing from an existing database and lowercase emails (idempotent)"""
+    engine = db.engine
+    db.create_all()
+    inspector = db.inspect(engine)
+    changes = []
+    for table in db.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                # create_all no altera tablas existentes: columnas nuevas con ALTER TABLE
+                with engine.begin() as conn:
+                    conn.execute(db.text(
+                        f'ALTER TABLE {engine.dialect.identifier_preparer.format_table(table)} '
+                        f'ADD COLUMN {CreateColumn(column).compile(dialect=engine.dialect)}'
+                    ))
+                changes.append(f'column {table.name}.{column.name}')
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(engine)
+                changes.append(f'index {index.name}')
+
+    # Los emails se guardan en minúsculas (User.normalize_email); se comparan en binario por la collation de MySQL
+    with engine.begin() as conn:
+        lowered = conn.execute(db.update(User).where(
+            db.cast(User.email, db.LargeBinary) != db.cast(db.func.lower(User.email), db.LargeBinary)
+        ).values(email=db.func.lower(User.email))).rowcount
+    if lowered:
+        changes.append(f'{lowered} emails lowercased')
+
+    for change in changes:
+        click.echo(f'  {change}')
+    click.echo(f'✅ Schema up to date ({len(changes)} changes)')
+
+
+@dataset_cli.command('generate')
+@click.option('--companies', type=click.IntRange(1), default=100, show_default=True)
+@click.option('--events', type=click.IntRange(1), default=2000, show_default=True)
+@click.option('--customers', type=click.IntRange(1), default=20000, show_default=True)
+@click.option('--tickets', type=click.IntRange(0), default=200000, show_default=True, help='Tickets sold across all events')
+@click.option('--seed', type=int, default=1, show_default=True)
+@click.option('--skew', type=float, default=1.1, show_default=True, help='Zipf exponent for hot events, big promoters and repeat buyers')
+@click.option('--max-event-tickets', type=int, default=60000, show_default=True)
+@click.option('--anchor-date', type=click.DateTime(['%Y-%m-%d']), default=None, help='Date the data set is built around (default today)')
+@click.option('--batch-size', type=int, default=10000, show_default=True)
+@click.option('--tsv-dir', type=click.Path(file_okay=False), default=None, help='Write LOAD DATA files and load.sql here instead of inserting')
+@click.option('--rollups', is_flag=True, help='Rebuild rollups, leaderboards and buyer sketches afterwards')
+def generate_dataset(companies, events, customers, tickets, seed, skew, max_event_tickets, anchor_date, batch_size, tsv_dir, rollups):
+    """Add a large, skewed synthetic data set (all passwords unusable) to the database"""
+    generator = DatasetGenerator(companies, events, customers, tickets, seed=seed, skew=skew,
+                                 max_event_tickets=max_event_tickets, batch_size=batch_size, anchor=anchor_date)
+    sink = DatabaseSink(db.engine)
+    if tsv_dir:
+        # Los ids continúan tras los de la base de datos configurada, donde se cargarán los ficheros
+        start_ids = sink.next_ids()
+        sink.close()
+        sink = LoadDataSink(tsv_dir, start_ids)
+
+    started = time.perf_counter()
+    counts = generator.run(sink)
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    for table, count in counts.items():
+        click.echo(f'  {table:<13} {count:>12,}')
+    click.echo(f'✅ {total:,} rows in {elapsed:.1f}s ({total / elapsed * 60 / 1e6:.2f}M rows/min)')
+
+    if tsv_dir:
+        click.echo(f'Load with: mysql --local-infile=1 <database> < {os.path.join(tsv_dir, "load.sql")}')
+    elif rollups:
+        SalesRollups.backfill(None, batch_size)
+        SalesLeaderboard.backfill(None, batch_size)
+        db.session.commit()
+        for company in [row.id for row in db.session.query(User.id).filter_by(user_type=UserType.COMPANY)]:
+            BuyerSketches.backfill(company, batch_size)
+            db.session.commit()
+        click.echo('✅ Rollups, leaderboards and buyer sketches rebuilt')
+    else:
+        click.echo('Dashboards read rollups: run flask rollups backfill && flask rollups sketches')
+
+
+def init_commands(app):
+    """Register CLI command groups with app"""
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(sessions_cli)
+    app.cli.add_command(jwt_cli)
+    app.cli.add_command(dataset_cli)
+    app.cli.add_command(schema_cli)
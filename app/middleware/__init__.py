@@ -1,21 +1,66 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from limits.errors import ConfigurationError
+from limits.storage import storage_from_string
 from functools import wraps
 import re
 
-# Rate limiter instance
-limiter = None
+
+def rate_limit_key():
+    """Rate-limit per user when the request carries a valid access token, else per IP"""
+    from app.utils.auth import JWTManager
+    payload = JWTManager.request_token_payload()
+    if payload:
+        return f"user:{payload['user_id']}"
+    return f'ip:{get_remote_address()}'
+
+
+def login_account_key():
+    """Rate-limit login attempts per target account, whatever IP they come from"""
+    data = request.get_json(silent=True) or {}
+    return f"login:{str(data.get('email', '')).strip().lower()}"
+
+
+def is_scanner():
+    """Company accounts operate the gate scanners"""
+    from app.utils.auth import JWTManager
+    payload = JWTManager.request_token_payload()
+    return bool(payload) and payload.get('user_type') == 'company'
+
+
+# Rate limiter instance; storage, strategy and default limits come from RATELIMIT_* config
+limiter = Limiter(key_func=rate_limit_key)
+
+
+def rate_limit(policy, key_func=None, exempt_when=None):
+    """Apply the RATELIMIT_<POLICY> limit string; routes sharing a policy share its budget"""
+    return limiter.limit(
+        lambda: current_app.config[f'RATELIMIT_{policy}'],
+        key_func=key_func,
+        exempt_when=exempt_when,
+        scope=policy.lower()
+    )
+
 
 def init_limiter(app):
     """Initialize rate limiter with app"""
-    global limiter
-    limiter = Limiter(
-        key_func=get_remote_address,
-        storage_uri='memory://',  # Force memory storage
-        default_limits=["100 per minute", "1000 per hour"]
-    )
+    # RATELIMIT_STORAGE_URL es el nombre histórico; Flask-Limiter lee RATELIMIT_STORAGE_URI
+    storage_uri = app.config.get('RATELIMIT_STORAGE_URI') or app.config.get('RATELIMIT_STORAGE_URL', 'memory://')
+    try:
+        storage_from_string(storage_uri)
+    except ConfigurationError as e:
+        # Falta el cliente (p. ej. el paquete redis): contadores en memoria por proceso
+        app.logger.warning('Rate limit storage %s unavailable (%s); using memory://', storage_uri, e)
+        storage_uri = 'memory://'
+    app.config['RATELIMIT_STORAGE_URI'] = storage_uri
     limiter.init_app(app)
+    
+    @app.errorhandler(429)
+    def rate_limit_exceeded(error):
+        # Las cabeceras X-RateLimit-* y Retry-After las añade Flask-Limiter
+        return jsonify({'error': 'Too many requests', 'details': str(error.description)}), 429
+    
     return limiter
 
 def validate_request_data(schema_class):
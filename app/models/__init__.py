@@ -1,13 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 from datetime import datetime
 from enum import Enum
-import bcrypt
 import random
 import string
 import base64
 import os
+from app.utils.replicas import RoutingSession
+from app.utils.passwords import PasswordHasher
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class UserType(Enum):
     CUSTOMER = 'customer'
@@ -49,6 +51,7 @@ class User(db.Model):
     avatar_url = db.Column(db.String(500), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
     email_verified = db.Column(db.Boolean, default=False)
+    invited_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)  # Empresa que importó la cuenta
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -58,13 +61,18 @@ class User(db.Model):
     events = db.relationship('Event', backref='company', lazy=True, cascade='all, delete-orphan')
     payment_methods = db.relationship('PaymentMethod', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    @validates('email')
+    def normalize_email(self, key, email):
+        """Store emails lowercased so lookups can compare the indexed column as-is"""
+        return email.strip().lower() if email else email
+    
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=12)).decode('utf-8')
+        self.password_hash = PasswordHasher.hash(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return PasswordHasher.verify(password, self.password_hash)
     
     def to_dict(self, include_sensitive=False):
         """Convert user to dictionary"""
@@ -103,6 +111,7 @@ class UserSession(db.Model):
     
     __table_args__ = (
         db.Index('idx_user_expires', 'user_id', 'expires_at'),
+        db.Index('idx_session_expires', 'expires_at'),
     )
 
 
@@ -220,6 +229,10 @@ class OrderItem(db.Model):
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_order_event_type', 'order_id', 'event_id', 'ticket_type_id'),
+    )
 
 
 class Ticket(db.Model):
@@ -244,12 +257,14 @@ class Ticket(db.Model):
     status = db.Column(db.Enum(TicketStatus), default=TicketStatus.VALID)
     used_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     validations = db.relationship('TicketValidation', backref='ticket', lazy=True, cascade='all, delete-orphan')
     
     __table_args__ = (
         db.Index('idx_order_status', 'order_id', 'status'),
+        db.Index('idx_event_updated', 'event_id', 'updated_at'),
     )
 
     @staticmethod
@@ -303,3 +318,89 @@ class TicketValidation(db.Model):
     __table_args__ = (
         db.Index('idx_ticket_date', 'ticket_id', 'validated_at'),
     )
+
+
+class SalesRollupMixin:
+    """Columns shared by the hourly and daily sales rollups"""
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
+    ticket_type_id = db.Column(db.Integer, db.ForeignKey('ticket_types.id'), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    tickets_sold = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SalesRollupHourly(SalesRollupMixin, db.Model):
+    __tablename__ = 'sales_rollup_hourly'
+    
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'event_id', 'ticket_type_id', 'bucket', name='uq_rollup_hourly_key'),
+        db.Index('idx_rollup_hourly_company_bucket', 'company_id', 'bucket'),
+    )
+
+
+class SalesRollupDaily(SalesRollupMixin, db.Model):
+    __tablename__ = 'sales_rollup_daily'
+    
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'event_id', 'ticket_type_id', 'bucket', name='uq_rollup_daily_key'),
+        db.Index('idx_rollup_daily_company_bucket', 'company_id', 'bucket'),
+    )
+
+
+class LeaderboardEntry(db.Model):
+    """All-time sales score of one member (event, ticket type or city) of a company"""
+    __tablename__ = 'sales_leaderboard'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)
+    member = db.Column(db.String(255), nullable=False)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    tickets_sold = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'dimension', 'member', name='uq_leaderboard_member'),
+        db.Index('idx_leaderboard_revenue', 'company_id', 'dimension', 'revenue'),
+        db.Index('idx_leaderboard_tickets', 'company_id', 'dimension', 'tickets_sold'),
+    )
+
+
+class BuyerSketch(db.Model):
+    """HyperLogLog sketch of the distinct buyers of one event on one day"""
+    __tablename__ = 'buyer_sketches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)
+    registers = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'event_id', 'bucket', name='uq_buyer_sketch_key'),
+        db.Index('idx_buyer_sketch_company_bucket', 'company_id', 'bucket'),
+    )
+
+
+class ReplicaHeartbeat(db.Model):
+    """Single-row heartbeat written to the primary to measure replica lag"""
+    __tablename__ = 'replica_heartbeat'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    beat_at = db.Column(db.DateTime, nullable=False)
+
+
+class SigningKey(db.Model):
+    """Asymmetric JWT signing key, published in the JWKS until it retires"""
+    __tablename__ = 'jwt_signing_keys'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kid = db.Column(db.String(64), unique=True, nullable=False)
+    algorithm = db.Column(db.String(10), nullable=False)
+    private_key = db.Column(db.Text, nullable=False)  # PEM PKCS8
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    activates_at = db.Column(db.DateTime, nullable=False)
+    retires_at = db.Column(db.DateTime, nullable=False)
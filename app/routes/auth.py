@@ -2,35 +2,51 @@ from flask import Blueprint, request, jsonify
 from flask_cors import CORS
 from app.models import User, db, UserType
 from app.utils.auth import JWTManager, jwt_required
-from app.schemas.schemas import UserRegistrationSchema, UserLoginSchema
-from app.middleware import validate_request_data
+from app.utils.identity import IdentityCache
+from app.utils.passwords import PasswordHasher, PasswordHasherBusy, UNUSABLE_PASSWORD
+from app.utils.blocklist import TokenBlocklist
+from app.schemas.schemas import UserRegistrationSchema, UserLoginSchema, AcceptInviteSchema
+from app.middleware import login_account_key, rate_limit, validate_request_data
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 # Activar CORS en todos los endpoints de este blueprint
 CORS(auth_bp)
 
+def hasher_busy_response():
+    """503 for when the password hashing pool is saturated"""
+    response = jsonify({'error': 'Too many password operations in progress, retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit('REGISTER')
 @validate_request_data(UserRegistrationSchema)
 def register():
     """Register new user or company"""
     data = request.validated_data
     
     # Check if user already exists
-    existing_user = User.query.filter_by(email=data['email']).first()
-    if existing_user:
+    email = data['email'].strip().lower()
+    existing_user = User.query.filter_by(email=email).first()
+    # Una invitación sin aceptar no bloquea al dueño del email: al registrarse reclama la cuenta y la invitación caduca
+    claims_invite = existing_user is not None and existing_user.invited_by_id is not None \
+        and existing_user.password_hash == UNUSABLE_PASSWORD
+    if existing_user and not claims_invite:
         return jsonify({'error': 'Email already registered'}), 409
     
-    # Create new user
-    user = User(
-        email=data['email'],
-        first_name=data['firstName'],
-        last_name=data['lastName'],
-        user_type=UserType.CUSTOMER if data['userType'] == 'customer' else UserType.COMPANY,
-        phone=data.get('phone'),
-        company_name=data.get('companyName') if data['userType'] == 'company' else None
-    )
+    # Create new user (or take over the unaccepted invite)
+    user = existing_user or User(email=email)
+    user.first_name = data['firstName']
+    user.last_name = data['lastName']
+    user.user_type = UserType.CUSTOMER if data['userType'] == 'customer' else UserType.COMPANY
+    user.phone = data.get('phone')
+    user.company_name = data.get('companyName') if data['userType'] == 'company' else None
+    user.invited_by_id = None
     
-    user.set_password(data['password'])
+    try:
+        user.set_password(data['password'])
+    except PasswordHasherBusy:
+        return hasher_busy_response()
     
     try:
         db.session.add(user)
@@ -50,20 +66,74 @@ def register():
         db.session.rollback()
         return jsonify({'error': 'Registration failed', 'details': str(e)}), 500
 
+@auth_bp.route('/accept-invite', methods=['POST'])
+@rate_limit('REGISTER')
+@validate_request_data(AcceptInviteSchema)
+def accept_invite():
+    """Set the password of an account created by a guest import"""
+    data = request.validated_data
+    
+    payload = JWTManager.decode_token(data['token'], 'invite')
+    if not payload:
+        return jsonify({'error': 'Invalid or expired invitation'}), 401
+    
+    user = db.session.get(User, payload['user_id'])
+    # La invitación solo vale mientras la cuenta no tenga contraseña y siga ligada a la empresa que la emitió
+    if not user or user.email != payload['email'] or user.password_hash != UNUSABLE_PASSWORD:
+        return jsonify({'error': 'Invitation already used'}), 409
+    if user.invited_by_id is None or user.invited_by_id != payload.get('company_id'):
+        return jsonify({'error': 'Invitation is no longer valid'}), 409
+    
+    if not user.is_active:
+        return jsonify({'error': 'Account is deactivated'}), 401
+    
+    try:
+        user.set_password(data['password'])
+    except PasswordHasherBusy:
+        return hasher_busy_response()
+    
+    # El token lo entrega la empresa que importó al invitado: no prueba que el email sea suyo
+    db.session.commit()
+    IdentityCache.invalidate(payload['user_id'])
+    
+    access_token, refresh_token = JWTManager.generate_tokens(user)
+    
+    return jsonify({
+        'message': 'Invitation accepted',
+        'user': user.to_dict(),
+        'token': access_token,
+        'refreshToken': refresh_token
+    }), 200
+
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('LOGIN')
+@rate_limit('LOGIN_ACCOUNT', key_func=login_account_key)
 @validate_request_data(UserLoginSchema)
 def login():
     """User login"""
     data = request.validated_data
     
     # Find user by email
-    user = User.query.filter_by(email=data['email']).first()
-    if not user or not user.check_password(data['password']):
+    user = User.query.filter_by(email=data['email'].strip().lower()).first()
+    try:
+        # Sin usuario se compara igualmente contra un hash de referencia
+        valid = PasswordHasher.verify(data['password'], user.password_hash if user else None)
+    except PasswordHasherBusy:
+        return hasher_busy_response()
+    
+    if not user or not valid:
         return jsonify({'error': 'Invalid email or password'}), 401
     
     if not user.is_active:
         return jsonify({'error': 'Account is deactivated'}), 401
     
+    # Actualizar el hash si BCRYPT_LOG_ROUNDS cambió; se guarda con la nueva sesión
+    if PasswordHasher.needs_rehash(user.password_hash):
+        try:
+            user.set_password(data['password'])
+        except PasswordHasherBusy:
+            pass  # Se reintentará en el próximo login
+    
     # Generate tokens
     access_token, refresh_token = JWTManager.generate_tokens(user)
     
@@ -84,6 +154,10 @@ def logout():
     if refresh_token:
         JWTManager.revoke_token(refresh_token)
     
+    # El access token deja de valer ya, no al expirar
+    payload = request.jwt_payload
+    TokenBlocklist.revoke(payload.get('jti'), payload['exp'])
+    
     return jsonify({'message': 'Logout successful'}), 200
 
 @auth_bp.route('/refresh-token', methods=['POST'])
@@ -118,9 +192,10 @@ def get_current_user():
 @jwt_required
 def verify_email():
     """Verify user email (placeholder for email verification)"""
-    user = request.current_user
+    user = request.current_user.load()
     user.email_verified = True
     db.session.commit()
+    IdentityCache.invalidate(request.current_user.id)
     
     return jsonify({'message': 'Email verified successfully'}), 200
 
@@ -141,11 +216,16 @@ def change_password():
     if len(new_password) < 8:
         return jsonify({'error': 'New password must be at least 8 characters'}), 400
     
-    user = request.current_user
-    if not user.check_password(current_password):
-        return jsonify({'error': 'Current password is incorrect'}), 400
+    user = request.current_user.load()
+    try:
+        if not user.check_password(current_password):
+            return jsonify({'error': 'Current password is incorrect'}), 400
+        
+        user.set_password(new_password)
+    except PasswordHasherBusy:
+        return hasher_busy_response()
     
-    user.set_password(new_password)
     db.session.commit()
+    IdentityCache.invalidate(request.current_user.id)
     
     return jsonify({'message': 'Password changed successfully'}), 200
@@ -1,16 +1,32 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from datetime import datetime, timedelta
-from app.models import Event, User, Order, OrderItem, Ticket, db
+from sqlalchemy.orm import contains_eager
+from app.models import Event, User, Order, OrderItem, Ticket, db, TicketStatus
 from app.utils.auth import jwt_required, company_required
-from app.middleware import limiter
+from app.utils.live import entry_broker
+from app.utils.rollups import SalesRollups
+from app.utils.cache import TTLCache
+from app.utils.exports import StreamingExport
+from app.utils.dashboard import CompanyDashboard
+from app.utils.cube import SalesCubeRegistry
+from app.utils.sketches import BuyerSketches
+from app.utils.leaderboard import SalesLeaderboard, DIMENSIONS as LEADERBOARD_DIMENSIONS, SCORES as LEADERBOARD_SCORES
+from app.utils.replicas import replica_reads
+from app.utils.guests import GuestImporter, GuestImportError
+from app.schemas.schemas import AnalyticsQuerySchema
+from app.middleware import validate_request_data
 
 company_bp = Blueprint('company', __name__, url_prefix='/api/company')
+
+# Total de clientes por (empresa, evento) para páginas fuera de rango
+customer_totals_cache = TTLCache(maxsize=4096, ttl=300)
 # Activar CORS en todos los endpoints de este blueprint
 CORS(company_bp)
 
 @company_bp.route('/events', methods=['GET'])
 @jwt_required
+@replica_reads
 def list_company_events():
     """List events created by the authenticated company"""
     user = request.current_user
@@ -38,23 +54,31 @@ def list_company_events():
 @company_bp.route('/customers', methods=['GET'])
 @jwt_required
 @company_required
+@replica_reads
 def get_company_customers():
     """Get customers who bought tickets for company events"""
     user = request.current_user
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 20, type=int), 20)
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 20))
     event_id = request.args.get('event_id', type=int)
     
-    # Build query to get customers
-    query = db.session.query(
-        User.id,
+    # Una fila por item de orden con los agregados del cliente como funciones ventana
+    items = db.session.query(
+        User.id.label('user_id'),
         User.first_name,
         User.last_name,
         User.email,
         User.phone,
-        db.func.count(OrderItem.id).label('total_orders'),
-        db.func.sum(OrderItem.total_price).label('total_spent'),
-        db.func.max(Order.created_at).label('last_purchase')
+        Order.id.label('order_id'),
+        Order.order_number,
+        Order.created_at,
+        OrderItem.quantity,
+        OrderItem.total_price,
+        Event.title.label('event_name'),
+        db.func.count(OrderItem.id).over(partition_by=User.id).label('total_orders'),
+        db.func.sum(OrderItem.total_price).over(partition_by=User.id).label('total_spent'),
+        db.func.max(Order.created_at).over(partition_by=User.id).label('last_purchase'),
+        db.func.dense_rank().over(order_by=User.id).label('customer_seq')
     ).join(Order, User.id == Order.user_id).join(
         OrderItem, Order.id == OrderItem.order_id
     ).join(Event, OrderItem.event_id == Event.id).filter(
@@ -62,62 +86,63 @@ def get_company_customers():
     )
     
     if event_id:
-        query = query.filter(Event.id == event_id)
+        items = items.filter(Event.id == event_id)
     
-    query = query.group_by(User.id).order_by(db.desc('total_spent'))
+    items = items.subquery()
+    ranked = db.session.query(
+        items,
+        db.func.dense_rank().over(
+            order_by=(items.c.total_spent.desc(), items.c.user_id)
+        ).label('customer_rank'),
+        db.func.max(items.c.customer_seq).over().label('total_customers')
+    ).subquery()
     
-    # Manual pagination for complex query
+    # Manual pagination on the customer rank: one query for the page, its orders and the total
     offset = (page - 1) * per_page
-    customers = query.offset(offset).limit(per_page).all()
+    rows = db.session.query(ranked).filter(
+        ranked.c.customer_rank > offset,
+        ranked.c.customer_rank <= offset + per_page
+    ).order_by(ranked.c.customer_rank, ranked.c.created_at).all()
     
-    # Get total count
-    total_count = db.session.query(
-        db.func.count(db.distinct(User.id))
-    ).join(Order, User.id == Order.user_id).join(
-        OrderItem, Order.id == OrderItem.order_id
-    ).join(Event, OrderItem.event_id == Event.id).filter(
-        Event.company_id == user.id
-    ).scalar()
+    cache_key = (user.id, event_id)
+    if rows:
+        total_count = rows[0].total_customers
+        customer_totals_cache.set(cache_key, total_count)
+    else:
+        total_count = customer_totals_cache.get(cache_key)
+        if total_count is None:
+            total_count = db.session.query(
+                db.func.count(db.distinct(Order.user_id))
+            ).join(OrderItem, Order.id == OrderItem.order_id).join(
+                Event, OrderItem.event_id == Event.id
+            ).filter(
+                Event.company_id == user.id,
+                *([Event.id == event_id] if event_id else [])
+            ).scalar()
+            customer_totals_cache.set(cache_key, total_count)
     
     customers_data = []
-    for customer in customers:
-        # Get detailed order history for this customer
-        orders = db.session.query(
-            Order.id,
-            Order.order_number,
-            Order.created_at,
-            OrderItem.quantity,
-            OrderItem.total_price,
-            Event.title.label('event_name')
-        ).join(OrderItem, Order.id == OrderItem.order_id).join(
-            Event, OrderItem.event_id == Event.id
-        ).filter(
-            Order.user_id == customer.id,
-            Event.company_id == user.id
-        ).all()
-        
-        customer_data = {
-            'id': customer.id,
-            'customerName': f"{customer.first_name} {customer.last_name}",
-            'email': customer.email,
-            'phone': customer.phone,
-            'totalOrders': customer.total_orders,
-            'totalSpent': float(customer.total_spent) if customer.total_spent else 0,
-            'lastPurchase': customer.last_purchase.isoformat() if customer.last_purchase else None,
-            'orders': []
-        }
-        
-        for order in orders:
-            customer_data['orders'].append({
-                'orderId': order.id,
-                'orderNumber': order.order_number,
-                'eventName': order.event_name,
-                'quantity': order.quantity,
-                'totalPaid': float(order.total_price),
-                'purchaseDate': order.created_at.isoformat() if order.created_at else None
+    for row in rows:
+        if not customers_data or customers_data[-1]['id'] != row.user_id:
+            customers_data.append({
+                'id': row.user_id,
+                'customerName': f"{row.first_name} {row.last_name}",
+                'email': row.email,
+                'phone': row.phone,
+                'totalOrders': row.total_orders,
+                'totalSpent': float(row.total_spent) if row.total_spent else 0,
+                'lastPurchase': row.last_purchase.isoformat() if row.last_purchase else None,
+                'orders': []
             })
         
-        customers_data.append(customer_data)
+        customers_data[-1]['orders'].append({
+            'orderId': row.order_id,
+            'orderNumber': row.order_number,
+            'eventName': row.event_name,
+            'quantity': row.quantity,
+            'totalPaid': float(row.total_price),
+            'purchaseDate': row.created_at.isoformat() if row.created_at else None
+        })
     
     total_pages = (total_count + per_page - 1) // per_page
     
@@ -136,6 +161,7 @@ def get_company_customers():
 @company_bp.route('/analytics', methods=['GET'])
 @jwt_required
 @company_required
+@replica_reads
 def get_company_analytics():
     """Get analytics for company events"""
     user = request.current_user
@@ -150,17 +176,25 @@ def get_company_analytics():
     elif period == 'year':
         days_back = 365
     else:
+        period = 'month'
         days_back = 30
     
+    # Granularidad de la serie: 'hour', 'day' o 'month'
+    granularity = request.args.get('granularity') or ('month' if period == 'year' else 'day')
+    if granularity not in ('hour', 'day', 'month'):
+        return jsonify({'error': 'granularity must be one of hour, day, month'}), 400
+    
     # Calculate date range
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days_back)
     
-    # Get company events
-    events = Event.query.filter_by(company_id=user.id).all()
-    event_ids = [e.id for e in events]
+    # Event counts in a single aggregate
+    total_events, active_events = db.session.query(
+        db.func.count(Event.id),
+        db.func.sum(db.case((Event.is_active == True, 1), else_=0))
+    ).filter(Event.company_id == user.id).one()
     
-    if not event_ids:
+    if not total_events:
         return jsonify({
             'analytics': {
                 'totalRevenue': 0,
@@ -173,74 +207,143 @@ def get_company_analytics():
             }
         }), 200
     
-    # Calculate total metrics
-    total_revenue = db.session.query(
-        db.func.sum(OrderItem.total_price)
-    ).filter(
-        OrderItem.event_id.in_(event_ids)
-    ).scalar() or 0
-    
-    total_tickets_sold = db.session.query(
-        db.func.sum(OrderItem.quantity)
-    ).filter(
-        OrderItem.event_id.in_(event_ids)
-    ).scalar() or 0
-    
-    total_events = len(events)
-    active_events = len([e for e in events if e.is_active])
-    
-    # Get top events by revenue
-    top_events = db.session.query(
-        Event.id,
-        Event.title,
-        db.func.sum(OrderItem.total_price).label('revenue'),
-        db.func.sum(OrderItem.quantity).label('tickets_sold')
-    ).join(OrderItem, Event.id == OrderItem.event_id).filter(
-        Event.company_id == user.id
-    ).group_by(Event.id).order_by(db.desc('revenue')).limit(5).all()
-    
-    top_events_data = []
-    for event in top_events:
-        top_events_data.append({
-            'eventId': event.id,
-            'eventName': event.title,
-            'revenue': float(event.revenue) if event.revenue else 0,
-            'ticketsSold': event.tickets_sold or 0
-        })
+    # Totals and time series come from the sales rollups
+    total_revenue, total_tickets_sold = SalesRollups.totals(user.id)
+    series = SalesRollups.series(user.id, start_date, end_date, granularity)
     
-    # Get period-based analytics (simplified - would need more complex grouping for real implementation)
-    period_revenue = db.session.query(
-        db.func.sum(OrderItem.total_price)
-    ).join(Order, OrderItem.order_id == Order.id).filter(
-        OrderItem.event_id.in_(event_ids),
-        Order.created_at >= start_date
-    ).scalar() or 0
-    
-    period_tickets = db.session.query(
-        db.func.sum(OrderItem.quantity)
-    ).join(Order, OrderItem.order_id == Order.id).filter(
-        OrderItem.event_id.in_(event_ids),
-        Order.created_at >= start_date
-    ).scalar() or 0
+    # Top events from the maintained leaderboard
+    top_events_data = [
+        {
+            'eventId': entry['id'],
+            'eventName': entry['name'],
+            'revenue': entry['revenue'],
+            'ticketsSold': entry['ticketsSold']
+        }
+        for entry in SalesLeaderboard.top(user.id, 'event', 'revenue', 5)
+    ]
+    
+    revenue_by_period = [
+        {'bucket': bucket.isoformat(), 'revenue': float(revenue)}
+        for bucket, revenue, _ in series
+    ]
+    tickets_by_period = [
+        {'bucket': bucket.isoformat(), 'ticketsSold': tickets_sold}
+        for bucket, _, tickets_sold in series
+    ]
     
     return jsonify({
         'analytics': {
             'totalRevenue': float(total_revenue),
             'totalTicketsSold': total_tickets_sold,
             'totalEvents': total_events,
-            'activeEvents': active_events,
+            'activeEvents': int(active_events or 0),
             'topEvents': top_events_data,
+            'revenueByPeriod': revenue_by_period,
+            'ticketsByPeriod': tickets_by_period,
             'periodAnalytics': {
                 'period': period,
-                'revenue': float(period_revenue),
-                'ticketsSold': period_tickets
+                'granularity': granularity,
+                'revenue': float(sum(revenue for _, revenue, _ in series)),
+                'ticketsSold': sum(tickets_sold for _, _, tickets_sold in series)
             }
         }
     }), 200
 
+@company_bp.route('/analytics/query', methods=['POST'])
+@jwt_required
+@company_required
+@validate_request_data(AnalyticsQuerySchema)
+@replica_reads
+def query_company_analytics():
+    """Ad-hoc group-by/filter over the company's sales cube"""
+    user = request.current_user
+    data = request.validated_data
+    
+    order_by = data.get('orderBy')
+    if order_by and order_by not in data['measures'] and order_by not in data['groupBy']:
+        return jsonify({'error': 'orderBy must be one of the requested measures or groupBy dimensions'}), 400
+    
+    try:
+        cube = SalesCubeRegistry.get(user.id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to load analytics', 'details': str(e)}), 500
+    
+    result = cube.query(
+        group_by=data['groupBy'],
+        measures=data['measures'],
+        filters=data['filters'],
+        date_from=data.get('dateFrom'),
+        date_to=data.get('dateTo'),
+        order_by=order_by,
+        limit=data['limit']
+    )
+    
+    return jsonify({
+        'query': {
+            'groupBy': data['groupBy'],
+            'measures': data['measures'],
+            'filters': data['filters']
+        },
+        'rowsScanned': len(cube),
+        **result
+    }), 200
+
+@company_bp.route('/analytics/unique-buyers', methods=['GET'])
+@jwt_required
+@company_required
+@replica_reads
+def get_unique_buyers():
+    """Distinct buyers for an event set and date range, from HyperLogLog sketches"""
+    user = request.current_user
+    
+    event_ids = request.args.getlist('event_id', type=int)
+    exact = request.args.get('exact', 'false').lower() in ('1', 'true', 'yes')
+    
+    try:
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        start = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+        end = datetime.strptime(date_to, '%Y-%m-%d') if date_to else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    result = BuyerSketches.unique_buyers(user.id, event_ids, start, end, exact=exact)
+    
+    return jsonify({
+        **result,
+        'eventIds': event_ids,
+        'dateFrom': date_from,
+        'dateTo': date_to
+    }), 200
+
+@company_bp.route('/analytics/leaderboard', methods=['GET'])
+@jwt_required
+@company_required
+@replica_reads
+def get_sales_leaderboard():
+    """Top events, ticket types or cities by all-time revenue or tickets sold"""
+    user = request.current_user
+    
+    dimension = request.args.get('dimension', 'event')
+    by = request.args.get('by', 'revenue')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    
+    if dimension not in LEADERBOARD_DIMENSIONS:
+        return jsonify({'error': 'Invalid dimension. Use event, ticketType or city'}), 400
+    if by not in LEADERBOARD_SCORES:
+        return jsonify({'error': 'Invalid ranking. Use revenue or tickets'}), 400
+    
+    return jsonify({
+        'dimension': dimension,
+        'by': by,
+        'leaderboard': SalesLeaderboard.top(user.id, dimension, by, limit)
+    }), 200
+
 @company_bp.route('/events/<int:event_id>/attendees', methods=['GET'])
 @jwt_required
 @company_required
+@replica_reads
 def get_event_attendees(event_id):
     """Get attendees list for specific event"""
     user = request.current_user
@@ -254,8 +357,11 @@ def get_event_attendees(event_id):
     per_page = min(request.args.get('per_page', 50, type=int), 50)
     
     # Get tickets for this event
+    # Orden y comprador de cada ticket en la misma consulta (sin una consulta por ticket)
     tickets_pagination = Ticket.query.filter_by(event_id=event_id).join(
         Order, Ticket.order_id == Order.id
+    ).options(
+        contains_eager(Ticket.order).joinedload(Order.user)
     ).order_by(Ticket.created_at.desc()).paginate(
         page=page,
         per_page=per_page,
@@ -299,93 +405,278 @@ def get_event_attendees(event_id):
         }
     }), 200
 
-@company_bp.route('/dashboard', methods=['GET'])
+def export_response(export, fmt, filename):
+    """Wrap a StreamingExport in a streamed download response"""
+    return Response(
+        stream_with_context(export.generate(fmt)),
+        mimetype=StreamingExport.FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}.{fmt}"',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@company_bp.route('/events/<int:event_id>/attendees/export', methods=['GET'])
 @jwt_required
 @company_required
-def get_dashboard_summary():
-    """Get dashboard summary for company"""
+@replica_reads
+def export_event_attendees(event_id):
+    """Stream every attendee of an event as CSV or NDJSON"""
     user = request.current_user
     
-    # Get basic counts
-    total_events = Event.query.filter_by(company_id=user.id).count()
-    active_events = Event.query.filter_by(company_id=user.id, is_active=True).count()
+    fmt = request.args.get('format', 'csv')
+    if fmt not in StreamingExport.FORMATS:
+        return jsonify({'error': 'Invalid format. Use csv or ndjson'}), 400
     
-    # Get recent events
-    recent_events = Event.query.filter_by(
-        company_id=user.id
-    ).order_by(Event.created_at.desc()).limit(5).all()
+    event = Event.query.filter_by(id=event_id, company_id=user.id).first()
+    if not event:
+        return jsonify({'error': 'Event not found or access denied'}), 404
     
-    recent_events_data = []
-    for event in recent_events:
-        tickets_sold = sum(tt.quantity_sold for tt in event.ticket_types)
-        recent_events_data.append({
-            'id': event.id,
-            'title': event.title,
-            'eventDate': event.event_date.isoformat(),
-            'isActive': event.is_active,
-            'ticketsSold': tickets_sold,
-            'totalTickets': event.total_tickets
-        })
+    query = db.session.query(
+        Ticket.id,
+        Ticket.ticket_number,
+        User.first_name,
+        User.last_name,
+        User.email,
+        User.phone,
+        Ticket.holder_name,
+        Ticket.seat_number,
+        Ticket.section,
+        Ticket.status,
+        Order.created_at,
+        Ticket.used_at
+    ).join(Order, Ticket.order_id == Order.id).join(
+        User, Order.user_id == User.id
+    ).filter(Ticket.event_id == event_id).order_by(Ticket.id)
+    
+    export = StreamingExport(query, [
+        ('ticketId', lambda row: row.id),
+        ('ticketNumber', lambda row: row.ticket_number),
+        ('customerName', lambda row: f"{row.first_name} {row.last_name}"),
+        ('customerEmail', lambda row: row.email),
+        ('customerPhone', lambda row: row.phone),
+        ('holderName', lambda row: row.holder_name),
+        ('seatNumber', lambda row: row.seat_number),
+        ('section', lambda row: row.section),
+        ('status', lambda row: row.status.value),
+        ('purchaseDate', lambda row: StreamingExport.isoformat(row.created_at)),
+        ('usedAt', lambda row: StreamingExport.isoformat(row.used_at))
+    ])
+    return export_response(export, fmt, f'event-{event_id}-attendees')
+
+@company_bp.route('/orders/export', methods=['GET'])
+@jwt_required
+@company_required
+@replica_reads
+def export_company_orders():
+    """Stream the company's order lines as CSV or NDJSON, optionally for one event"""
+    user = request.current_user
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in StreamingExport.FORMATS:
+        return jsonify({'error': 'Invalid format. Use csv or ndjson'}), 400
+    
+    event_id = request.args.get('event_id', type=int)
+    
+    query = db.session.query(
+        Order.id,
+        Order.order_number,
+        Order.status,
+        Order.created_at,
+        User.first_name,
+        User.last_name,
+        User.email,
+        OrderItem.event_id,
+        Event.title,
+        OrderItem.ticket_type_id,
+        OrderItem.quantity,
+        OrderItem.unit_price,
+        OrderItem.total_price
+    ).select_from(OrderItem).join(Order, OrderItem.order_id == Order.id).join(
+        User, Order.user_id == User.id
+    ).join(Event, OrderItem.event_id == Event.id).filter(Event.company_id == user.id)
     
-    # Get total revenue (simplified)
-    event_ids = [e.id for e in Event.query.filter_by(company_id=user.id).all()]
-    total_revenue = 0
-    if event_ids:
-        total_revenue = db.session.query(
-            db.func.sum(OrderItem.total_price)
-        ).filter(OrderItem.event_id.in_(event_ids)).scalar() or 0
+    if event_id:
+        query = query.filter(OrderItem.event_id == event_id)
+    
+    export = StreamingExport(query.order_by(Order.id, OrderItem.id), [
+        ('orderId', lambda row: row.id),
+        ('orderNumber', lambda row: row.order_number),
+        ('status', lambda row: row.status.value),
+        ('purchaseDate', lambda row: StreamingExport.isoformat(row.created_at)),
+        ('customerName', lambda row: f"{row.first_name} {row.last_name}"),
+        ('customerEmail', lambda row: row.email),
+        ('eventId', lambda row: row.event_id),
+        ('eventTitle', lambda row: row.title),
+        ('ticketTypeId', lambda row: row.ticket_type_id),
+        ('quantity', lambda row: row.quantity),
+        ('unitPrice', lambda row: float(row.unit_price)),
+        ('totalPrice', lambda row: float(row.total_price))
+    ])
+    return export_response(export, fmt, f'event-{event_id}-orders' if event_id else 'orders')
+
+@company_bp.route('/events/<int:event_id>/entries/stream', methods=['GET'])
+@jwt_required
+@company_required
+def stream_event_entries(event_id):
+    """Server-Sent Events stream of live entry counters for an event"""
+    user = request.current_user
+    
+    event = Event.query.filter_by(id=event_id, company_id=user.id).first()
+    if not event:
+        return jsonify({'error': 'Event not found or access denied'}), 404
+    
+    def seed():
+        # Una sola consulta por evento y proceso; luego los contadores viven en memoria
+        total, admitted = db.session.query(
+            db.func.count(Ticket.id),
+            db.func.sum(db.case((Ticket.status == TicketStatus.USED, 1), else_=0))
+        ).filter(
+            Ticket.event_id == event_id,
+            Ticket.status != TicketStatus.CANCELLED
+        ).one()
+        return total or 0, int(admitted or 0)
+    
+    entry_broker.watch(event_id, seed)
+    
+    return Response(entry_broker.stream(event_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@company_bp.route('/dashboard', methods=['GET'])
+@jwt_required
+@company_required
+def get_dashboard_summary():
+    """Get dashboard summary for company"""
+    user = request.current_user
     
     return jsonify({
-        'dashboard': {
-            'totalEvents': total_events,
-            'activeEvents': active_events,
-            'totalRevenue': float(total_revenue),
-            'recentEvents': recent_events_data
-        }
+        'dashboard': CompanyDashboard.get(user.id)
     }), 200
 
 @company_bp.route('/buyers', methods=['GET'])
 @jwt_required
+@replica_reads
 def list_company_buyers():
-    """List unique buyers for the authenticated company"""
+    """List unique buyers for the authenticated company (keyset paginated)"""
     user = request.current_user
     user_type = getattr(user.user_type, 'value', user.user_type)
     if user_type != 'company':
         return jsonify({'error': 'Unauthorized'}), 403
 
-    # Obtener IDs de eventos de la empresa
-    event_ids = [event.id for event in Event.query.filter_by(company_id=user.id).all()]
-    if not event_ids:
-        return jsonify({'buyers': []}), 200
+    per_page = max(1, min(request.args.get('per_page', 50, type=int), 100))
+    cursor = request.args.get('cursor', 0, type=int)
+
+    # Página de compradores: user_id distintos de los pedidos de la empresa, no todos los usuarios
+    buyer_ids = [buyer_id for (buyer_id,) in db.session.query(Order.user_id).join(
+        OrderItem, OrderItem.order_id == Order.id
+    ).join(Event, OrderItem.event_id == Event.id).filter(
+        Event.company_id == user.id,
+        Order.user_id > cursor
+    ).distinct().order_by(Order.user_id).limit(per_page + 1)]
+
+    has_next = len(buyer_ids) > per_page
+    buyer_ids = buyer_ids[:per_page]
 
-    # Obtener IDs de órdenes que tengan items para esos eventos
-    order_ids = db.session.query(OrderItem.order_id).filter(OrderItem.event_id.in_(event_ids)).distinct().all()
-    order_ids = [oid[0] for oid in order_ids]
+    buyers = db.session.query(
+        User.id,
+        User.first_name,
+        User.last_name,
+        User.email,
+        User.phone
+    ).filter(User.id.in_(buyer_ids)).order_by(User.id).all() if buyer_ids else []
 
-    # Obtener usuarios compradores
-    buyers = User.query.join(Order, User.id == Order.user_id).filter(Order.id.in_(order_ids)).distinct().all()
-    buyers_data = []
+    buyers_data = {}
     for buyer in buyers:
-        # Obtener todas las órdenes del comprador para eventos de la empresa
-        orders = Order.query.filter(Order.user_id == buyer.id, Order.id.in_(order_ids)).all()
-        tickets_info = []
-        for order in orders:
-            for ticket in order.tickets:
-                if ticket.event_id in event_ids:
-                    tickets_info.append({
-                        'ticketId': ticket.id,
-                        'ticketNumber': ticket.ticket_number,
-                        'eventName': ticket.event_name,
-                        'quantity': 1,
-                        'totalPaid': float(order.total_amount),
-                        'purchaseDate': order.created_at.isoformat(),
-                    })
-        buyers_data.append({
+        buyers_data[buyer.id] = {
             'id': buyer.id,
             'customerName': f"{buyer.first_name} {buyer.last_name}",
             'email': buyer.email,
             'phone': buyer.phone,
-            'tickets': tickets_info
-        })
+            'ticketsCount': 0,
+            'totalPaid': 0.0,
+            'lastPurchase': None,
+            'tickets': []
+        }
 
-    return jsonify({'buyers': buyers_data}), 200
+    if buyers_data:
+        # Precio pagado por ticket: unit_price del item de orden correspondiente
+        unit_price = db.session.query(OrderItem.unit_price).filter(
+            OrderItem.order_id == Ticket.order_id,
+            OrderItem.event_id == Ticket.event_id,
+            OrderItem.ticket_type_id == Ticket.ticket_type_id
+        ).limit(1).scalar_subquery()
+
+        tickets = db.session.query(
+            Order.user_id,
+            Ticket.id,
+            Ticket.ticket_number,
+            Ticket.event_name,
+            Order.created_at,
+            unit_price.label('unit_price')
+        ).join(Order, Ticket.order_id == Order.id).join(
+            Event, Ticket.event_id == Event.id
+        ).filter(
+            Event.company_id == user.id,
+            Order.user_id.in_(buyers_data)
+        ).order_by(Order.user_id, Ticket.id).yield_per(500)
+
+        # Agregados por comprador calculados mientras se recorre el stream
+        for row in tickets:
+            paid = float(row.unit_price) if row.unit_price is not None else 0.0
+            purchase_date = row.created_at.isoformat() if row.created_at else None
+            buyer_data = buyers_data[row.user_id]
+            buyer_data['ticketsCount'] += 1
+            buyer_data['totalPaid'] += paid
+            if purchase_date and (not buyer_data['lastPurchase'] or purchase_date > buyer_data['lastPurchase']):
+                buyer_data['lastPurchase'] = purchase_date
+            buyer_data['tickets'].append({
+                'ticketId': row.id,
+                'ticketNumber': row.ticket_number,
+                'eventName': row.event_name,
+                'quantity': 1,
+                'totalPaid': paid,
+                'purchaseDate': purchase_date,
+            })
+
+    return jsonify({
+        'buyers': list(buyers_data.values()),
+        'pagination': {
+            'perPage': per_page,
+            'hasNext': has_next,
+            'nextCursor': buyer_ids[-1] if has_next else None
+        }
+    }), 200
+
+@company_bp.route('/guests/import', methods=['POST'])
+@jwt_required
+@company_required
+def import_guests():
+    """Bulk-create customer accounts from a CSV or NDJSON guest list"""
+    upload = request.files.get('file')
+    if upload:
+        body = upload.read().decode('utf-8-sig', errors='replace')
+        name = (upload.filename or '').lower()
+        detected = 'csv' if name.endswith('.csv') else 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else None
+    else:
+        body = request.get_data(as_text=True)
+        mimetype = request.mimetype
+        detected = 'csv' if mimetype == 'text/csv' else 'ndjson' if mimetype in ('application/x-ndjson', 'application/jsonl') else None
+    fmt = request.args.get('format', detected)
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Send text/csv or application/x-ndjson, or pass format=csv|ndjson'}), 415
+    
+    try:
+        summary, results = GuestImporter.run(GuestImporter.parse(body.lstrip('\ufeff'), fmt), request.current_user.id)
+    except GuestImportError as e:
+        return jsonify({'error': 'Invalid import file', 'details': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Import failed', 'details': str(e)}), 500
+    
+    return jsonify({
+        'summary': summary,
+        'results': results
+    }), 200
@@ -1,16 +1,21 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import CORS
 from datetime import datetime
-from app.models import Event, TicketType, User, db
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Event, OrderItem, TicketType, db
 from app.utils.auth import jwt_required, company_required
+from app.utils.dashboard import CompanyDashboard
+from app.utils.replicas import replica_reads
 from app.schemas.schemas import EventCreateSchema, TicketTypeSchema
-from app.middleware import validate_request_data
+from app.middleware import rate_limit, validate_request_data
 
 events_bp = Blueprint('events', __name__, url_prefix='/api/events')
 # Activar CORS en todos los endpoints de este blueprint
 CORS(events_bp)
 
 @events_bp.route('', methods=['GET'])
+@rate_limit('CATALOG')
+@replica_reads
 def get_events():
     """Get public events list with filters"""
     page = request.args.get('page', 1, type=int)
@@ -55,8 +60,8 @@ def get_events():
         except ValueError:
             return jsonify({'error': 'Invalid date_to format'}), 400
     
-    # Order by event date
-    query = query.order_by(Event.event_date.asc())
+    # Order by event date; ticket types de toda la página en una sola consulta
+    query = query.order_by(Event.event_date.asc()).options(selectinload(Event.ticket_types))
     
     # Paginate
     events_pagination = query.paginate(
@@ -97,9 +102,14 @@ def get_events():
     }), 200
 
 @events_bp.route('/<int:event_id>', methods=['GET'])
+@rate_limit('CATALOG')
+@replica_reads
 def get_event(event_id):
     """Get specific event details"""
-    event = Event.query.filter_by(id=event_id, is_active=True).first()
+    event = Event.query.filter_by(id=event_id, is_active=True).options(
+        selectinload(Event.ticket_types),
+        joinedload(Event.company)
+    ).first()
     
     if not event:
         return jsonify({'error': 'Event not found'}), 404
@@ -122,7 +132,7 @@ def get_event(event_id):
     event_data['ticketTypes'] = ticket_types
     
     # Add company info
-    company = User.query.get(event.company_id)
+    company = event.company
     event_data['company'] = {
         'id': company.id,
         'name': company.company_name,
@@ -173,6 +183,7 @@ def create_event():
 
         db.session.add(default_ticket)
         db.session.commit()
+        CompanyDashboard.invalidate(user.id)
 
         event_data = event.to_dict()
         # Add ticket types
@@ -188,12 +199,11 @@ def create_event():
                 'benefits': ticket_type.benefits
             })
         event_data['ticketTypes'] = ticket_types
-        # Add company info
-        company = User.query.get(event.company_id)
+        # Add company info (la empresa es el usuario autenticado)
         event_data['company'] = {
-            'id': company.id,
-            'name': company.company_name,
-            'email': company.email
+            'id': user.id,
+            'name': user.company_name,
+            'email': user.email
         }
         return jsonify({
             'message': 'Event created successfully',
@@ -221,8 +231,11 @@ def delete_event(event_id):
         return jsonify({'error': 'Cannot delete event with existing orders'}), 400
     
     try:
-        db.session.delete(event)
+        # Sin pedidos no hay tickets: se borra directamente en vez de cargar la cascada tipo a tipo
+        TicketType.query.filter_by(event_id=event_id).delete(synchronize_session=False)
+        Event.query.filter_by(id=event_id).delete(synchronize_session=False)
         db.session.commit()
+        CompanyDashboard.invalidate(user.id)
         return jsonify({'message': 'Event deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -244,6 +257,7 @@ def toggle_event_status(event_id):
     
     try:
         db.session.commit()
+        CompanyDashboard.invalidate(user.id)
         status = 'activated' if event.is_active else 'deactivated'
         return jsonify({'message': f'Event {status} successfully', 'isActive': event.is_active}), 200
     except Exception as e:
@@ -293,6 +307,8 @@ def add_ticket_type(event_id):
         return jsonify({'error': 'Failed to add ticket type', 'details': str(e)}), 500
 
 @events_bp.route('/categories', methods=['GET'])
+@rate_limit('CATALOG')
+@replica_reads
 def get_categories():
     """Get list of event categories"""
     categories = db.session.query(Event.category).filter(
@@ -307,6 +323,8 @@ def get_categories():
     }), 200
 
 @events_bp.route('/cities', methods=['GET'])
+@rate_limit('CATALOG')
+@replica_reads
 def get_cities():
     """Get list of cities with events"""
     cities = db.session.query(Event.city).filter(
@@ -321,6 +339,8 @@ def get_cities():
     }), 200
 
 @events_bp.route('/featured', methods=['GET'])
+@rate_limit('CATALOG')
+@replica_reads
 def get_featured_events():
     """Get featured events (placeholder - would implement featured logic)"""
     events = Event.query.filter(
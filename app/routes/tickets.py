@@ -1,11 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_cors import CORS
-from datetime import datetime
-from app.models import Ticket, TicketValidation, User, db, TicketStatus, ValidationMethod
+from app.models import Event, Ticket, User, db, TicketStatus, ValidationMethod
 from app.utils.auth import jwt_required
 from app.utils.helpers import QRCodeGenerator
+from app.utils.scanner import ScanManifest, OfflineScanProcessor, BatchValidator, admit_ticket
+from app.utils.live import entry_broker
+from collections import Counter
 from app.schemas.schemas import TicketValidationSchema
-from app.middleware import validate_request_data
+from app.middleware import is_scanner, rate_limit, validate_request_data
 import json
 
 def validate_qr_code(qr_code):
@@ -88,7 +90,7 @@ def get_ticket_qr(ticket_id):
         return jsonify({'error': 'Ticket is not valid for QR generation'}), 400
     
     try:
-        qr_base64 = QRCodeGenerator.generate_ticket_qr(ticket)
+        qr_base64 = QRCodeGenerator.generate_ticket_qr(ticket.id, ticket.event_id, ticket.ticket_number)
         
         return jsonify({
             'qrCode': qr_base64,
@@ -120,7 +122,7 @@ def download_ticket(ticket_id):
     
     try:
         # Generate QR code first
-        qr_base64 = QRCodeGenerator.generate_ticket_qr(ticket)
+        qr_base64 = QRCodeGenerator.generate_ticket_qr(ticket.id, ticket.event_id, ticket.ticket_number)
         
         # Generate full ticket image
         ticket_image_base64 = QRCodeGenerator.generate_ticket_image(ticket, qr_base64)
@@ -135,6 +137,7 @@ def download_ticket(ticket_id):
         return jsonify({'error': 'Failed to generate ticket image', 'details': str(e)}), 500
 
 @tickets_bp.route('/validate', methods=['POST'])
+@rate_limit('SCANS', exempt_when=is_scanner)
 @jwt_required
 @validate_request_data(TicketValidationSchema)
 def validate_ticket():
@@ -156,56 +159,57 @@ def validate_ticket():
         return jsonify({'error': error}), 400
     
     # Find ticket by ticket number
-    ticket = Ticket.query.filter_by(
-        ticket_number=qr_info['ticket_number']
-    ).first()
+    row = db.session.query(Ticket, Event.company_id).join(
+        Event, Ticket.event_id == Event.id
+    ).filter(Ticket.ticket_number == str(qr_info['ticket_number'])).first()
     
-    if not ticket:
+    if not row:
         return jsonify({'error': 'Ticket not found'}), 404
     
+    ticket, company_id = row
+    event_id = ticket.event_id
+    
     # Verify this company owns the event
-    if ticket.event.company_id != user.id:
+    if company_id != user.id:
         return jsonify({'error': 'You can only validate tickets for your events'}), 403
     
-    # Check ticket status
-    if ticket.status == TicketStatus.USED:
-        return jsonify({
-            'error': 'Ticket already used',
-            'usedAt': ticket.used_at.isoformat(),
-            'ticketNumber': ticket.ticket_number
-        }), 400
-    
-    if ticket.status == TicketStatus.CANCELLED:
-        return jsonify({
-            'error': 'Ticket is cancelled',
-            'ticketNumber': ticket.ticket_number
-        }), 400
-    
-    # Validate ticket
-    ticket.status = TicketStatus.USED
-    ticket.used_at = datetime.utcnow()
-    
-    # Record validation
-    validation = TicketValidation(
-        ticket_id=ticket.id,
-        validated_by=user.id,
-        validation_method=ValidationMethod(validation_method),
-        location=location
-    )
-    
     try:
-        db.session.add(validation)
+        # Compare-and-set: solo una validación concurrente puede pasar de 'valid' a 'used'
+        used_at = None
+        if ticket.status == TicketStatus.VALID:
+            used_at = admit_ticket(ticket.id, user.id, ValidationMethod(validation_method), location)
+            if not used_at:
+                # Otra puerta ganó la carrera: recargar el estado actual del ticket
+                db.session.rollback()
+        
+        if not used_at:
+            if ticket.status == TicketStatus.CANCELLED:
+                entry_broker.publish(event_id, Counter(cancelled=1))
+                return jsonify({
+                    'error': 'Ticket is cancelled',
+                    'ticketNumber': ticket.ticket_number
+                }), 400
+            
+            entry_broker.publish(event_id, Counter(already_used=1))
+            return jsonify({
+                'error': 'Ticket already used',
+                'usedAt': ticket.used_at.isoformat() if ticket.used_at else None,
+                'ticketNumber': ticket.ticket_number
+            }), 400
+        
+        ticket_data = {
+            'ticketNumber': ticket.ticket_number,
+            'eventName': ticket.event_name,
+            'holderName': ticket.holder_name,
+            'validatedAt': used_at.isoformat(),
+            'eventDate': ticket.event_date.isoformat()
+        }
         db.session.commit()
+        entry_broker.publish(event_id, Counter(admitted=1))
         
         return jsonify({
             'message': 'Ticket validated successfully',
-            'ticket': {
-                'ticketNumber': ticket.ticket_number,
-                'eventName': ticket.event_name,
-                'holderName': ticket.holder_name,
-                'validatedAt': ticket.used_at.isoformat(),
-                'eventDate': ticket.event_date.isoformat()
-            }
+            'ticket': ticket_data
         }), 200
         
     except Exception as e:
@@ -213,6 +217,7 @@ def validate_ticket():
         return jsonify({'error': 'Failed to validate ticket', 'details': str(e)}), 500
 
 @tickets_bp.route('/batch-validate', methods=['POST'])
+@rate_limit('SCANS', exempt_when=is_scanner)
 @jwt_required
 def batch_validate_tickets():
     """Validate multiple tickets at once"""
@@ -226,16 +231,20 @@ def batch_validate_tickets():
         return jsonify({'error': 'Content-Type must be application/json'}), 400
     
     data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    
     qr_codes = data.get('qrCodes', [])
     location = data.get('location')
+    batch_limit = current_app.config['BATCH_VALIDATE_LIMIT']
     
-    if not qr_codes or len(qr_codes) > 50:  # Limit batch size
-        return jsonify({'error': 'Provide 1-50 QR codes for validation'}), 400
+    if not isinstance(qr_codes, list) or not qr_codes or len(qr_codes) > batch_limit:
+        return jsonify({'error': f'Provide 1-{batch_limit} QR codes for validation'}), 400
     
+    # Parse QR codes; los inválidos conservan su posición en los resultados
     results = []
-    
+    items = []
     for qr_code in qr_codes:
-        # Parse QR code
         qr_info, error = validate_qr_code(qr_code)
         if error:
             results.append({
@@ -245,73 +254,21 @@ def batch_validate_tickets():
             })
             continue
         
-        # Find and validate ticket
-        ticket = Ticket.query.filter_by(
-            ticket_number=qr_info['ticket_number']
-        ).first()
-        
-        if not ticket:
-            results.append({
-                'qrCode': qr_code,
-                'success': False,
-                'error': 'Ticket not found'
-            })
-            continue
-        
-        # Verify this company owns the event
-        if ticket.event.company_id != user.id:
-            results.append({
-                'qrCode': qr_code,
-                'success': False,
-                'error': 'Not your event'
-            })
-            continue
-        
-        # Check if already used
-        if ticket.status == TicketStatus.USED:
-            results.append({
-                'qrCode': qr_code,
-                'success': False,
-                'error': 'Already used',
-                'ticketNumber': ticket.ticket_number
-            })
-            continue
-        
-        # Validate ticket
-        try:
-            ticket.status = TicketStatus.USED
-            ticket.used_at = datetime.utcnow()
-            
-            validation = TicketValidation(
-                ticket_id=ticket.id,
-                validated_by=user.id,
-                validation_method=ValidationMethod.QR_SCAN,
-                location=location
-            )
-            
-            db.session.add(validation)
-            
-            results.append({
-                'qrCode': qr_code,
-                'success': True,
-                'ticketNumber': ticket.ticket_number,
-                'eventName': ticket.event_name,
-                'holderName': ticket.holder_name
-            })
-            
-        except Exception as e:
-            results.append({
-                'qrCode': qr_code,
-                'success': False,
-                'error': f'Validation failed: {str(e)}'
-            })
+        items.append({'qrCode': qr_code, 'ticketNumber': str(qr_info['ticket_number'])})
+        results.append(None)
     
     try:
+        validated, outcomes = BatchValidator.validate(user.id, items, user.id, location)
+        validated = iter(validated)
+        results = [r if r is not None else next(validated) for r in results]
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Batch validation failed', 'details': str(e)}), 500
     
+    for event_id, event_outcomes in outcomes.items():
+        entry_broker.publish(event_id, event_outcomes)
+    
     successful = sum(1 for r in results if r['success'])
     failed = len(results) - successful
     
@@ -324,3 +281,101 @@ def batch_validate_tickets():
             'failed': failed
         }
     }), 200
+
+@tickets_bp.route('/events/<int:event_id>/manifest', methods=['GET'])
+@jwt_required
+def get_scan_manifest(event_id):
+    """Download the binary ticket manifest cached by offline scanners"""
+    user = request.current_user
+    
+    if user.user_type.value != 'company':
+        return jsonify({'error': 'Only companies can download scan manifests'}), 403
+    
+    event = Event.query.filter_by(id=event_id, company_id=user.id).first()
+    if not event:
+        return jsonify({'error': 'Event not found or access denied'}), 404
+    
+    # since=<version> devuelve solo los tickets que cambiaron (manifiesto delta)
+    since = max(0, request.args.get('since', 0, type=int))
+    payload, version = ScanManifest.build(event.id, since)
+    
+    response = Response(payload, mimetype='application/octet-stream')
+    response.headers['X-Manifest-Version'] = str(version)
+    response.set_etag(payload[-32:].hex())
+    return response.make_conditional(request)
+
+@tickets_bp.route('/offline-scans', methods=['POST'])
+@rate_limit('SCANS', exempt_when=is_scanner)
+@jwt_required
+def upload_offline_scans():
+    """Ingest a batch of scans recorded while the scanner was offline"""
+    user = request.current_user
+    
+    if user.user_type.value != 'company':
+        return jsonify({'error': 'Only companies can validate tickets'}), 403
+    
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+    
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    
+    scans = data.get('scans', [])
+    batch_limit = current_app.config['OFFLINE_SCAN_BATCH_LIMIT']
+    
+    if not isinstance(scans, list) or not scans or len(scans) > batch_limit:
+        return jsonify({'error': f'Provide 1-{batch_limit} scans per upload'}), 400
+    
+    event = Event.query.filter_by(id=data.get('eventId'), company_id=user.id).first()
+    if not event:
+        return jsonify({'error': 'Event not found or access denied'}), 404
+    
+    event_id = event.id
+    results = []
+    pending = []
+    
+    for index, scan in enumerate(scans):
+        qr_code = scan.get('qrCode') if isinstance(scan, dict) else None
+        if not qr_code:
+            results.append({'index': index, 'qrCode': qr_code, 'status': 'rejected', 'error': 'Missing qrCode'})
+            continue
+        
+        qr_info, error = validate_qr_code(qr_code)
+        if error:
+            results.append({'index': index, 'qrCode': qr_code, 'status': 'rejected', 'error': error})
+            continue
+        
+        scanned_at = OfflineScanProcessor.parse_scanned_at(scan.get('scannedAt'))
+        if not scanned_at:
+            results.append({'index': index, 'qrCode': qr_code, 'status': 'rejected', 'error': 'Invalid scannedAt'})
+            continue
+        
+        pending.append({
+            'index': index,
+            'qrCode': qr_code,
+            'ticketNumber': str(qr_info['ticket_number']),
+            'scannedAt': scanned_at,
+            'location': scan.get('location') or data.get('location')
+        })
+    
+    try:
+        ingested, outcomes = OfflineScanProcessor.ingest(event_id, pending, user.id)
+        results.extend(ingested)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Offline scan upload failed', 'details': str(e)}), 500
+    
+    entry_broker.publish(event_id, outcomes)
+    
+    results.sort(key=lambda r: r['index'])
+    summary = {'total': len(results), 'admitted': 0, 'duplicate': 0, 'rejected': 0}
+    for result in results:
+        summary[result['status']] += 1
+    
+    return jsonify({
+        'message': f"Offline scans processed: {summary['admitted']} admitted, {summary['duplicate']} duplicate, {summary['rejected']} rejected",
+        'results': results,
+        'summary': summary
+    }), 200
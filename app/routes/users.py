@@ -1,7 +1,14 @@
 from flask import Blueprint, request, jsonify
+import sqlalchemy as sa
+from sqlalchemy.orm import selectinload
 from app.models import User, Ticket, Order, PaymentMethod, db, TicketStatus, OrderStatus, Event, OrderItem, TicketType
 from app.utils.auth import jwt_required
 from app.utils.helpers import QRCodeGenerator
+from app.utils.rollups import SalesRollups
+from app.utils.sketches import BuyerSketches
+from app.utils.leaderboard import SalesLeaderboard
+from app.utils.dashboard import CompanyDashboard
+from app.utils.identity import IdentityCache
 from app.schemas.schemas import UserUpdateSchema, PaymentMethodSchema
 from app.middleware import validate_request_data
 
@@ -21,7 +28,7 @@ def get_profile():
 @validate_request_data(UserUpdateSchema)
 def update_profile():
     """Update user profile"""
-    user = request.current_user
+    user = request.current_user.load()
     data = request.validated_data
     
     # Update user fields
@@ -36,6 +43,7 @@ def update_profile():
     
     try:
         db.session.commit()
+        IdentityCache.invalidate(user.id)
         return jsonify({
             'message': 'Profile updated successfully',
             'user': user.to_dict()
@@ -50,11 +58,12 @@ def get_user_tickets():
     """Get all tickets for current user"""
     user = request.current_user
 
-    # Obtener todas las órdenes del usuario (sin filtrar por estado)
-    orders = Order.query.filter_by(user_id=user.id).all()
+    # Obtener todas las órdenes del usuario (sin filtrar por estado) con sus tickets en una consulta
+    orders = Order.query.filter_by(user_id=user.id).options(selectinload(Order.tickets)).all()
 
     user_tickets = []
     for order in orders:
+        ticket_price = float(order.total_amount) / len(order.tickets) if order.tickets else 0
         for ticket in order.tickets:
             user_tickets.append({
                 'id': ticket.id,
@@ -63,7 +72,7 @@ def get_user_tickets():
                 'eventDate': ticket.event_date.isoformat(),
                 'eventLocation': ticket.event_location,
                 'quantity': 1,  # Cada ticket es individual
-                'totalPrice': float(ticket.order.total_amount) / len(ticket.order.tickets) if ticket.order.tickets else 0,
+                'totalPrice': ticket_price,
                 'purchaseDate': ticket.created_at.isoformat(),
                 'status': ticket.status.value,
                 'ticketNumber': ticket.ticket_number
@@ -84,6 +93,8 @@ def get_user_orders():
     
     orders_pagination = Order.query.filter_by(user_id=user.id).order_by(
         Order.created_at.desc()
+    ).options(
+        selectinload(Order.items).joinedload(OrderItem.event).load_only(Event.title)
     ).paginate(
         page=page,
         per_page=per_page,
@@ -155,19 +166,28 @@ def create_order():
         db.session.add(order)
         db.session.flush()  # Para obtener order.id
 
+        # Eventos y tipos de ticket de todos los items en dos consultas
+        events = {event.id: event for event in Event.query.filter(
+            Event.id.in_({item['eventId'] for item in items})
+        )}
+        ticket_types = {ticket_type.id: ticket_type for ticket_type in TicketType.query.filter(
+            TicketType.id.in_({item['ticketTypeId'] for item in items})
+        )}
+
         order_items = []
         # 2. Crear los OrderItems
         for item in items:
-            event = Event.query.get(item['eventId'])
+            event = events.get(item['eventId'])
             if not event:
                 db.session.rollback()
                 return jsonify({'error': f"Event with id {item['eventId']} not found"}), 404
 
-            ticket_type = TicketType.query.get(item['ticketTypeId'])
+            ticket_type = ticket_types.get(item['ticketTypeId'])
             if not ticket_type:
                 db.session.rollback()
                 return jsonify({'error': f"TicketType with id {item['ticketTypeId']} not found"}), 404
 
+            # Sin añadir a la sesión: se insertan todos juntos más abajo
             order_item = OrderItem(
                 order_id=order.id,
                 event_id=item['eventId'],
@@ -176,64 +196,90 @@ def create_order():
                 unit_price=item['unitPrice'],
                 total_price=item['totalPrice']
             )
-            db.session.add(order_item)
             order_items.append((order_item, event, ticket_type, item['quantity']))
 
-        db.session.flush()  # Para obtener los ids de order_items si se necesitan
+        # Un INSERT multi-fila para los items; el ORM haría uno por fila para leer cada id
+        db.session.execute(db.insert(OrderItem), [
+            {
+                'order_id': order_item.order_id,
+                'event_id': order_item.event_id,
+                'ticket_type_id': order_item.ticket_type_id,
+                'quantity': order_item.quantity,
+                'unit_price': order_item.unit_price,
+                'total_price': order_item.total_price
+            }
+            for order_item, _, _, _ in order_items
+        ])
 
-        created_tickets = []
-        tickets_data = []
+        ticket_rows = []
         # 3. Crear los tickets asociados
         for order_item, event, ticket_type, quantity in order_items:
             for _ in range(quantity):
-                ticket_number = Ticket.generate_ticket_number()
-                qr_code = QRCodeGenerator.generate_ticket_qr(0, event.id, ticket_number)
-                ticket = Ticket(
-                    order_id=order.id,
-                    event_id=event.id,
-                    ticket_type_id=ticket_type.id,
-                    event_name=event.title,
-                    event_date=event.event_date,
-                    event_location=event.venue,
-                    ticket_number=ticket_number,
-                    qr_code=qr_code,
-                    status=TicketStatus.VALID,
-                    holder_name=user.first_name + " " + user.last_name,
-                    holder_email=user.email
+                ticket_rows.append({
+                    'order_id': order.id,
+                    'event_id': event.id,
+                    'ticket_type_id': ticket_type.id,
+                    'event_name': event.title,
+                    'event_date': event.event_date,
+                    'event_location': event.venue,
+                    'ticket_number': Ticket.generate_ticket_number(),
+                    # Marcador único hasta tener el id; el QR definitivo se genera después
+                    'qr_code': Ticket.generate_qr_code(),
+                    'status': TicketStatus.VALID,
+                    'holder_name': user.first_name + " " + user.last_name,
+                    'holder_email': user.email
                     # Removido: seat_number, section
-                )
-                db.session.add(ticket)
-                created_tickets.append(ticket)
+                })
             # Restar la cantidad comprada al evento
             event.available_tickets = event.available_tickets - quantity
             db.session.add(event)
+        if ticket_rows:
+            db.session.execute(db.insert(Ticket), ticket_rows)
 
-        db.session.commit()  # Ahora los tickets tienen id
+        # Rollups, ranking y sketches de compradores en la misma transacción que la orden
+        sales = [(order_item, event) for order_item, event, _, _ in order_items]
+        SalesRollups.record_order(order, sales)
+        SalesLeaderboard.record_order(order, sales)
+        BuyerSketches.record_order(order, [event for _, event, _, _ in order_items])
+        company_ids = {event.company_id for _, event, _, _ in order_items}
 
-        # 4. Generar QR y actualizar tickets
-        for ticket in created_tickets:
-            qr_code = QRCodeGenerator.generate_ticket_qr(ticket.id, ticket.event_id, ticket.ticket_number)
-            ticket.qr_code = qr_code
+        # 4. Ids de los tickets en una consulta; QR definitivos en un UPDATE por lotes
+        ticket_ids = dict(db.session.query(Ticket.ticket_number, Ticket.id).filter(Ticket.order_id == order.id))
+        tickets_data = []
+        qr_updates = []
+        for row in ticket_rows:
+            ticket_id = ticket_ids[row['ticket_number']]
+            qr_code = QRCodeGenerator.generate_ticket_qr(ticket_id, row['event_id'], row['ticket_number'])
+            qr_updates.append({'b_id': ticket_id, 'b_qr_code': qr_code})
             tickets_data.append({
-                "id": ticket.id,  # <-- Añade el id aquí
-                "ticketNumber": ticket.ticket_number,
+                "id": ticket_id,  # <-- Añade el id aquí
+                "ticketNumber": row['ticket_number'],
                 "qrCode": qr_code,
-                "eventName": ticket.event_name,
-                "eventDate": ticket.event_date.isoformat() if ticket.event_date else None,
-                "eventLocation": ticket.event_location
+                "eventName": row['event_name'],
+                "eventDate": row['event_date'].isoformat() if row['event_date'] else None,
+                "eventLocation": row['event_location']
             })
+        if qr_updates:
+            tickets = Ticket.__table__
+            db.session.execute(
+                tickets.update().where(tickets.c.id == sa.bindparam('b_id')).values(qr_code=sa.bindparam('b_qr_code')),
+                qr_updates
+            )
 
-        db.session.commit()  # Guardar los QR
+        order_data = {
+            "id": order.id,
+            "orderNumber": order.order_number,
+            "totalAmount": float(order.total_amount),
+            "status": order.status.value,
+            "createdAt": order.created_at.isoformat()
+        }
+
+        db.session.commit()
+        CompanyDashboard.invalidate(*company_ids)
 
         return jsonify({
             "message": "Order created successfully",
-            "order": {
-                "id": order.id,
-                "orderNumber": order.order_number,
-                "totalAmount": float(order.total_amount),
-                "status": order.status.value,
-                "createdAt": order.created_at.isoformat()
-            },
+            "order": order_data,
             "tickets": tickets_data
         }), 201
     except Exception as e:
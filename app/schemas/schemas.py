@@ -3,7 +3,8 @@
 Esquemas para validar datos de entrada basados en las especificaciones del README.MD
 """
 
-from marshmallow import Schema, fields, validate, validates, ValidationError
+from marshmallow import EXCLUDE, Schema, fields, validate, validates, ValidationError
+from app.utils.cube import DIMENSIONS as CUBE_DIMENSIONS, MEASURES as CUBE_MEASURES
 
 # Base validation patterns
 EMAIL_REGEX = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -118,6 +119,32 @@ class SearchEventsSchema(Schema):
     minPrice = fields.Decimal(allow_none=True, validate=validate.Range(min=0))
     maxPrice = fields.Decimal(allow_none=True, validate=validate.Range(min=0))
 
+class AnalyticsQuerySchema(Schema):
+    """Schema for ad-hoc sales analytics queries"""
+    groupBy = fields.List(fields.Str(validate=validate.OneOf(CUBE_DIMENSIONS)), missing=list, validate=validate.Length(max=4))
+    measures = fields.List(fields.Str(validate=validate.OneOf(CUBE_MEASURES)), missing=lambda: ['revenue', 'tickets'], validate=validate.Length(min=1))
+    filters = fields.Dict(keys=fields.Str(validate=validate.OneOf(CUBE_DIMENSIONS)), values=fields.List(fields.Raw(allow_none=True)), missing=dict)
+    dateFrom = fields.DateTime(allow_none=True, format='iso')
+    dateTo = fields.DateTime(allow_none=True, format='iso')
+    orderBy = fields.Str(allow_none=True, validate=validate.OneOf(CUBE_DIMENSIONS + CUBE_MEASURES))
+    limit = fields.Int(validate=validate.Range(min=1, max=1000), missing=100)
+
+class GuestImportRowSchema(Schema):
+    """Schema for one row of a company guest import (CSV or NDJSON)"""
+    class Meta:
+        unknown = EXCLUDE
+
+    email = fields.Email(required=True, validate=validate.Regexp(EMAIL_REGEX))
+    firstName = fields.Str(required=True, validate=validate.Length(min=2, max=100))
+    lastName = fields.Str(required=True, validate=validate.Length(min=2, max=100))
+    phone = fields.Str(allow_none=True, validate=validate.Regexp(PHONE_REGEX))
+    password = fields.Str(allow_none=True, validate=validate.Length(min=8))
+
+class AcceptInviteSchema(Schema):
+    """Schema for setting the password of an invited account"""
+    token = fields.Str(required=True)
+    password = fields.Str(required=True, validate=validate.Length(min=8))
+
 class PasswordChangeSchema(Schema):
     """Schema for changing password"""
     currentPassword = fields.Str(required=True)
@@ -144,5 +171,7 @@ __all__ = [
     'OrderItemSchema',
     'TicketValidationSchema',
     'SearchEventsSchema',
+    'GuestImportRowSchema',
+    'AcceptInviteSchema',
     'PasswordChangeSchema'
 ]
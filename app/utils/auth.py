@@ -9,7 +9,11 @@ from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify, current_app, g
 from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required as _jwt_required, get_jwt_identity, verify_jwt_in_request
-from app.models import User, UserSession, UserType, db
+from app.models import User, UserType, db
+from app.utils.identity import IdentityCache
+from app.utils.sessions import session_store
+from app.utils.blocklist import TokenBlocklist
+from app.utils.signing import ASYMMETRIC_ALGORITHMS, SigningKeys
 import secrets
 import hashlib
 
@@ -18,13 +22,17 @@ jwt_manager = JWTManager()
 
 def init_jwt(app):
     """Initialize JWT with Flask app"""
+    if app.config['JWT_ALGORITHM'] in ASYMMETRIC_ALGORITHMS and not SigningKeys.available():
+        # Sin cryptography no se puede firmar RS256/EdDSA: se vuelve a HS256 con JWT_SECRET_KEY
+        app.logger.warning('%s requires the cryptography package; falling back to HS256', app.config['JWT_ALGORITHM'])
+        app.config['JWT_ALGORITHM'] = 'HS256'
+    
     jwt_manager.init_app(app)
     
     @jwt_manager.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         """Check if token is revoked/blocked"""
-        # TODO: Implement token blacklist using Redis
-        return False
+        return TokenBlocklist.is_revoked(jwt_payload.get('jti'))
     
     @jwt_manager.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
@@ -51,6 +59,7 @@ class JWTManager:
             'email': user.email,
             'exp': now + current_app.config['JWT_ACCESS_TOKEN_EXPIRES'],
             'iat': now,
+            'jti': secrets.token_urlsafe(16),
             'type': 'access'
         }
         
@@ -59,44 +68,53 @@ class JWTManager:
             'user_id': user.id,
             'exp': now + current_app.config['JWT_REFRESH_TOKEN_EXPIRES'],
             'iat': now,
+            'jti': secrets.token_urlsafe(16),
             'type': 'refresh'
         }
         
-        access_token = jwt.encode(
-            access_payload, 
-            current_app.config['JWT_SECRET_KEY'], 
-            algorithm=current_app.config['JWT_ALGORITHM']
-        )
-        
-        refresh_token = jwt.encode(
-            refresh_payload, 
-            current_app.config['JWT_SECRET_KEY'], 
-            algorithm=current_app.config['JWT_ALGORITHM']
-        )
+        access_token = JWTManager.encode_token(access_payload)
+        refresh_token = JWTManager.encode_token(refresh_payload)
         
-        # Store refresh token in database
+        # Store refresh token session (base de datos o Redis según SESSION_STORE)
         token_hash = hashlib.sha256(refresh_token.encode()).hexdigest()
-        session = UserSession(
-            user_id=user.id,
-            token_hash=token_hash,
-            device_info=request.headers.get('User-Agent'),
-            ip_address=request.remote_addr,
-            expires_at=now + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+        session_store().create(
+            user.id,
+            token_hash,
+            request.headers.get('User-Agent'),
+            request.remote_addr,
+            now + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
         )
-        db.session.add(session)
         db.session.commit()
         
         return access_token, refresh_token
     
+    @staticmethod
+    def encode_token(payload):
+        """Sign a payload: HS256 with JWT_SECRET_KEY, or the current RS256/EdDSA key with its kid"""
+        algorithm = current_app.config['JWT_ALGORITHM']
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            return jwt.encode(payload, current_app.config['JWT_SECRET_KEY'], algorithm=algorithm)
+        
+        key = SigningKeys.signing_key()
+        return jwt.encode(payload, key.private, algorithm=key.algorithm, headers={'kid': key.kid})
+    
     @staticmethod
     def decode_token(token, token_type='access'):
         """Decode and validate JWT token"""
         try:
-            payload = jwt.decode(
-                token, 
-                current_app.config['JWT_SECRET_KEY'], 
-                algorithms=[current_app.config['JWT_ALGORITHM']]
-            )
+            algorithm = current_app.config['JWT_ALGORITHM']
+            if algorithm in ASYMMETRIC_ALGORITHMS:
+                # La clave la elige el kid; el algoritmo lo fija la clave, nunca la cabecera
+                key = SigningKeys.verification_key(jwt.get_unverified_header(token).get('kid'))
+                if key is None:
+                    return None
+                payload = jwt.decode(token, key.public, algorithms=[key.algorithm])
+            else:
+                payload = jwt.decode(
+                    token, 
+                    current_app.config['JWT_SECRET_KEY'], 
+                    algorithms=[algorithm]
+                )
             
             if payload.get('type') != token_type:
                 return None
@@ -114,18 +132,14 @@ class JWTManager:
         if not payload:
             return None
             
-        # Verify refresh token exists in database
+        # Verify refresh token session exists and is active
         token_hash = hashlib.sha256(refresh_token.encode()).hexdigest()
-        session = UserSession.query.filter_by(
-            token_hash=token_hash,
-            is_active=True
-        ).first()
-        
-        if not session or session.expires_at < datetime.utcnow():
+        store = session_store()
+        if store.find(token_hash) != payload['user_id']:
             return None
             
-        # Generate new access token
-        user = User.query.get(payload['user_id'])
+        # Generate new access token (principal cacheado: sin consulta en el caso común)
+        user = IdentityCache.get(payload['user_id'])
         if not user or not user.is_active:
             return None
             
@@ -136,18 +150,14 @@ class JWTManager:
             'email': user.email,
             'exp': now + current_app.config['JWT_ACCESS_TOKEN_EXPIRES'],
             'iat': now,
+            'jti': secrets.token_urlsafe(16),
             'type': 'access'
         }
         
-        access_token = jwt.encode(
-            access_payload, 
-            current_app.config['JWT_SECRET_KEY'], 
-            algorithm=current_app.config['JWT_ALGORITHM']
-        )
+        access_token = JWTManager.encode_token(access_payload)
         
-        # Update session last used
-        session.last_used_at = now
-        db.session.commit()
+        # Update session last used (se escribe en lote, sin commit por refresco)
+        store.touch(token_hash, now)
         
         return access_token
     
@@ -155,12 +165,17 @@ class JWTManager:
     def revoke_token(refresh_token):
         """Revoke refresh token"""
         token_hash = hashlib.sha256(refresh_token.encode()).hexdigest()
-        session = UserSession.query.filter_by(token_hash=token_hash).first()
-        if session:
-            session.is_active = False
-            db.session.commit()
-            return True
-        return False
+        revoked = session_store().revoke(token_hash)
+        db.session.commit()
+        return revoked
+    
+    @staticmethod
+    def request_token_payload():
+        """Decoded access token of the current request, or None; decoded once per request"""
+        if 'access_payload' not in g:
+            parts = request.headers.get('Authorization', '').split(' ')
+            g.access_payload = JWTManager.decode_token(parts[1]) if len(parts) >= 2 else None
+        return g.access_payload
 
 
 def jwt_required(f):
@@ -171,21 +186,21 @@ def jwt_required(f):
         if not auth_header:
             return jsonify({'error': 'Authorization header required'}), 401
             
-        try:
-            token = auth_header.split(' ')[1]  # Bearer <token>
-        except IndexError:
+        if len(auth_header.split(' ')) < 2:  # Bearer <token>
             return jsonify({'error': 'Invalid authorization header format'}), 401
             
-        payload = JWTManager.decode_token(token)
-        if not payload:
+        # Ya decodificado si el rate limiter lo usó para su clave
+        payload = JWTManager.request_token_payload()
+        if not payload or TokenBlocklist.is_revoked(payload.get('jti')):
             return jsonify({'error': 'Invalid or expired token'}), 401
             
-        # Get user from database
-        user = User.query.get(payload['user_id'])
+        # Principal cacheado; la fila completa se carga solo si la ruta la usa
+        user = IdentityCache.get(payload['user_id'])
         if not user or not user.is_active:
             return jsonify({'error': 'User not found or inactive'}), 401
             
         request.current_user = user
+        request.jwt_payload = payload
         return f(*args, **kwargs)
     
     return decorated_function
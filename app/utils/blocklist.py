@@ -0,0 +1,154 @@
+"""
+Sistema de Tickets - Lista de Revocación
+Revocación de access tokens por jti con filtro de Bloom local y propagación por Redis
+"""
+
+import hashlib
+import math
+import threading
+import time
+from flask import current_app
+from app.utils.cache import REDIS_ERRORS, redis_client
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings
+
+    Sized for `capacity` items at `error_rate` false positives; it never
+    gives false negatives. The k bit positions come from one blake2b digest
+    split into two 64-bit halves (Kirsch-Mitzenmacher double hashing).
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class TokenBlocklist:
+    """Revoked access-token jtis, each kept until its token's exp
+
+    The per-request check is a Bloom filter lookup; only on a hit is the
+    authoritative set consulted (a dict in this process). Revocations are
+    published to Redis when REDIS_CACHE_ENABLED is set: a sorted set
+    scored by revocation time that every worker reads at most every
+    BLOCKLIST_SYNC_SECONDS, so a token revoked in one worker is rejected by
+    the rest within that interval. Without Redis revocations only apply in
+    the worker that made them.
+    """
+
+    LOG_KEY = 'revoked_jtis'
+
+    _lock = threading.RLock()
+    _bloom = None
+    _revoked = {}
+    _synced_at = 0.0
+    _cursor = 0.0
+    _pruned_at = 0.0
+
+    @classmethod
+    def _filter(cls):
+        if cls._bloom is None:
+            with cls._lock:
+                if cls._bloom is None:
+                    cls._bloom = cls._new_filter()
+        return cls._bloom
+
+    @staticmethod
+    def _new_filter():
+        config = current_app.config
+        return BloomFilter(
+            config.get('BLOCKLIST_CAPACITY', 100000),
+            config.get('BLOCKLIST_FALSE_POSITIVE_RATE', 0.001)
+        )
+
+    @classmethod
+    def _remember(cls, jti, expires_at):
+        with cls._lock:
+            cls._revoked[jti] = expires_at
+            cls._filter().add(jti)
+
+    @classmethod
+    def _prune(cls, now):
+        """Forget expired jtis and rebuild the Bloom filter without them"""
+        with cls._lock:
+            cls._pruned_at = now
+            live = {jti: exp for jti, exp in cls._revoked.items() if exp > now}
+            if len(live) == len(cls._revoked):
+                return
+            bloom = cls._new_filter()
+            for jti in live:
+                bloom.add(jti)
+            # Sustitución atómica: los lectores ven el filtro viejo o el nuevo completo
+            cls._bloom, cls._revoked = bloom, live
+
+    @classmethod
+    def _sync(cls):
+        """Pull revocations made by other workers since the last sync"""
+        client = redis_client()
+        if client is None:
+            return
+        try:
+            entries = client.zrangebyscore(cls.LOG_KEY, f'({cls._cursor}', '+inf', withscores=True)
+        except REDIS_ERRORS:
+            return
+        for member, revoked_at in entries:
+            jti, _, expires_at = member.decode('utf-8').rpartition(':')
+            cls._remember(jti, float(expires_at))
+            cls._cursor = max(cls._cursor, revoked_at)
+
+    @classmethod
+    def _maybe_sync(cls):
+        now = time.time()
+        config = current_app.config
+        if now - cls._synced_at >= config.get('BLOCKLIST_SYNC_SECONDS', 1):
+            cls._synced_at = now
+            cls._sync()
+        if now - cls._pruned_at >= 60:
+            cls._prune(now)
+
+    @classmethod
+    def revoke(cls, jti, expires_at):
+        """Revoke a token id until expires_at (epoch seconds)"""
+        if not jti or expires_at <= time.time():
+            return
+        cls._remember(jti, float(expires_at))
+
+        client = redis_client()
+        if client is None:
+            return
+        now = time.time()
+        # El registro solo necesita cubrir la vida de un access token
+        horizon = now - current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()
+        try:
+            pipe = client.pipeline()
+            pipe.zadd(cls.LOG_KEY, {f'{jti}:{expires_at}': now})
+            pipe.zremrangebyscore(cls.LOG_KEY, '-inf', horizon)
+            pipe.execute()
+        except REDIS_ERRORS:
+            pass
+
+    @classmethod
+    def is_revoked(cls, jti):
+        """True when the token id has been revoked and has not expired yet"""
+        if not jti:
+            return False
+        cls._maybe_sync()
+        if jti not in cls._filter():
+            return False
+        expires_at = cls._revoked.get(jti)
+        return expires_at is not None and expires_at > time.time()
@@ -0,0 +1,87 @@
+"""
+Sistema de Tickets - Caché
+Caché en memoria por proceso con TTL por entrada y expulsión LRU
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+try:
+    import redis
+except ImportError:  # Redis es opcional: sin él las cachés son solo por proceso
+    redis = None
+
+_MISSING = object()
+_redis_clients = {}
+# Errores de Redis que degradan a la caché local en lugar de fallar la petición
+REDIS_ERRORS = (redis.RedisError,) if redis is not None else ()
+
+
+class TTLCache:
+    """Small thread-safe in-process cache with per-entry TTL and LRU eviction"""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value, or default when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value for ttl seconds (defaults to the cache TTL)"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Drop one entry if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+def redis_connection():
+    """Shared Redis client for REDIS_URL, or None when the redis package is not installed"""
+    if redis is None:
+        return None
+
+    config = current_app.config
+    url = config['REDIS_URL']
+    client = _redis_clients.get(url)
+    if client is None:
+        client = _redis_clients[url] = redis.Redis.from_url(
+            url,
+            password=config.get('REDIS_PASSWORD'),
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        )
+    return client
+
+
+def redis_client():
+    """Redis client for shared caches when REDIS_CACHE_ENABLED is set, else None"""
+    if not current_app.config.get('REDIS_CACHE_ENABLED'):
+        return None
+    return redis_connection()
@@ -0,0 +1,367 @@
+"""
+Sistema de Tickets - Cubo de Analíticas
+Snapshot columnar en memoria de las ventas por empresa para consultas ad-hoc
+"""
+
+import threading
+import time
+from array import array
+from calendar import timegm
+from datetime import date, datetime
+from collections import defaultdict
+from flask import current_app
+from app.models import Event, Order, OrderItem, OrderStatus, TicketType, db
+from app.utils.cache import TTLCache
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él las consultas recorren las columnas en Python
+    np = None
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+DIMENSIONS = ('event', 'category', 'city', 'ticketType', 'weekday', 'hour', 'day', 'month')
+MEASURES = ('revenue', 'tickets', 'orders')
+
+
+class SalesCube:
+    """Columnar snapshot of one company's order items
+
+    Dimensions are dictionary-encoded into int32 code columns and measures
+    are stored as flat numeric columns (array.array buffers, which NumPy
+    reads without copying). Queries filter and group with vectorized
+    bincounts over the combined dimension codes when NumPy is installed and
+    fall back to a single Python pass otherwise.
+
+    New order items are appended by id. Ids are assigned at INSERT but
+    become visible at COMMIT, so a lower id can commit after a higher one
+    was read. Refreshing therefore reads every id above the floor: the
+    highest appended id whose purchase is older than
+    ANALYTICS_CUBE_RESCAN_SECONDS. Items bought inside that window are
+    remembered by id and skipped when read again. Cubes are rebuilt from
+    scratch when they expire from the registry, which picks up later
+    status changes, event edits and transactions longer than the window.
+    """
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self.labels = {dim: [] for dim in DIMENSIONS}
+        self.codes = {dim: {} for dim in DIMENSIONS}
+        self.columns = {dim: array('i') for dim in DIMENSIONS}
+        self.revenue = array('d')
+        self.tickets = array('d')
+        self.order_ids = array('q')
+        self.sold_at = array('q')
+        self.floor = 0
+        self.recent = {}  # id -> sold_at de los ítems añadidos dentro de la ventana de re-lectura
+        self.refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.revenue)
+
+    def _encode(self, dim, label):
+        code = self.codes[dim].get(label)
+        if code is None:
+            code = self.codes[dim][label] = len(self.labels[dim])
+            self.labels[dim].append(label)
+        return code
+
+    def refresh(self, batch_size=10000):
+        """Append order items not in the cube yet; returns rows added
+
+        Concurrent callers do not wait: if a refresh is already running the
+        call returns 0 and the query is answered from the current snapshot.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._append_new_items(batch_size)
+        finally:
+            self._refresh_lock.release()
+
+    def _append_new_items(self, batch_size):
+        # Los ítems que salen de la ventana dejan de releerse: el suelo sube hasta ellos
+        cutoff = timegm(datetime.utcnow().utctimetuple()) - current_app.config.get('ANALYTICS_CUBE_RESCAN_SECONDS', 120)
+        recent = self.recent
+        for item_id in [item_id for item_id, sold_at in recent.items() if sold_at < cutoff]:
+            self.floor = max(self.floor, item_id)
+            del recent[item_id]
+        floor = self.floor
+
+        query = db.session.query(
+            OrderItem.id,
+            OrderItem.order_id,
+            OrderItem.event_id,
+            Event.category,
+            Event.city,
+            OrderItem.ticket_type_id,
+            TicketType.name,
+            Order.created_at,
+            OrderItem.quantity,
+            db.type_coerce(OrderItem.total_price, db.Float).label('total_price')
+        ).select_from(OrderItem).join(Order, OrderItem.order_id == Order.id).join(
+            Event, OrderItem.event_id == Event.id
+        ).join(TicketType, OrderItem.ticket_type_id == TicketType.id).filter(
+            Event.company_id == self.company_id,
+            OrderItem.id > floor,
+            Order.status.notin_([OrderStatus.REFUNDED, OrderStatus.CANCELLED])
+        ).order_by(OrderItem.id)
+
+        result = db.session.execute(
+            query.statement.execution_options(stream_results=True, yield_per=batch_size)
+        )
+
+        # Códigos ya resueltos por evento, tipo de ticket y fecha: evita re-codificar cada fila
+        event_codes = {}
+        ticket_type_codes = {}
+        date_codes = {}
+        encode = self._encode
+        columns = self.columns
+        appenders = [columns[dim].append for dim in DIMENSIONS]
+
+        added = 0
+        # El lote se lee de la base de datos sin el lock; solo se toma para añadir a las columnas
+        for batch in result.partitions():
+            with self._lock:
+                for row in batch:
+                    if row.id in recent:
+                        continue
+                    codes = event_codes.get(row.event_id)
+                    if codes is None:
+                        codes = event_codes[row.event_id] = (
+                            encode('event', row.event_id),
+                            encode('category', row.category),
+                            encode('city', row.city)
+                        )
+                    ticket_type = ticket_type_codes.get(row.ticket_type_id)
+                    if ticket_type is None:
+                        ticket_type = ticket_type_codes[row.ticket_type_id] = encode('ticketType', row.name)
+
+                    sold_at = row.created_at
+                    ordinal = sold_at.toordinal()
+                    dates = date_codes.get(ordinal)
+                    if dates is None:
+                        dates = date_codes[ordinal] = (
+                            encode('weekday', sold_at.isoweekday()),
+                            encode('day', sold_at.strftime('%Y-%m-%d')),
+                            encode('month', sold_at.strftime('%Y-%m'))
+                        )
+
+                    for append, code in zip(appenders, (
+                        codes[0], codes[1], codes[2], ticket_type,
+                        dates[0], encode('hour', sold_at.hour), dates[1], dates[2]
+                    )):
+                        append(code)
+                    self.revenue.append(row.total_price)
+                    self.tickets.append(row.quantity)
+                    self.order_ids.append(row.order_id)
+                    seconds = (ordinal - EPOCH_ORDINAL) * 86400 + sold_at.hour * 3600 + sold_at.minute * 60 + sold_at.second
+                    self.sold_at.append(seconds)
+                    if seconds >= cutoff:
+                        recent[row.id] = seconds
+                    else:
+                        floor = max(floor, row.id)
+                    added += 1
+            self.floor = floor
+        self.refreshed_at = time.monotonic()
+
+        return added
+
+    def query(self, group_by=(), measures=('revenue', 'tickets'), filters=None,
+              date_from=None, date_to=None, order_by=None, limit=100):
+        """Aggregate measures grouped by dimensions
+
+        filters maps a dimension to the list of labels to keep; date_from and
+        date_to bound the purchase time (inclusive). Returns a dict with the
+        sorted, limited `rows`, the number of `groups` and `totals`.
+        """
+        sort_key = order_by or measures[0]
+
+        with self._lock:
+            # Códigos de los valores filtrados; un valor desconocido no coincide con nada
+            code_filters = {
+                dim: [self.codes[dim][label] for label in labels if label in self.codes[dim]]
+                for dim, labels in (filters or {}).items()
+            }
+            bounds = (
+                timegm(date_from.utctimetuple()) if date_from else None,
+                timegm(date_to.utctimetuple()) if date_to else None
+            )
+            cardinalities = [max(1, len(self.labels[dim])) for dim in group_by]
+
+            aggregate = self._aggregate_numpy if np is not None else self._aggregate_python
+            keys, values, distinct_orders = aggregate(group_by, cardinalities, measures, code_filters, bounds)
+
+            if sort_key in MEASURES:
+                # Solo se decodifican las filas que se devuelven
+                selected = self._top(values[sort_key], limit)
+            else:
+                selected = range(len(keys))
+
+            rows = []
+            for index in selected:
+                row = {}
+                key = int(keys[index])
+                for dim, cardinality in reversed(list(zip(group_by, cardinalities))):
+                    key, code = divmod(key, cardinality)
+                    row[dim] = self.labels[dim][code]
+                for measure in measures:
+                    row[measure] = self._measure(measure, values[measure][index])
+                rows.append(row)
+
+        if sort_key not in MEASURES:
+            rows.sort(key=lambda row: (row[sort_key] is None, row[sort_key]))
+
+        totals = {
+            measure: self._measure(measure, values[measure].sum() if np is not None else sum(values[measure]))
+            for measure in measures
+        }
+        if 'orders' in totals:
+            # Una orden puede aparecer en varios grupos: el total se cuenta aparte
+            totals['orders'] = distinct_orders
+
+        return {
+            'rows': rows[:limit],
+            'groups': len(keys),
+            'totals': totals
+        }
+
+    @staticmethod
+    def _measure(measure, value):
+        return round(float(value), 2) if measure == 'revenue' else int(value)
+
+    @staticmethod
+    def _top(values, limit):
+        if np is not None:
+            return np.argsort(-values, kind='stable')[:limit].tolist()
+        return sorted(range(len(values)), key=values.__getitem__, reverse=True)[:limit]
+
+    def _aggregate_numpy(self, group_by, cardinalities, measures, code_filters, bounds):
+        """Return (group keys, {measure: per-group values}, distinct orders) as arrays"""
+        mask = None
+
+        def narrow(condition):
+            return condition if mask is None else mask & condition
+
+        for dim, codes in code_filters.items():
+            lookup = np.zeros(max(1, len(self.labels[dim])), dtype=bool)
+            lookup[codes] = True
+            mask = narrow(lookup[np.frombuffer(self.columns[dim], dtype=np.int32)])
+        sold_at = np.frombuffer(self.sold_at, dtype=np.int64)
+        if bounds[0] is not None:
+            mask = narrow(sold_at >= bounds[0])
+        if bounds[1] is not None:
+            mask = narrow(sold_at <= bounds[1])
+
+        def column(values, dtype):
+            data = np.frombuffer(values, dtype=dtype)
+            return data if mask is None else np.compress(mask, data)
+
+        rows = len(self) if mask is None else int(np.count_nonzero(mask))
+
+        # Clave combinada de grupo: dígitos en base a la cardinalidad de cada dimensión
+        size = 1
+        keys = None
+        for dim, cardinality in zip(group_by, cardinalities):
+            codes = column(self.columns[dim], np.int32)
+            keys = codes if keys is None else keys.astype(np.int64) * cardinality + codes
+            size *= cardinality
+        if keys is None:
+            keys = np.zeros(rows, dtype=np.int64)
+
+        if not group_by:
+            # Sin filas no hay grupo: present vacío y cada medida indexada por él queda vacía
+            present = np.zeros(1 if rows else 0, dtype=np.int64)
+            slots = present
+        elif size <= max(rows, 1 << 20):
+            present = np.flatnonzero(np.bincount(keys, minlength=size))
+            slots = present
+        else:
+            # Espacio de claves demasiado disperso para un bincount directo: compactarlo
+            present, keys = np.unique(keys, return_inverse=True)
+            size = len(present)
+            slots = slice(None)
+
+        values = {}
+        for measure, data, dtype in (('revenue', self.revenue, np.float64), ('tickets', self.tickets, np.float64)):
+            if measure in measures:
+                weights = column(data, dtype)
+                if group_by:
+                    values[measure] = np.bincount(keys, weights=weights, minlength=size)[slots]
+                else:
+                    values[measure] = np.array([weights.sum()] if rows else [])
+
+        distinct_orders = None
+        if 'orders' in measures:
+            # Pares (orden, grupo) distintos; los ítems de una orden llegan casi contiguos,
+            # así que el ordenamiento estable sobre la clave orden-primero es casi lineal
+            pairs = np.sort(column(self.order_ids, np.int64) * size + keys, kind='stable')
+            first = np.ones(len(pairs), dtype=bool)
+            np.not_equal(pairs[1:], pairs[:-1], out=first[1:])
+            values['orders'] = np.bincount(pairs[first] % size, minlength=size)[slots]
+            order_ids = pairs[first] // size
+            distinct_orders = int(np.count_nonzero(order_ids[1:] != order_ids[:-1])) + 1 if len(order_ids) else 0
+
+        return present, values, distinct_orders
+
+    def _aggregate_python(self, group_by, cardinalities, measures, code_filters, bounds):
+        """Single-pass fallback with the same return shape as _aggregate_numpy, as lists"""
+        filters = [(self.columns[dim], set(codes)) for dim, codes in code_filters.items()]
+        group_columns = [self.columns[dim] for dim in group_by]
+        revenue = defaultdict(float)
+        tickets = defaultdict(int)
+        orders = defaultdict(set)
+
+        for index in range(len(self)):
+            if any(column[index] not in codes for column, codes in filters):
+                continue
+            if bounds[0] is not None and self.sold_at[index] < bounds[0]:
+                continue
+            if bounds[1] is not None and self.sold_at[index] > bounds[1]:
+                continue
+
+            key = 0
+            for column, cardinality in zip(group_columns, cardinalities):
+                key = key * cardinality + column[index]
+            revenue[key] += self.revenue[index]
+            tickets[key] += self.tickets[index]
+            if 'orders' in measures:
+                orders[key].add(self.order_ids[index])
+
+        keys = list(revenue)
+        values = {
+            'revenue': [revenue[key] for key in keys],
+            'tickets': [tickets[key] for key in keys],
+            'orders': [len(orders[key]) for key in keys],
+        }
+        return keys, values, len(set().union(*orders.values()))
+
+
+class SalesCubeRegistry:
+    """Per-process registry of company cubes, refreshed lazily on query"""
+
+    cubes = TTLCache(maxsize=64, ttl=3600)
+    # Un lock de construcción por empresa: la primera carga de una no espera a las demás
+    _build_locks = {}
+    _build_locks_guard = threading.Lock()
+
+    @classmethod
+    def get(cls, company_id):
+        """Return an up-to-date cube for a company, building or refreshing it as needed"""
+        config = current_app.config
+        cube = cls.cubes.get(company_id)
+        if cube is None:
+            with cls._build_locks_guard:
+                build_lock = cls._build_locks.setdefault(company_id, threading.Lock())
+            with build_lock:
+                cube = cls.cubes.get(company_id)
+                if cube is None:
+                    cube = SalesCube(company_id)
+                    cube.refresh()
+                    cls.cubes.set(company_id, cube, ttl=config.get('ANALYTICS_CUBE_REBUILD_SECONDS'))
+                    with cls._build_locks_guard:
+                        cls._build_locks.pop(company_id, None)
+        elif time.monotonic() - cube.refreshed_at >= config.get('ANALYTICS_CUBE_REFRESH_SECONDS', 5):
+            cube.refresh()
+        return cube
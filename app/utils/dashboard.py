@@ -0,0 +1,82 @@
+"""
+Sistema de Tickets - Dashboard de Empresa
+Proyección cacheada del dashboard: contadores y eventos recientes en dos consultas
+"""
+
+from flask import current_app
+from app.models import Event, SalesRollupDaily, db
+from app.utils.cache import TTLCache
+
+
+class CompanyDashboard:
+    """Per-company dashboard projection with an in-process cache
+
+    The projection is built from two queries (event counters plus revenue,
+    then the recent events with their tickets sold) and served from cache
+    until a sale or an event change for the company invalidates it. Cache
+    entries also expire after DASHBOARD_CACHE_TTL seconds, which bounds how
+    stale other worker processes can be.
+    """
+
+    RECENT_EVENTS = 5
+
+    cache = TTLCache(maxsize=4096, ttl=60)
+
+    @classmethod
+    def get(cls, company_id):
+        """Return the dashboard dict for a company, building it on a cache miss"""
+        dashboard = cls.cache.get(company_id)
+        if dashboard is None:
+            dashboard = cls.build(company_id)
+            cls.cache.set(company_id, dashboard, ttl=current_app.config.get('DASHBOARD_CACHE_TTL'))
+        return dashboard
+
+    @classmethod
+    def invalidate(cls, *company_ids):
+        """Drop cached dashboards after a sale or event change"""
+        for company_id in company_ids:
+            cls.cache.delete(company_id)
+
+    @classmethod
+    def build(cls, company_id):
+        revenue = db.session.query(
+            db.func.sum(SalesRollupDaily.revenue)
+        ).filter(SalesRollupDaily.company_id == company_id).scalar_subquery()
+
+        total_events, active_events, total_revenue = db.session.query(
+            db.func.count(Event.id),
+            db.func.sum(db.case((Event.is_active.is_(True), 1), else_=0)),
+            revenue
+        ).filter(Event.company_id == company_id).one()
+
+        tickets_sold = db.session.query(
+            db.func.coalesce(db.func.sum(SalesRollupDaily.tickets_sold), 0)
+        ).filter(SalesRollupDaily.event_id == Event.id).scalar_subquery()
+
+        recent_events = db.session.query(
+            Event.id,
+            Event.title,
+            Event.event_date,
+            Event.is_active,
+            Event.total_tickets,
+            tickets_sold.label('tickets_sold')
+        ).filter(Event.company_id == company_id).order_by(
+            Event.created_at.desc()
+        ).limit(cls.RECENT_EVENTS).all()
+
+        return {
+            'totalEvents': total_events,
+            'activeEvents': int(active_events or 0),
+            'totalRevenue': float(total_revenue or 0),
+            'recentEvents': [
+                {
+                    'id': event.id,
+                    'title': event.title,
+                    'eventDate': event.event_date.isoformat(),
+                    'isActive': event.is_active,
+                    'ticketsSold': int(event.tickets_sold),
+                    'totalTickets': event.total_tickets
+                }
+                for event in recent_events
+            ]
+        }
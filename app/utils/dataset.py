@@ -0,0 +1,330 @@
+"""
+Sistema de Tickets - Datos Sintéticos
+Generador determinista de empresas, eventos, clientes, pedidos y tickets a escala para pruebas de rendimiento
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+# Ciudad: peso aproximado por población y actividad de eventos
+CITIES = {
+    'Madrid': 30, 'Barcelona': 25, 'Valencia': 10, 'Sevilla': 8, 'Málaga': 6, 'Zaragoza': 5, 'Bilbao': 5,
+    'Palma': 4, 'Las Palmas de Gran Canaria': 3, 'Alicante': 3, 'Murcia': 3, 'Granada': 3, 'A Coruña': 2,
+    'Córdoba': 2, 'Valladolid': 2, 'Vigo': 2, 'Pamplona': 2, 'San Sebastián': 2, 'Santander': 1,
+    'Salamanca': 1, 'Cádiz': 1, 'Gijón': 1, 'Vitoria-Gasteiz': 1, 'Santiago de Compostela': 1
+}
+# Categoría: (peso, precio base mínimo, máximo)
+CATEGORIES = {
+    'Concierto': (35, 25, 90), 'Teatro': (20, 15, 60), 'Deportes': (15, 20, 120), 'Festival': (10, 40, 180),
+    'Comedia': (10, 12, 35), 'Familiar': (5, 8, 25), 'Conferencia': (5, 10, 80)
+}
+VENUES = ('Estadio', 'Palacio de Deportes', 'Teatro', 'Sala', 'Auditorio', 'Recinto Ferial', 'Plaza de Toros')
+TITLES = ('Gira', 'Noche de', 'Gran Gala', 'Festival', 'Clásico', 'Estreno', 'Tributo a', 'Encuentro')
+ARTISTS = ('Los Secretos', 'Rosalía Tributo', 'La Movida', 'Orquesta Sinfónica', 'Flamenco Vivo', 'El Último Tren',
+           'Lorca', 'Sol y Sombra', 'Alhambra', 'Mediterráneo', 'Cervantes', 'La Ribera', 'Cantábrico', 'Aurora')
+COMPANY_PREFIXES = ('Producciones', 'Eventos', 'Promociones', 'Espectáculos', 'Live', 'Gestión Cultural')
+FIRST_NAMES = ('Lucía', 'Hugo', 'María', 'Martín', 'Paula', 'Daniel', 'Carmen', 'Pablo', 'Sofía', 'Alejandro',
+               'Elena', 'Javier', 'Laura', 'Diego', 'Marta', 'Adrián', 'Sara', 'Álvaro', 'Irene', 'Manuel')
+LAST_NAMES = ('García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez', 'Sánchez', 'Pérez', 'Gómez',
+              'Martín', 'Jiménez', 'Ruiz', 'Hernández', 'Díaz', 'Moreno', 'Muñoz', 'Álvarez', 'Romero', 'Navarro')
+# Tipo de entrada: (multiplicador de precio, fracción de las ventas)
+TICKET_TYPES = (('General', 1.0, 0.80), ('VIP', 2.5, 0.15), ('Palco', 5.0, 0.05))
+ORDER_QUANTITIES = ((1, 35), (2, 40), (3, 10), (4, 15))
+PAYMENT_METHODS = (('credit-card', 70), ('paypal', 20), ('apple-pay', 10))
+
+COLUMNS = {
+    'users': ('id', 'email', 'password_hash', 'user_type', 'first_name', 'last_name', 'company_name',
+              'is_active', 'email_verified', 'created_at', 'updated_at'),
+    'events': ('id', 'company_id', 'title', 'description', 'event_date', 'venue', 'address', 'city', 'country',
+               'category', 'total_tickets', 'available_tickets', 'base_price', 'is_active', 'created_at', 'updated_at'),
+    'ticket_types': ('id', 'event_id', 'name', 'price', 'quantity_available', 'quantity_sold', 'created_at'),
+    'orders': ('id', 'user_id', 'order_number', 'total_amount', 'status', 'payment_method', 'created_at', 'updated_at'),
+    'order_items': ('id', 'order_id', 'event_id', 'ticket_type_id', 'quantity', 'unit_price', 'total_price', 'created_at'),
+    'tickets': ('id', 'order_id', 'event_id', 'ticket_type_id', 'ticket_number', 'qr_code', 'event_name',
+                'event_location', 'event_date', 'holder_name', 'holder_email', 'status', 'used_at', 'created_at', 'updated_at'),
+}
+
+
+def _ts(dt):
+    # Mismo formato que guarda SQLAlchemy en SQLite, válido también para MySQL
+    return dt.isoformat(sep=' ', timespec='microseconds')
+
+
+def zipf_cum_weights(count, skew):
+    """Cumulative weights of a Zipf distribution over `count` ranks"""
+    return list(accumulate(1.0 / rank ** skew for rank in range(1, count + 1)))
+
+
+class DatabaseSink:
+    """Write rows straight through the DBAPI cursor with executemany
+
+    PyMySQL rewrites executemany INSERTs into multi-row statements; on
+    MySQL key checks are disabled for the session, since the generator
+    produces consistent keys.
+    """
+
+    def __init__(self, engine):
+        self.connection = engine.raw_connection()
+        self.dialect = engine.dialect.name
+        self.marker = '?' if engine.dialect.paramstyle == 'qmark' else '%s'
+        cursor = self.connection.cursor()
+        if self.dialect == 'sqlite':
+            cursor.execute('PRAGMA synchronous = OFF')
+        elif self.dialect == 'mysql':
+            cursor.execute('SET foreign_key_checks = 0, unique_checks = 0')
+        cursor.close()
+
+    def next_ids(self):
+        cursor = self.connection.cursor()
+        ids = {}
+        for table in COLUMNS:
+            cursor.execute(f'SELECT MAX(id) FROM {table}')
+            ids[table] = (cursor.fetchone()[0] or 0) + 1
+        cursor.close()
+        return ids
+
+    def write(self, table, rows):
+        columns = COLUMNS[table]
+        cursor = self.connection.cursor()
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([self.marker] * len(columns))})", rows
+        )
+        cursor.close()
+        self.connection.commit()
+
+    def close(self):
+        if self.dialect == 'mysql':
+            cursor = self.connection.cursor()
+            cursor.execute('SET foreign_key_checks = 1, unique_checks = 1')
+            cursor.close()
+        self.connection.close()
+
+
+class LoadDataSink:
+    """Write one tab-separated file per table plus a load.sql of LOAD DATA statements"""
+
+    def __init__(self, directory, start_ids):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.start_ids = start_ids
+        self.files = {table: open(os.path.join(self.directory, f'{table}.tsv'), 'w', encoding='utf-8') for table in COLUMNS}
+
+    def next_ids(self):
+        return dict(self.start_ids)
+
+    def write(self, table, rows):
+        self.files[table].writelines(
+            '\t'.join('\\N' if value is None else str(value) for value in row) + '\n' for row in rows
+        )
+
+    def close(self):
+        for handle in self.files.values():
+            handle.close()
+        with open(os.path.join(self.directory, 'load.sql'), 'w', encoding='utf-8') as handle:
+            handle.write('SET foreign_key_checks = 0, unique_checks = 0;\n')
+            for table, columns in COLUMNS.items():
+                path = os.path.join(self.directory, f'{table}.tsv')
+                handle.write(
+                    f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table} CHARACTER SET utf8mb4 "
+                    f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(columns)});\n"
+                )
+            handle.write('SET foreign_key_checks = 1, unique_checks = 1;\n')
+
+
+class DatasetGenerator:
+    """Generate a skewed, deterministic data set and stream it into a sink
+
+    Events are assigned to companies and tickets to events following Zipf
+    distributions, so a few promoters own most events and a few events
+    sell most tickets (capped at `max_event_tickets`); buyers are drawn
+    the same way, so there are many repeat customers. Ids are assigned
+    here, continuing after the rows already in the database, which lets
+    every table be written in batches without reading anything back.
+    The same seed, volumes and anchor date always give the same rows.
+    """
+
+    def __init__(self, companies, events, customers, tickets, seed=1, skew=1.1, max_event_tickets=60000,
+                 batch_size=10000, anchor=None):
+        self.companies = companies
+        self.events = events
+        self.customers = customers
+        self.tickets = tickets
+        self.skew = skew
+        self.max_event_tickets = max_event_tickets
+        self.batch_size = batch_size
+        self.anchor = anchor or datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        self.rng = random.Random(seed)
+        self.counts = dict.fromkeys(COLUMNS, 0)
+
+    def run(self, sink):
+        """Write every table through `sink`; returns rows written per table"""
+        ids = sink.next_ids()
+        company_ids = range(ids['users'], ids['users'] + self.companies)
+        customer_ids = range(company_ids.stop, company_ids.stop + self.customers)
+        customers = self._users(sink, company_ids, customer_ids)
+        events = self._events(sink, company_ids, ids['events'], ids['ticket_types'])
+        self._orders(sink, events, customer_ids, customers, ids)
+        sink.close()
+        return self.counts
+
+    def _write(self, sink, table, rows):
+        if rows:
+            sink.write(table, rows)
+            self.counts[table] += len(rows)
+
+    def _users(self, sink, company_ids, customer_ids):
+        """Write companies and customers; returns (name, email) of every customer by offset"""
+        rng = self.rng
+        created = _ts(self.anchor - timedelta(days=730))
+        rows = [
+            (user_id, f'empresa{user_id}@dataset.example', '!', 'COMPANY', rng.choice(FIRST_NAMES),
+             rng.choice(LAST_NAMES), f'{rng.choice(COMPANY_PREFIXES)} {rng.choice(ARTISTS)} {user_id}',
+             1, 1, created, created)
+            for user_id in company_ids
+        ]
+        self._write(sink, 'users', rows)
+
+        customers = []
+        rows = []
+        for user_id in customer_ids:
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            email = f'cliente{user_id}@dataset.example'
+            customers.append((f'{first_name} {last_name}', email))
+            rows.append((user_id, email, '!', 'CUSTOMER', first_name, last_name, None, 1, 1, created, created))
+            if len(rows) >= self.batch_size:
+                self._write(sink, 'users', rows)
+                rows = []
+        self._write(sink, 'users', rows)
+        return customers
+
+    def _allocate(self, weights):
+        """Split the ticket volume across events by weight, capped per event"""
+        sold = [0] * len(weights)
+        remaining = self.tickets
+        pending = list(range(len(weights)))
+        while remaining > 0 and pending:
+            total_weight = sum(weights[index] for index in pending)
+            given = 0
+            for index in pending:
+                share = min(self.max_event_tickets - sold[index], int(remaining * weights[index] / total_weight))
+                sold[index] += share
+                given += share
+            remaining -= given
+            pending = [index for index in pending if sold[index] < self.max_event_tickets]
+            if not given:
+                # Queda menos de una entrada por evento: una más para los de mayor peso
+                for index in sorted(pending, key=weights.__getitem__, reverse=True)[:remaining]:
+                    sold[index] += 1
+                remaining = 0
+        return sold
+
+    def _events(self, sink, company_ids, first_event_id, first_type_id):
+        """Write events and ticket types; returns per event the data its orders need"""
+        rng = self.rng
+        owners = rng.choices(company_ids, cum_weights=zipf_cum_weights(len(company_ids), self.skew), k=self.events)
+        popularity = list(range(1, self.events + 1))
+        rng.shuffle(popularity)
+        sold = self._allocate([1.0 / rank ** self.skew for rank in popularity])
+
+        cities, city_weights = zip(*CITIES.items())
+        categories, category_weights = zip(*((name, spec[0]) for name, spec in CATEGORIES.items()))
+        events, event_rows, type_rows = [], [], []
+        type_id = first_type_id
+        for offset, (company_id, event_sold) in enumerate(zip(owners, sold)):
+            event_id = first_event_id + offset
+            city = rng.choices(cities, city_weights)[0]
+            category = rng.choices(categories, category_weights)[0]
+            _, low, high = CATEGORIES[category]
+            base_price = float(rng.randint(low, high))
+            event_date = self.anchor + timedelta(days=rng.randint(-180, 365), hours=rng.choice((18, 19, 20, 21, 22)))
+            created_at = min(event_date - timedelta(days=rng.randint(20, 240)), self.anchor - timedelta(days=1))
+            capacity = max(50, event_sold, int(event_sold / rng.uniform(0.4, 1.0)))
+            title = f'{rng.choice(TITLES)} {rng.choice(ARTISTS)}'
+            venue = f'{rng.choice(VENUES)} de {city}'
+            event_rows.append((
+                event_id, company_id, title, f'{category} en {city}', _ts(event_date), venue, None, city, 'España',
+                category, capacity, capacity - event_sold, base_price, 1, _ts(created_at), _ts(created_at)
+            ))
+
+            # Reparto de ventas y aforo por tipo de entrada; el Palco solo en un tercio de los eventos
+            kinds = TICKET_TYPES if event_id % 3 == 0 else TICKET_TYPES[:2]
+            types = []
+            for position, (name, multiplier, fraction) in enumerate(kinds):
+                if position:
+                    type_sold = int(event_sold * fraction)
+                    type_capacity = max(type_sold, int(capacity * fraction))
+                else:
+                    type_sold = event_sold - sum(int(event_sold * kind[2]) for kind in kinds[1:])
+                    type_capacity = max(type_sold, capacity - sum(
+                        max(int(event_sold * kind[2]), int(capacity * kind[2])) for kind in kinds[1:]
+                    ))
+                price = round(base_price * multiplier, 2)
+                type_rows.append((type_id, event_id, name, price, type_capacity, type_sold, _ts(created_at)))
+                types.append((type_id, price, type_sold))
+                type_id += 1
+            events.append((event_id, title, venue, event_date, created_at, types))
+
+            if len(event_rows) >= self.batch_size:
+                self._write(sink, 'events', event_rows)
+                self._write(sink, 'ticket_types', type_rows)
+                event_rows, type_rows = [], []
+        self._write(sink, 'events', event_rows)
+        self._write(sink, 'ticket_types', type_rows)
+        return events
+
+    def _buyers(self, customer_ids):
+        """Endless stream of customer offsets, Zipf-skewed towards repeat buyers"""
+        cum_weights = zipf_cum_weights(len(customer_ids), self.skew)
+        offsets = range(len(customer_ids))
+        while True:
+            yield from self.rng.choices(offsets, cum_weights=cum_weights, k=self.batch_size)
+
+    def _orders(self, sink, events, customer_ids, customers, ids):
+        """Write orders, one order item each, and their tickets, in batches"""
+        rng = self.rng
+        buyers = self._buyers(customer_ids)
+        quantities, quantity_weights = zip(*ORDER_QUANTITIES)
+        methods, method_weights = zip(*PAYMENT_METHODS)
+        order_id, ticket_id = ids['orders'], ids['tickets']
+        item_id = ids['order_items']
+        orders, items, tickets = [], [], []
+
+        for event_id, title, venue, event_date, created_at, types in events:
+            event_ts = _ts(event_date)
+            window = (min(event_date, self.anchor) - created_at).total_seconds()
+            past = event_date < self.anchor
+            for type_id, price, remaining in types:
+                while remaining > 0:
+                    quantity = min(remaining, rng.choices(quantities, quantity_weights)[0])
+                    remaining -= quantity
+                    offset = next(buyers)
+                    holder_name, holder_email = customers[offset]
+                    ordered_at = _ts(created_at + timedelta(seconds=int(rng.random() * window)))
+                    total = round(price * quantity, 2)
+                    orders.append((order_id, customer_ids[offset], f'ORD-DS{order_id:010d}', total, 'COMPLETED',
+                                   rng.choices(methods, method_weights)[0], ordered_at, ordered_at))
+                    items.append((item_id, order_id, event_id, type_id, quantity, price, total, ordered_at))
+                    for _ in range(quantity):
+                        # Eventos pasados: la mayoría de las entradas se validaron en puerta
+                        used = past and rng.random() < 0.85
+                        used_at = _ts(event_date + timedelta(minutes=rng.randint(-60, 90))) if used else None
+                        tickets.append((
+                            ticket_id, order_id, event_id, type_id, f'TCK-DS{ticket_id:010d}', f'QR-DS{ticket_id:010d}',
+                            title, venue, event_ts, holder_name, holder_email, 'USED' if used else 'VALID',
+                            used_at, ordered_at, used_at or ordered_at
+                        ))
+                        ticket_id += 1
+                    order_id += 1
+                    item_id += 1
+
+                    if len(tickets) >= self.batch_size:
+                        self._flush_orders(sink, orders, items, tickets)
+                        orders, items, tickets = [], [], []
+        self._flush_orders(sink, orders, items, tickets)
+
+    def _flush_orders(self, sink, orders, items, tickets):
+        self._write(sink, 'orders', orders)
+        self._write(sink, 'order_items', items)
+        self._write(sink, 'tickets', tickets)
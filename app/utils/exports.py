@@ -0,0 +1,83 @@
+"""
+Sistema de Tickets - Exportaciones
+Exportación en streaming (CSV / NDJSON) de consultas grandes con cursor del servidor
+"""
+
+import csv
+import io
+import json
+from app.models import db
+
+# Prefijos que las hojas de cálculo interpretan como fórmulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class StreamingExport:
+    """Stream the rows of a single query as CSV or NDJSON
+
+    The query runs once with a server-side cursor (stream_results) and rows
+    are fetched in batches of `batch_size`, so memory stays flat regardless
+    of how many rows are exported. Output is flushed once per batch; the CSV
+    header is yielded before the query runs so the first byte goes out
+    immediately.
+    """
+
+    FORMATS = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    def __init__(self, query, columns, batch_size=1000):
+        """columns is a list of (header, row_to_value) pairs; values must be JSON-ready"""
+        self.query = query
+        self.columns = columns
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _csv_cell(value):
+        if value is None:
+            return ''
+        if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+            return "'" + value
+        return value
+
+    @staticmethod
+    def isoformat(value):
+        return value.isoformat() if value else None
+
+    def _batches(self):
+        result = db.session.execute(
+            self.query.statement.execution_options(stream_results=True, yield_per=self.batch_size)
+        )
+        try:
+            for batch in result.partitions():
+                yield [
+                    [get(row) for _, get in self.columns]
+                    for row in batch
+                ]
+        finally:
+            result.close()
+
+    def csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([header for header, _ in self.columns])
+        yield buffer.getvalue()
+
+        for batch in self._batches():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([self._csv_cell(value) for value in row] for row in batch)
+            yield buffer.getvalue()
+
+    def ndjson(self):
+        headers = [header for header, _ in self.columns]
+        for batch in self._batches():
+            yield ''.join(
+                json.dumps(dict(zip(headers, row)), ensure_ascii=False) + '\n'
+                for row in batch
+            )
+
+    def generate(self, fmt):
+        """Return the chunk generator for 'csv' or 'ndjson'"""
+        return self.csv() if fmt == 'csv' else self.ndjson()
@@ -0,0 +1,188 @@
+"""
+Sistema de Tickets - Importación de Invitados
+Alta masiva de clientes desde CSV o NDJSON con deduplicación, hash en paralelo e inserción por lotes
+"""
+
+import csv
+import io
+import json
+import secrets
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app.models import User, UserType, db
+from app.schemas.schemas import GuestImportRowSchema
+from app.utils.auth import JWTManager
+from app.utils.passwords import PasswordHasher, UNUSABLE_PASSWORD
+
+# Cabeceras alternativas aceptadas en CSV
+COLUMN_ALIASES = {
+    'first_name': 'firstName',
+    'last_name': 'lastName',
+    'firstname': 'firstName',
+    'lastname': 'lastName'
+}
+
+
+class GuestImportError(ValueError):
+    """Raised when the upload as a whole cannot be parsed or is too large"""
+
+
+class GuestImporter:
+    """Create customer accounts in bulk for a company's guest list
+
+    Rows are validated with GuestImportRowSchema and deduplicated by
+    lowercased email, first within the file and then against existing
+    users with one IN query per GUEST_IMPORT_BATCH emails. New users are
+    inserted with a multi-row INSERT per batch and committed batch by
+    batch. Rows that carry a password have it hashed on the bcrypt pool
+    (PasswordHasher.hash_many); rows without one get an unusable password
+    and a signed invite token, valid for GUEST_INVITE_EXPIRES, that
+    /api/auth/accept-invite exchanges for a password. Invites cost no
+    bcrypt work, which is what makes large lists import in seconds.
+    Imported users record the company in invited_by_id; the token only
+    works for that company's invite and only until the owner of the
+    email registers, which claims the account and voids the invite.
+
+    The report has one entry per input row, in order, with status
+    created, exists, duplicate or invalid.
+    """
+
+    schema = GuestImportRowSchema()
+
+    @staticmethod
+    def parse(body, fmt):
+        """Yield row dicts from a CSV or NDJSON body"""
+        if fmt == 'ndjson':
+            for number, line in enumerate(body.splitlines(), 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    raise GuestImportError(f'Line {number} is not valid JSON')
+                if not isinstance(row, dict):
+                    raise GuestImportError(f'Line {number} is not a JSON object')
+                yield row
+        elif fmt == 'csv':
+            reader = csv.DictReader(io.StringIO(body))
+            if not reader.fieldnames or 'email' not in [name.strip() for name in reader.fieldnames]:
+                raise GuestImportError('CSV header must include an email column')
+            for row in reader:
+                yield {
+                    COLUMN_ALIASES.get(key.strip(), key.strip()): (value.strip() or None) if value else None
+                    for key, value in row.items() if key
+                }
+        else:
+            raise GuestImportError(f'Unsupported format: {fmt}')
+
+    @staticmethod
+    def invite_token(user_id, email, company_id):
+        """Signed, single-purpose token that lets the guest choose a password"""
+        now = datetime.utcnow()
+        return JWTManager.encode_token({
+            'user_id': user_id,
+            'email': email,
+            'company_id': company_id,
+            'exp': now + current_app.config['GUEST_INVITE_EXPIRES'],
+            'iat': now,
+            'jti': secrets.token_urlsafe(16),
+            'type': 'invite'
+        })
+
+    @classmethod
+    def _existing(cls, emails, batch_size):
+        found = set()
+        for start in range(0, len(emails), batch_size):
+            chunk = emails[start:start + batch_size]
+            found.update(email for (email,) in db.session.query(User.email).filter(User.email.in_(chunk)))
+        return found
+
+    @classmethod
+    def run(cls, rows, company_id):
+        """Import parsed rows for a company; returns (summary, results)"""
+        config = current_app.config
+        max_rows = config.get('GUEST_IMPORT_MAX_ROWS', 20000)
+        batch_size = config.get('GUEST_IMPORT_BATCH', 1000)
+
+        results = []
+        pending = []
+        seen = set()
+        for number, raw in enumerate(rows, 1):
+            if number > max_rows:
+                raise GuestImportError(f'Import is limited to {max_rows} rows')
+            result = {'row': number, 'email': raw.get('email')}
+            results.append(result)
+
+            errors = cls.schema.validate(raw)
+            if errors:
+                result.update(status='invalid', errors=errors)
+                continue
+            email = raw['email'].strip().lower()
+            result['email'] = email
+            if email in seen:
+                result['status'] = 'duplicate'
+                continue
+            seen.add(email)
+            pending.append((result, raw))
+
+        existing = cls._existing([result['email'] for result, _ in pending], batch_size)
+        new = []
+        for result, raw in pending:
+            if result['email'] in existing:
+                result['status'] = 'exists'
+            else:
+                new.append((result, raw))
+
+        # Contraseñas incluidas en el fichero: todas al pool de bcrypt de una vez
+        with_password = [(result, raw) for result, raw in new if raw.get('password')]
+        hashes = PasswordHasher.hash_many([raw['password'] for _, raw in with_password])
+        password_hashes = {result['row']: password_hash for (result, _), password_hash in zip(with_password, hashes)}
+
+        for start in range(0, len(new), batch_size):
+            cls._insert(new[start:start + batch_size], password_hashes, company_id)
+
+        summary = {'total': len(results)}
+        for status in ('created', 'exists', 'duplicate', 'invalid'):
+            summary[status] = sum(1 for result in results if result['status'] == status)
+        return summary, results
+
+    @classmethod
+    def _insert(cls, batch, password_hashes, company_id):
+        values = [
+            {
+                'email': result['email'],
+                'password_hash': password_hashes.get(result['row'], UNUSABLE_PASSWORD),
+                'user_type': UserType.CUSTOMER,
+                'first_name': raw['firstName'].strip(),
+                'last_name': raw['lastName'].strip(),
+                'phone': raw.get('phone'),
+                'email_verified': False,
+                'invited_by_id': company_id
+            }
+            for result, raw in batch
+        ]
+        try:
+            db.session.execute(db.insert(User), values)
+            db.session.commit()
+        except IntegrityError:
+            # Alguien registró uno de estos emails mientras tanto: se descartan y se reintenta
+            db.session.rollback()
+            taken = cls._existing([result['email'] for result, _ in batch], len(batch))
+            for result, _ in batch:
+                if result['email'] in taken:
+                    result['status'] = 'exists'
+            batch = [(result, raw) for result, raw in batch if result['email'] not in taken]
+            if not batch:
+                return
+            db.session.execute(db.insert(User), [value for value in values if value['email'] not in taken])
+            db.session.commit()
+
+        ids = dict(db.session.query(User.email, User.id).filter(
+            User.email.in_([result['email'] for result, _ in batch])
+        ))
+        for result, _ in batch:
+            user_id = ids[result['email']]
+            result.update(status='created', userId=user_id)
+            if result['row'] not in password_hashes:
+                result['inviteToken'] = cls.invite_token(user_id, result['email'], company_id)
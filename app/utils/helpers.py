@@ -9,9 +9,12 @@ import qrcode
 import random
 import string
 import bleach
-from PIL import Image  
+from PIL import Image, ImageDraw, ImageFont
 from datetime import datetime, timedelta
 import re
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from app.models import db
+from app.utils.metrics import metrics
 
 # Test comment to force file update
 
@@ -19,6 +22,7 @@ class QRCodeGenerator:
     """Generador de códigos QR para tickets"""
     
     @staticmethod
+    @metrics.timed('render_duration_seconds', 'qr')
     def generate_ticket_qr(ticket_id, event_id, validation_token):
         """Generate QR code for ticket validation"""
         qr_data = {
@@ -52,6 +56,32 @@ class QRCodeGenerator:
         
         return qr_base64
 
+    @staticmethod
+    @metrics.timed('render_duration_seconds', 'ticket_image')
+    def generate_ticket_image(ticket, qr_base64):
+        """Render a printable ticket: event details next to its QR code, as base64 PNG"""
+        qr_img = Image.open(io.BytesIO(base64.b64decode(qr_base64))).convert('RGB')
+        text_width = 460
+        canvas = Image.new('RGB', (text_width + qr_img.width, max(qr_img.height, 240)), 'white')
+        canvas.paste(qr_img, (text_width, 0))
+        
+        draw = ImageDraw.Draw(canvas)
+        title_font = ImageFont.load_default(size=26)
+        font = ImageFont.load_default(size=18)
+        draw.text((24, 24), ticket.event_name[:40], fill='black', font=title_font)
+        lines = [
+            ticket.event_location,
+            ticket.event_date.strftime('%d/%m/%Y %H:%M'),
+            ticket.holder_name or '',
+            ticket.ticket_number
+        ]
+        for index, line in enumerate(lines):
+            draw.text((24, 72 + index * 30), line[:48], fill='black', font=font)
+        
+        buffer = io.BytesIO()
+        canvas.save(buffer, format='PNG')
+        return base64.b64encode(buffer.getvalue()).decode()
+    
     @staticmethod
     def validate_qr_code(qr_code_data):
         """Validate QR code format and extract data"""
@@ -213,3 +243,68 @@ class ValidationHelper:
             return False, "Event date cannot be more than 2 years in the future"
             
         return True, "Date is valid"
+
+class DatabaseHelper:
+    """Dialect-aware bulk write utilities"""
+    
+    @staticmethod
+    def upsert_increment(model, rows, keys, increments):
+        """Bulk insert rows, adding `increments` onto existing rows with the same unique `keys`"""
+        if not rows:
+            return
+        
+        dialect = db.session.get_bind().dialect.name
+        
+        if dialect == 'mysql':
+            stmt = mysql.insert(model)
+            stmt = stmt.on_duplicate_key_update({
+                column: getattr(model, column) + stmt.inserted[column] for column in increments
+            })
+        else:
+            stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(model)
+            stmt = stmt.on_conflict_do_update(index_elements=keys, set_={
+                column: getattr(model, column) + stmt.excluded[column] for column in increments
+            })
+        
+        db.session.execute(stmt, rows)
+    
+    @staticmethod
+    def keyset_batches(query, keys, batch_size=5000):
+        """Yield fully read lists of rows in `keys` order, one LIMIT query per batch
+        
+        No cursor stays open between batches, so callers can write on the same
+        connection while iterating (PyMySQL discards an unfinished unbuffered
+        result when another statement runs). The last key must be unique; key
+        values are appended to each row as its last columns.
+        """
+        query = query.add_columns(*keys).order_by(*keys)
+        last = None
+        while True:
+            batch_query = query
+            if last is not None:
+                batch_query = batch_query.filter(
+                    keys[0] > last[0] if len(keys) == 1 else db.tuple_(*keys) > last
+                )
+            rows = batch_query.limit(batch_size).all()
+            if rows:
+                yield rows
+            if len(rows) < batch_size:
+                return
+            last = tuple(rows[-1][-len(keys):])
+    
+    @staticmethod
+    def insert_missing(model, rows, keys):
+        """Bulk insert rows, leaving existing rows with the same unique `keys` untouched"""
+        if not rows:
+            return
+        
+        dialect = db.session.get_bind().dialect.name
+        
+        if dialect == 'mysql':
+            stmt = mysql.insert(model)
+            stmt = stmt.on_duplicate_key_update({keys[0]: getattr(model, keys[0])})
+        else:
+            stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(model)
+            stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+        
+        db.session.execute(stmt, rows)
@@ -0,0 +1,113 @@
+"""
+Sistema de Tickets - Caché de Identidad
+Principal ligero del usuario autenticado cacheado por proceso y opcionalmente en Redis
+"""
+
+import json
+from flask import current_app
+from app.models import User, UserType, db
+from app.utils.cache import TTLCache, REDIS_ERRORS, redis_client
+
+
+class Principal:
+    """Lightweight stand-in for the authenticated User
+
+    Holds the columns that auth checks and most routes read. Any other
+    attribute (to_dict, relationships, phone...) loads the full User row on
+    first access, once per request. Routes that modify the user should call
+    load() and change the returned row.
+    """
+
+    FIELDS = ('id', 'email', 'user_type', 'is_active', 'first_name', 'last_name', 'company_name')
+    __slots__ = FIELDS + ('_user',)
+
+    def __init__(self, id, email, user_type, is_active, first_name, last_name, company_name, user=None):
+        self.id = id
+        self.email = email
+        self.user_type = user_type
+        self.is_active = is_active
+        self.first_name = first_name
+        self.last_name = last_name
+        self.company_name = company_name
+        self._user = user
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(*(getattr(user, field) for field in cls.FIELDS), user=user)
+
+    @classmethod
+    def from_cache(cls, data):
+        return cls(**{**data, 'user_type': UserType(data['user_type'])})
+
+    def to_cache(self):
+        return {**{field: getattr(self, field) for field in self.FIELDS}, 'user_type': self.user_type.value}
+
+    def load(self):
+        """Return the full User row, loading it on first use"""
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # Solo se llama para atributos que no son del principal
+        return getattr(self.load(), name)
+
+
+class IdentityCache:
+    """Short-TTL cache of active users' principals keyed by user id
+
+    Entries live IDENTITY_CACHE_TTL seconds in an in-process LRU and, when
+    REDIS_CACHE_ENABLED is set, in Redis so workers share them. invalidate()
+    must be called after a profile update, deactivation or password change;
+    other workers' local copies expire within the TTL.
+    """
+
+    local = TTLCache(maxsize=10000, ttl=30)
+    KEY = 'identity:{}'
+
+    @classmethod
+    def get(cls, user_id):
+        """Return the active user's Principal, or None when missing or inactive"""
+        ttl = current_app.config.get('IDENTITY_CACHE_TTL', 30)
+        data = cls.local.get(user_id)
+        if data is None:
+            client = redis_client()
+            if client is not None:
+                try:
+                    raw = client.get(cls.KEY.format(user_id))
+                    data = json.loads(raw) if raw else None
+                except REDIS_ERRORS:
+                    data = None
+                if data is not None:
+                    cls.local.set(user_id, data, ttl=ttl)
+
+        if data is not None:
+            return Principal.from_cache(data)
+
+        user = db.session.get(User, user_id)
+        if not user or not user.is_active:
+            return None
+
+        principal = Principal.from_user(user)
+        data = principal.to_cache()
+        cls.local.set(user_id, data, ttl=ttl)
+        client = redis_client()
+        if client is not None:
+            try:
+                client.set(cls.KEY.format(user_id), json.dumps(data), ex=ttl)
+            except REDIS_ERRORS:
+                pass
+        return principal
+
+    @classmethod
+    def invalidate(cls, *user_ids):
+        """Drop cached principals after a user's row changes"""
+        for user_id in user_ids:
+            cls.local.delete(user_id)
+
+        client = redis_client()
+        if client is not None and user_ids:
+            try:
+                client.delete(*[cls.KEY.format(user_id) for user_id in user_ids])
+            except REDIS_ERRORS:
+                pass
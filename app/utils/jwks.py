@@ -0,0 +1,68 @@
+"""
+Sistema de Tickets - Verificación con JWKS
+Verificador de tokens para otros servicios: claves públicas cacheadas desde /.well-known/jwks.json
+"""
+
+import json
+import threading
+import time
+import urllib.request
+import jwt
+
+
+class JWKSVerifier:
+    """Verify our RS256/EdDSA tokens in another process without the signing secret
+
+    Needs only PyJWT (with cryptography) and HTTP access to the JWKS
+    endpoint; it never touches this app's database. Keys are cached by kid
+    for `ttl` seconds. A token with an unknown kid triggers a refetch, at
+    most once every `min_refetch` seconds, so a forged kid cannot be used
+    to flood the endpoint.
+
+        verifier = JWKSVerifier('https://api.example.com/.well-known/jwks.json')
+        payload = verifier.verify(token)  # None when invalid or expired
+    """
+
+    def __init__(self, url, ttl=300, min_refetch=10, timeout=3):
+        self.url = url
+        self.ttl = ttl
+        self.min_refetch = min_refetch
+        self.timeout = timeout
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+            document = json.load(response)
+        keys = {}
+        for jwk in document.get('keys', []):
+            keys[jwk['kid']] = (jwt.PyJWK(jwk).key, jwk['alg'])
+        return keys
+
+    def _key(self, kid):
+        now = time.monotonic()
+        age = now - self._fetched_at
+        if kid in self._keys and age < self.ttl:
+            return self._keys[kid]
+        if age >= (self.ttl if kid in self._keys else self.min_refetch):
+            with self._lock:
+                if time.monotonic() - self._fetched_at >= self.min_refetch:
+                    try:
+                        self._keys = self._fetch()
+                    except (OSError, ValueError, jwt.PyJWKError):
+                        pass  # Endpoint caído: se siguen usando las claves ya conocidas
+                    self._fetched_at = time.monotonic()
+        return self._keys.get(kid)
+
+    def verify(self, token, token_type='access'):
+        """Return the payload of a valid token of token_type, else None"""
+        try:
+            key = self._key(jwt.get_unverified_header(token).get('kid'))
+            if key is None:
+                return None
+            public_key, algorithm = key
+            payload = jwt.decode(token, public_key, algorithms=[algorithm])
+        except jwt.InvalidTokenError:
+            return None
+        return payload if payload.get('type') == token_type else None
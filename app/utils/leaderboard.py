@@ -0,0 +1,136 @@
+"""
+Sistema de Tickets - Ranking de Ventas
+Ranking por empresa de eventos, tipos de ticket y ciudades mantenido al vender
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from app.models import Event, LeaderboardEntry, Order, OrderItem, OrderStatus, TicketType, db
+from app.utils.helpers import DatabaseHelper
+
+LEADERBOARD_KEYS = ['company_id', 'dimension', 'member']
+DIMENSIONS = ('event', 'ticketType', 'city')
+SCORES = {'revenue': LeaderboardEntry.revenue, 'tickets': LeaderboardEntry.tickets_sold}
+
+
+class SalesLeaderboard:
+    """All-time sales leaderboards per company
+
+    Each sale adds its revenue and tickets to one row per dimension (the
+    event, the ticket type and the event's city) with an upsert, in the same
+    transaction as the order. Top-N reads are a backwards range scan on the
+    (company_id, dimension, score) index instead of a GROUP BY over
+    order_items.
+    """
+
+    @staticmethod
+    def _members(event_id, city, ticket_type_id):
+        return (
+            ('event', str(event_id)),
+            ('ticketType', str(ticket_type_id)),
+            ('city', city or '')
+        )
+
+    @staticmethod
+    def _sales_query():
+        return db.session.query(
+            Event.company_id,
+            Event.id.label('event_id'),
+            Event.city,
+            OrderItem.ticket_type_id,
+            OrderItem.total_price,
+            OrderItem.quantity
+        ).select_from(OrderItem).join(Event, OrderItem.event_id == Event.id)
+
+    @classmethod
+    def _sale(cls, row):
+        return (row.company_id, cls._members(row.event_id, row.city, row.ticket_type_id), row.total_price, row.quantity)
+
+    @classmethod
+    def _apply(cls, sales, sign=1):
+        """Add sales rows (company_id, members, revenue, quantity)"""
+        totals = defaultdict(lambda: [Decimal('0'), 0])
+        for company_id, members, revenue, quantity in sales:
+            for dimension, member in members:
+                key = (company_id, dimension, member)
+                totals[key][0] += Decimal(str(revenue)) * sign
+                totals[key][1] += quantity * sign
+
+        DatabaseHelper.upsert_increment(LeaderboardEntry, [
+            {**dict(zip(LEADERBOARD_KEYS, key)), 'revenue': revenue, 'tickets_sold': tickets_sold}
+            for key, (revenue, tickets_sold) in sorted(totals.items())
+        ], LEADERBOARD_KEYS, ['revenue', 'tickets_sold'])
+
+    @classmethod
+    def record_order(cls, order, items):
+        """Add a new order; items is a list of (order_item, event). The caller commits"""
+        cls._apply([
+            (event.company_id, cls._members(event.id, event.city, item.ticket_type_id), item.total_price, item.quantity)
+            for item, event in items
+        ])
+
+    @classmethod
+    def record_refund(cls, order):
+        """Subtract a refunded or cancelled order. The caller commits"""
+        rows = cls._sales_query().filter(OrderItem.order_id == order.id).all()
+        cls._apply([cls._sale(row) for row in rows], sign=-1)
+
+    @classmethod
+    def backfill(cls, company_id=None, batch_size=5000):
+        """Rebuild leaderboards from order_items in keyset batches; returns rows read"""
+        query = db.session.query(LeaderboardEntry)
+        if company_id:
+            query = query.filter(LeaderboardEntry.company_id == company_id)
+        query.delete(synchronize_session=False)
+
+        query = cls._sales_query().join(Order, OrderItem.order_id == Order.id).filter(
+            Order.status.notin_([OrderStatus.REFUNDED, OrderStatus.CANCELLED])
+        )
+        if company_id:
+            query = query.filter(Event.company_id == company_id)
+
+        processed = 0
+        for batch in DatabaseHelper.keyset_batches(query, [OrderItem.id], batch_size):
+            cls._apply([cls._sale(row) for row in batch])
+            processed += len(batch)
+
+        return processed
+
+    @staticmethod
+    def top(company_id, dimension='event', by='revenue', limit=5):
+        """Return the top `limit` members as dicts, best first"""
+        score = SCORES[by]
+        rows = db.session.query(
+            LeaderboardEntry.member,
+            LeaderboardEntry.revenue,
+            LeaderboardEntry.tickets_sold
+        ).filter(
+            LeaderboardEntry.company_id == company_id,
+            LeaderboardEntry.dimension == dimension
+        ).order_by(score.desc()).limit(limit).all()
+
+        names = {}
+        if dimension == 'event' and rows:
+            names = dict(db.session.query(Event.id, Event.title).filter(
+                Event.id.in_([int(row.member) for row in rows])
+            ).all())
+        elif dimension == 'ticketType' and rows:
+            names = dict(db.session.query(TicketType.id, TicketType.name).filter(
+                TicketType.id.in_([int(row.member) for row in rows])
+            ).all())
+
+        leaderboard = []
+        for rank, row in enumerate(rows, start=1):
+            entry = {
+                'rank': rank,
+                'revenue': float(row.revenue),
+                'ticketsSold': row.tickets_sold
+            }
+            if dimension == 'city':
+                entry['city'] = row.member or None
+            else:
+                member_id = int(row.member)
+                entry['id'] = member_id
+                entry['name'] = names.get(member_id)
+            leaderboard.append(entry)
+        return leaderboard
@@ -0,0 +1,118 @@
+"""
+Sistema de Tickets - Accesos en Vivo
+Pub/sub en proceso que alimenta los contadores de entrada por evento (SSE)
+"""
+
+import json
+import threading
+import time
+from collections import Counter, deque
+
+
+class EntryCounters:
+    """Rolling entry counters for one event"""
+
+    def __init__(self, total, admitted):
+        self.total = total
+        self.admitted = admitted
+        self.rejects = Counter()
+        self.scans = deque()  # [segundo, escaneos]: como mucho una entrada por segundo de la ventana
+        self.version = 0
+
+
+class EntryBroker:
+    """In-process pub/sub of gate scan outcomes, keyed by event
+
+    Validation routes publish outcomes after they commit and SSE subscribers
+    read snapshots from memory, so watching a dashboard costs no database
+    queries. Counters are per worker process: an event is seeded from the
+    database the first time it is watched in a process and only scans
+    handled by that same process are counted afterwards.
+    """
+
+    def __init__(self, window_seconds=60):
+        self.window_seconds = window_seconds
+        self._events = {}
+        self._changed = threading.Condition()
+
+    def watch(self, event_id, seed):
+        """Start tracking an event; seed() returns (total, admitted) and runs once"""
+        if event_id in self._events:
+            return
+        total, admitted = seed()
+        with self._changed:
+            self._events.setdefault(event_id, EntryCounters(total, admitted))
+
+    def _prune(self, counters, now):
+        cutoff = now - self.window_seconds
+        while counters.scans and counters.scans[0][0] <= cutoff:
+            counters.scans.popleft()
+
+    def publish(self, event_id, outcomes):
+        """Record a Counter of scan outcomes: 'admitted', 'corrected' or a reject reason
+
+        'corrected' is an offline scan that only moved an existing admission
+        earlier; the ticket was counted when it was admitted, so it is ignored.
+        """
+        with self._changed:
+            counters = self._events.get(event_id)
+            if counters is None or not outcomes:
+                return
+
+            now = int(time.monotonic())
+            scanned = 0
+            for outcome, count in outcomes.items():
+                if outcome == 'corrected':
+                    continue
+                if outcome == 'admitted':
+                    counters.admitted += count
+                else:
+                    counters.rejects[outcome] += count
+                scanned += count
+
+            # Se poda también aquí: sin clientes SSE nadie llama a snapshot()
+            self._prune(counters, now)
+            if counters.scans and counters.scans[-1][0] == now:
+                counters.scans[-1][1] += scanned
+            elif scanned:
+                counters.scans.append([now, scanned])
+
+            counters.version += 1
+            self._changed.notify_all()
+
+    def snapshot(self, event_id):
+        """Return (version, counters dict) for a watched event"""
+        with self._changed:
+            counters = self._events[event_id]
+            self._prune(counters, int(time.monotonic()))
+            scanned = sum(count for _, count in counters.scans)
+
+            return counters.version, {
+                'eventId': event_id,
+                'scansPerMinute': round(scanned * 60 / self.window_seconds, 1),
+                'admitted': counters.admitted,
+                'remaining': max(0, counters.total - counters.admitted),
+                'totalTickets': counters.total,
+                'rejects': dict(counters.rejects)
+            }
+
+    def stream(self, event_id, heartbeat=15, min_interval=1.0):
+        """Yield Server-Sent Events frames with the event's counters
+
+        A frame is sent when counters change (at most once per min_interval)
+        and at least every `heartbeat` seconds so the rolling rate decays.
+        """
+        version = None
+        while True:
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: self._events[event_id].version != version,
+                    timeout=heartbeat
+                )
+            version, data = self.snapshot(event_id)
+            yield f"event: entries\ndata: {json.dumps(data)}\n\n"
+            time.sleep(min_interval)
+
+
+# Broker compartido por las rutas de validación y el stream de la empresa
+entry_broker = EntryBroker()
@@ -0,0 +1,295 @@
+"""
+Sistema de Tickets - Métricas
+Latencia por endpoint, consultas SQL por petición, renderizado de QR y espera del pool en formato Prometheus
+"""
+
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+import sqlalchemy as sa
+from flask import g, has_app_context, request
+from sqlalchemy.pool import QueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+# nombre: (tipo, ayuda, etiquetas, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by endpoint and status', ('method', 'endpoint', 'status'), None),
+    'http_request_duration_seconds': ('histogram', 'Request latency', ('method', 'endpoint'), LATENCY_BUCKETS),
+    'http_request_queries': ('histogram', 'SQL statements per request', ('endpoint',), QUERY_COUNT_BUCKETS),
+    'http_request_sql_seconds': ('histogram', 'Time spent in SQL per request', ('endpoint',), LATENCY_BUCKETS),
+    'db_queries_total': ('counter', 'SQL statements executed', ('endpoint',), None),
+    'db_query_seconds_total': ('counter', 'Time spent executing SQL', ('endpoint',), None),
+    'db_pool_checkout_wait_seconds': ('histogram', 'Wait for a pooled connection', ('bind',), LATENCY_BUCKETS),
+    'render_duration_seconds': ('histogram', 'QR and image rendering time', ('kind',), LATENCY_BUCKETS),
+}
+
+
+class _ShardHolder:
+    """Per-thread object whose collection signals that the thread has exited"""
+
+
+class MetricsRegistry:
+    """Counters and histograms kept per thread and summed when scraped
+
+    Each thread writes to its own shard, so recording is a dict update
+    with no lock. Scrapes take a lock only to walk the shard list; a
+    thread's shard is folded into a retired total when the thread exits,
+    so short-lived request threads do not pile up. Values are per worker
+    process: scrape every worker, or run one metrics-enabled process per
+    host port.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live = {}
+        self._retired = ({}, {})
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            holder = self._local.holder = _ShardHolder()
+            with self._lock:
+                self._live[id(shard)] = shard
+            # Al terminar el hilo se libera el holder y su shard pasa al total retirado
+            weakref.finalize(holder, self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._live.pop(id(shard), None)
+            self._merge(self._retired, shard)
+
+    @staticmethod
+    def _merge(target, shard):
+        counters, histograms = target
+        for key, value in list(shard[0].items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, values in list(shard[1].items()):
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = list(values)
+            else:
+                for index, value in enumerate(values):
+                    total[index] += value
+
+    def inc(self, name, labels, value=1):
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        histograms = self._shard()[1]
+        key = (name, labels)
+        buckets = METRICS[name][3]
+        values = histograms.get(key)
+        if values is None:
+            # Un contador por bucket (no acumulado), luego suma y total
+            values = histograms[key] = [0] * (len(buckets) + 3)
+        values[bisect_left(buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    @contextmanager
+    def timer(self, name, labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, labels, time.perf_counter() - started)
+
+    def timed(self, name, *labels):
+        """Decorator that observes the call duration into histogram `name`"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        with self._lock:
+            total = ({}, {})
+            self._merge(total, self._retired)
+            for shard in list(self._live.values()):
+                self._merge(total, shard)
+        return total
+
+    def render(self, gauges=()):
+        """Prometheus text exposition of every metric plus (name, help, labels, value) gauges"""
+        counters, histograms = self.snapshot()
+        lines = []
+        for name, (kind, help_text, label_names, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(label_names, labels)} {_number(value)}')
+                continue
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), values):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _number(bound)
+                    lines.append(f'{name}_bucket{_labels(label_names + ("le",), labels + (le,))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(label_names, labels)} {_number(values[-2])}')
+                lines.append(f'{name}_count{_labels(label_names, labels)} {values[-1]}')
+
+        seen = set()
+        for name, help_text, labels, value in gauges:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+metrics = MetricsRegistry()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    bind = 'default'
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe('db_pool_checkout_wait_seconds', (self.bind,), time.perf_counter() - started)
+
+
+def _endpoint():
+    if has_app_context() and 'request_started' in g:
+        return request.endpoint or 'unmatched'
+    return 'background'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = g.get('sql_stats') if has_app_context() else None
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+    endpoint = _endpoint()
+    metrics.inc('db_queries_total', (endpoint,))
+    metrics.inc('db_query_seconds_total', (endpoint,), elapsed)
+
+
+def _handle_error(context):
+    # La sentencia falló: descartar su marca de inicio
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+def _pool_class(key, options):
+    """Pool class for an engine: TimedQueuePool labelled with its bind where it would be a plain QueuePool"""
+    if 'poolclass' in options:
+        return options['poolclass']
+    url = sa.engine.make_url(options['url'])
+    pool_class = url.get_dialect().get_pool_class(url)
+    if pool_class is not QueuePool:
+        return pool_class
+    return type('TimedQueuePool', (TimedQueuePool,), {'bind': key or 'default'})
+
+
+_listening = False
+
+
+def init_metrics(app):
+    """Record latency, status and SQL per request, and time checkouts of every pool
+
+    Must run before db.init_app: it sets the poolclass of each engine in
+    SQLALCHEMY_ENGINE_OPTIONS and SQLALCHEMY_BINDS.
+    """
+    global _listening
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    # Copias: no modificar los dicts compartidos de la clase Config
+    base = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    binds = {}
+    for key, value in (app.config.get('SQLALCHEMY_BINDS') or {}).items():
+        options = {'url': value} if isinstance(value, (str, sa.engine.URL)) else dict(value)
+        binds[key] = {**options, 'poolclass': _pool_class(key, {**base, **options})}
+    app.config['SQLALCHEMY_BINDS'] = binds
+    if app.config.get('SQLALCHEMY_DATABASE_URI'):
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**base, 'poolclass': _pool_class(None, {**base, 'url': uri})}
+
+    if not _listening:
+        sa.event.listen(sa.engine.Engine, 'before_cursor_execute', _before_cursor_execute)
+        sa.event.listen(sa.engine.Engine, 'after_cursor_execute', _after_cursor_execute)
+        sa.event.listen(sa.engine.Engine, 'handle_error', _handle_error)
+        _listening = True
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.sql_stats = [0, 0.0]
+
+    @app.after_request
+    def remember_response_status(response):
+        g.response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request_metrics(exc):
+        # teardown corre siempre, también cuando la vista lanzó una excepción sin respuesta
+        started = g.get('request_started')
+        if started is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        status = 500 if exc is not None else g.get('response_status', 500)
+        queries, sql_seconds = g.sql_stats
+        metrics.inc('http_requests_total', (request.method, endpoint, str(status)))
+        metrics.observe('http_request_duration_seconds', (request.method, endpoint), time.perf_counter() - started)
+        metrics.observe('http_request_queries', (endpoint,), queries)
+        metrics.observe('http_request_sql_seconds', (endpoint,), sql_seconds)
+
+
+def pool_gauges(engines):
+    """Current size, checked-out and overflow connections of each QueuePool"""
+    gauges = []
+    for key, engine in engines.items():
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        labels = {'bind': key or 'default'}
+        gauges.append(('db_pool_size', 'Configured pool size', labels, pool.size()))
+        gauges.append(('db_pool_checked_out', 'Connections in use', labels, pool.checkedout()))
+        gauges.append(('db_pool_overflow', 'Connections beyond pool size', labels, max(0, pool.overflow())))
+    return sorted(gauges, key=lambda gauge: (gauge[0], gauge[2]['bind']))
@@ -0,0 +1,113 @@
+"""
+Sistema de Tickets - Hash de Contraseñas
+bcrypt en un pool de hilos acotado con coste configurable y rehash al iniciar sesión
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app
+
+# Hash que bcrypt nunca acepta: cuenta creada por invitación, sin contraseña todavía
+UNUSABLE_PASSWORD = '!'
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when more hashes are waiting than PASSWORD_HASH_QUEUE allows"""
+
+
+class PasswordHasher:
+    """Run bcrypt on a bounded pool instead of the request thread
+
+    bcrypt releases the GIL, so at most PASSWORD_HASH_WORKERS hashes (one
+    per core by default) run at once and the remaining cores stay free for
+    other requests. Callers block until their hash is done. Beyond
+    PASSWORD_HASH_QUEUE pending jobs, PasswordHasherBusy is raised so a
+    login burst is shed instead of growing an unbounded backlog. The cost
+    is BCRYPT_LOG_ROUNDS.
+    """
+
+    _executor = None
+    _workers = 1
+    _slots = None
+    _lock = threading.Lock()
+    # Hashes de referencia por coste para igualar el tiempo de login con emails inexistentes
+    _dummy_hashes = {}
+
+    @classmethod
+    def _pool(cls):
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    config = current_app.config
+                    workers = config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+                    cls._workers = workers
+                    cls._slots = threading.BoundedSemaphore(workers + config.get('PASSWORD_HASH_QUEUE', 64))
+                    cls._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        return cls._executor
+
+    @classmethod
+    def _run(cls, fn, *args):
+        cls._pool()
+        if not cls._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return cls._executor.submit(fn, *args).result()
+        finally:
+            cls._slots.release()
+
+    @staticmethod
+    def rounds():
+        return current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+    @classmethod
+    def hash(cls, password):
+        """Return a bcrypt hash of password at the configured cost"""
+        salt = bcrypt.gensalt(rounds=cls.rounds())
+        return cls._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    @classmethod
+    def hash_many(cls, passwords):
+        """Hash a list of passwords; returns the hashes in the same order
+
+        Only one window of PASSWORD_HASH_WORKERS jobs is in flight at a
+        time, so logins submitted meanwhile run between windows instead of
+        queueing behind the whole batch.
+        """
+        executor = cls._pool()
+        rounds = cls.rounds()
+        hashes = []
+        for start in range(0, len(passwords), cls._workers):
+            futures = []
+            for password in passwords[start:start + cls._workers]:
+                # Espera bloqueante: un import no debe fallar porque haya un pico de logins
+                cls._slots.acquire()
+                future = executor.submit(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds=rounds))
+                future.add_done_callback(lambda _: cls._slots.release())
+                futures.append(future)
+            hashes.extend(future.result().decode('utf-8') for future in futures)
+        return hashes
+
+    @classmethod
+    def verify(cls, password, password_hash):
+        """Check password against a stored hash; malformed hashes never match"""
+        if password_hash is None:
+            # Mismo coste que una comprobación real para no revelar si el email existe
+            rounds = cls.rounds()
+            if rounds not in cls._dummy_hashes:
+                cls._dummy_hashes[rounds] = cls.hash(os.urandom(16).hex()).encode('utf-8')
+            cls._run(bcrypt.checkpw, password.encode('utf-8'), cls._dummy_hashes[rounds])
+            return False
+        try:
+            return cls._run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+        except ValueError:
+            return False
+
+    @classmethod
+    def needs_rehash(cls, password_hash):
+        """True when the stored hash was made with a different cost than configured"""
+        try:
+            return int(password_hash.split('$')[2]) != cls.rounds()
+        except (IndexError, ValueError):
+            return True
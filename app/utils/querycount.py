@@ -0,0 +1,82 @@
+"""
+Sistema de Tickets - Presupuesto de Consultas
+Contador de sentencias SQL y límite máximo por bloque o por vista para detectar N+1
+"""
+
+import threading
+from functools import wraps
+import sqlalchemy as sa
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block runs more SQL statements than its budget"""
+
+
+class QueryCounter:
+    """Record the SQL statements run by the current thread while active
+
+        with QueryCounter() as counter:
+            client.get('/api/events')
+        counter.count, counter.statements
+    """
+
+    def __init__(self):
+        self.statements = []
+        self._thread = None
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        # El listener es global: solo cuentan las sentencias del hilo que abrió el contador
+        if threading.get_ident() == self._thread:
+            self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        self._thread = threading.get_ident()
+        sa.event.listen(sa.engine.Engine, 'after_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        sa.event.remove(sa.engine.Engine, 'after_cursor_execute', self._record)
+        return False
+
+
+class query_budget:
+    """Fail when a block or function runs more than `limit` SQL statements
+
+    Works as a context manager or a decorator. The error lists every
+    statement so the offending lazy load is easy to spot.
+
+        with query_budget(4, 'GET /api/events'):
+            client.get('/api/events')
+
+        @query_budget(3)
+        def load_dashboard(): ...
+    """
+
+    def __init__(self, limit, label=None):
+        self.limit = limit
+        self.label = label
+        self.counter = None
+
+    def __enter__(self):
+        self.counter = QueryCounter().__enter__()
+        return self.counter
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.counter.__exit__(exc_type, exc, traceback)
+        if exc_type is None and self.counter.count > self.limit:
+            listing = '\n'.join(f'  {index}. {" ".join(sql.split())[:200]}' for index, sql in enumerate(self.counter.statements, 1))
+            raise QueryBudgetExceeded(
+                f'{self.label or "block"} ran {self.counter.count} queries, budget is {self.limit}:\n{listing}'
+            )
+        return False
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with query_budget(self.limit, self.label or fn.__qualname__):
+                return fn(*args, **kwargs)
+        return wrapper
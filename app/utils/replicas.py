@@ -0,0 +1,212 @@
+"""
+Sistema de Tickets - Réplicas de Lectura
+Enrutamiento de lecturas a réplicas con control de retraso y respaldo al primario
+"""
+
+import itertools
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import SQLAlchemyError
+from app.utils.cache import TTLCache
+
+# Tabla de latidos (modelo ReplicaHeartbeat); aquí solo lo necesario para leerla y escribirla
+heartbeat_table = sa.table(
+    'replica_heartbeat',
+    sa.column('id', sa.Integer),
+    sa.column('beat_at', sa.DateTime)
+)
+
+
+class ReplicaRouter:
+    """Pick a healthy read replica for replica-routed requests
+
+    Replicas are the SQLALCHEMY_BINDS whose key starts with 'replica'. Lag
+    is measured like pt-heartbeat: every REPLICA_LAG_CHECK_SECONDS a daemon
+    thread of each process reads the heartbeat row from the primary and
+    each replica, then writes a new beat to the primary. Requests only read
+    the last result, so an unreachable replica costs the probe its connect
+    timeout, never a request. A replica whose beat trails the primary's by
+    more than REPLICA_MAX_LAG_SECONDS, or that cannot be reached, is skipped
+    until the next check; with no healthy replica, or while the probe has
+    not reported for longer than the check interval plus that limit, reads
+    use the primary.
+
+    Users who wrote recently are pinned to the primary for
+    REPLICA_STICKY_SECONDS so they read their own writes. Pins are per
+    worker process.
+    """
+
+    def __init__(self):
+        self.lags = {}
+        self.checked_at = 0.0
+        self.pinned = TTLCache(maxsize=100000, ttl=10)
+        self._lock = threading.Lock()
+        self._cycle = itertools.count()
+        self._engines = None
+        self._thread = None
+
+    @staticmethod
+    def replica_keys(engines):
+        return sorted(key for key in engines if isinstance(key, str) and key.startswith('replica'))
+
+    def check(self, engines):
+        """Measure replica lag in seconds (None when unreachable) and write a new beat"""
+        primary = engines[None]
+        beat_query = sa.select(heartbeat_table.c.beat_at).where(heartbeat_table.c.id == 1)
+
+        lags = {}
+        try:
+            with primary.connect() as conn:
+                primary_beat = conn.execute(beat_query).scalar()
+        except SQLAlchemyError:
+            # Sin tabla de latidos todavía (create_all pendiente): no se puede medir
+            return {key: None for key in self.replica_keys(engines)}
+
+        for key in self.replica_keys(engines):
+            try:
+                with engines[key].connect() as conn:
+                    replica_beat = conn.execute(beat_query).scalar()
+            except SQLAlchemyError:
+                lags[key] = None
+                continue
+
+            if primary_beat is None:
+                lags[key] = 0.0
+            elif replica_beat is None:
+                lags[key] = float('inf')
+            else:
+                lags[key] = max(0.0, (primary_beat - replica_beat).total_seconds())
+
+        now = datetime.utcnow().replace(microsecond=0)
+        try:
+            with primary.begin() as conn:
+                updated = conn.execute(
+                    sa.update(heartbeat_table).where(heartbeat_table.c.id == 1).values(beat_at=now)
+                ).rowcount
+                if not updated:
+                    conn.execute(sa.insert(heartbeat_table).values(id=1, beat_at=now))
+        except SQLAlchemyError:
+            pass  # Otro proceso insertó el latido a la vez
+
+        return lags
+
+    def refresh(self, engines):
+        """Run one lag check now and publish its result to requests"""
+        lags = self.check(engines)
+        with self._lock:
+            self.lags = lags
+            self.checked_at = time.monotonic()
+
+    def start(self, engines):
+        """Start this process's probe thread for an app's engines, unless it is running"""
+        app = current_app._get_current_object()
+        interval = max(1, app.config.get('REPLICA_LAG_CHECK_SECONDS', 5))
+
+        def probe():
+            # Termina cuando otra app (otros engines) toma el relevo
+            while self._engines is engines:
+                try:
+                    self.refresh(engines)
+                except Exception:
+                    app.logger.exception('Replica lag check failed')
+                time.sleep(interval)
+
+        with self._lock:
+            # Tras un fork el hilo no sobrevive: is_alive() es False y se arranca de nuevo
+            if self._engines is engines and self._thread is not None and self._thread.is_alive():
+                return
+            self._engines = engines
+            self.lags = {}
+            self.checked_at = time.monotonic()
+            self._thread = threading.Thread(target=probe, name='replica-lag-probe', daemon=True)
+            self._thread.start()
+
+    def healthy(self, engines):
+        """Replica keys within the lag limit, as of the probe thread's last check"""
+        config = current_app.config
+        if self._engines is not engines or not self._thread.is_alive():
+            self.start(engines)
+        with self._lock:
+            lags = dict(self.lags)
+            age = time.monotonic() - self.checked_at
+
+        max_lag = config.get('REPLICA_MAX_LAG_SECONDS', 10)
+        # Sonda atascada: una medida vieja no garantiza que la réplica siga al día
+        if age > max(1, config.get('REPLICA_LAG_CHECK_SECONDS', 5)) + max_lag:
+            return []
+        return [key for key, lag in sorted(lags.items()) if lag is not None and lag <= max_lag]
+
+    def pin(self, user_id):
+        """Route this user's reads to the primary for REPLICA_STICKY_SECONDS"""
+        self.pinned.set(user_id, True, ttl=current_app.config.get('REPLICA_STICKY_SECONDS', 10))
+
+    def pick(self, engines):
+        """Return the replica engine for this request, or None to use the primary"""
+        key = g.get('replica_key', False)
+        if key is False:
+            key = None
+            user = getattr(request, 'current_user', None)
+            pinned = user is not None and self.pinned.get(user.id)
+            if self.replica_keys(engines) and not pinned:
+                healthy = self.healthy(engines)
+                if healthy:
+                    key = healthy[next(self._cycle) % len(healthy)]
+            # Una sola réplica por petición: todas sus lecturas ven el mismo estado
+            g.replica_key = key
+        return engines[key] if key else None
+
+
+replica_router = ReplicaRouter()
+
+
+class RoutingSession(Session):
+    """Session that sends SELECTs of replica-routed requests to a read replica
+
+    Flushes, locking reads, non-SELECT statements and anything after the
+    request has written go to the primary.
+    """
+
+    def _routes_to_replica(self, clause):
+        if self._flushing or clause is None or not has_request_context():
+            return False
+        if not g.get('replica_reads') or g.get('db_wrote'):
+            return False
+        return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._routes_to_replica(clause):
+            engine = replica_router.pick(self._db.engines)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_reads(f):
+    """Decorator: serve this read-only endpoint from a read replica when one is healthy"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.replica_reads = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def mark_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def init_replicas(app):
+    """Pin users who wrote during a request to the primary"""
+
+    @app.after_request
+    def pin_writer(response):
+        user = getattr(request, 'current_user', None)
+        if g.get('db_wrote') and user is not None and replica_router.replica_keys(app.config.get('SQLALCHEMY_BINDS') or {}):
+            replica_router.pin(user.id)
+        return response
@@ -0,0 +1,424 @@
+"""
+Sistema de Tickets - Escaneo Offline
+Manifiestos binarios para escáneres sin conexión y carga de escaneos por lotes
+"""
+
+import hashlib
+import struct
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from app.models import Event, Ticket, TicketValidation, TicketStatus, ValidationMethod, db
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def load_tickets(ticket_numbers):
+    """Load scan-relevant ticket columns for many ticket numbers in one query"""
+    if not ticket_numbers:
+        return {}
+
+    rows = db.session.query(
+        Ticket.id,
+        Ticket.ticket_number,
+        Ticket.event_id,
+        Ticket.event_name,
+        Ticket.holder_name,
+        Ticket.status,
+        Ticket.used_at,
+        Event.company_id
+    ).join(Event, Ticket.event_id == Event.id).filter(
+        Ticket.ticket_number.in_(set(ticket_numbers))
+    ).all()
+
+    return {row.ticket_number: row for row in rows}
+
+
+def admit_ticket(ticket_id, validator_id, validation_method=ValidationMethod.QR_SCAN, location=None):
+    """Atomically flip one ticket from valid to used; the caller commits
+
+    Returns the admission time, or None when the ticket was no longer valid
+    (another gate won the race). The check and the write are a single
+    UPDATE ... WHERE status='valid', so concurrent scans of the same ticket
+    serialize on that statement instead of on a read-then-write in Python.
+    """
+    now = datetime.utcnow().replace(microsecond=0)
+    updated = db.session.execute(
+        db.update(Ticket).where(
+            Ticket.id == ticket_id,
+            Ticket.status == TicketStatus.VALID
+        ).values(
+            status=TicketStatus.USED,
+            used_at=now
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+
+    if updated != 1:
+        return None
+
+    db.session.add(TicketValidation(
+        ticket_id=ticket_id,
+        validated_by=validator_id,
+        validation_method=validation_method,
+        location=location,
+        validated_at=now
+    ))
+    return now
+
+
+def claim_tickets(used_at, condition=None, **values):
+    """Set used_at (plus `values`) on tickets matching `condition`; returns the ids this transaction changed
+
+    `used_at` maps ticket_id to its admission time and `condition(when)`
+    filters the rows (default: still valid). Ownership always comes from
+    the database, never from re-reading timestamps another gate may have
+    written too: UPDATE ... RETURNING where the dialect supports it,
+    otherwise one bulk UPDATE in a savepoint that, when another transaction
+    got some of the rows first, is rolled back and replayed row by row as
+    compare-and-set. The caller commits.
+    """
+    if not used_at:
+        return set()
+    if condition is None:
+        condition = lambda when: Ticket.status == TicketStatus.VALID
+        values.setdefault('status', TicketStatus.USED)
+
+    def statement(ids, when):
+        return db.update(Ticket).where(Ticket.id.in_(ids), condition(when)).values(
+            used_at=when, **values
+        ).execution_options(synchronize_session=False)
+
+    times = set(used_at.values())
+    when = times.pop() if len(times) == 1 else db.case(used_at, value=Ticket.id)
+    if db.engine.dialect.update_returning:
+        return set(db.session.execute(statement(list(used_at), when).returning(Ticket.id)).scalars())
+
+    savepoint = db.session.begin_nested()
+    if db.session.execute(statement(list(used_at), when)).rowcount == len(used_at):
+        savepoint.commit()
+        return set(used_at)
+    savepoint.rollback()
+
+    # Otra puerta ganó alguna fila: el rowcount de cada UPDATE dice cuáles son nuestras
+    return {
+        ticket_id for ticket_id, when in used_at.items()
+        if db.session.execute(statement([ticket_id], when)).rowcount == 1
+    }
+
+
+class ScanManifest:
+    """Compact, versioned binary manifest of an event's tickets
+
+    Layout (big-endian):
+        header   magic 'TKMF', format u8, flags u8, reserved u16, event_id u32,
+                 version u64, base_version u64, count u32
+        entries  ticket_id u32, status u8, digest 8 bytes
+        trailer  sha256 of header + entries
+
+    Versions are milliseconds since epoch of the newest ticket change. The
+    digest is sha256(ticket_number)[:8], so scanners hash the scanned ticket
+    number and look it up without the manifest exposing ticket numbers.
+    """
+
+    MAGIC = b'TKMF'
+    FORMAT_VERSION = 1
+    FLAG_DELTA = 0x01
+    HEADER = struct.Struct('>4sBBHIQQI')
+    ENTRY = struct.Struct('>IB8s')
+    STATUS_CODES = {
+        TicketStatus.VALID: 0,
+        TicketStatus.USED: 1,
+        TicketStatus.CANCELLED: 2,
+    }
+
+    @staticmethod
+    def ticket_digest(ticket_number):
+        """Digest scanners use to match a scanned ticket number"""
+        return hashlib.sha256(ticket_number.encode('utf-8')).digest()[:8]
+
+    @staticmethod
+    def to_version(dt):
+        """Convert a naive UTC datetime to a manifest version"""
+        if not dt:
+            return 0
+        return int((dt - EPOCH) / timedelta(milliseconds=1))
+
+    @staticmethod
+    def from_version(version):
+        """Convert a manifest version back to a naive UTC datetime"""
+        return EPOCH + timedelta(milliseconds=version)
+
+    @classmethod
+    def build(cls, event_id, since=0):
+        """Build a full manifest, or a delta of tickets changed since a version
+
+        Returns (payload, version). updated_at is stamped by the app clock at
+        flush time, not at commit, so a transaction that commits after a
+        manifest was served can carry an older timestamp than its version.
+        Deltas therefore reach SCAN_MANIFEST_OVERLAP_SECONDS back from
+        `since`; scanners replace entries by ticket_id, so the re-sent rows
+        are harmless.
+        """
+        query = db.session.query(
+            Ticket.id,
+            Ticket.ticket_number,
+            Ticket.status,
+            Ticket.updated_at
+        ).filter(Ticket.event_id == event_id)
+
+        if since:
+            overlap = timedelta(seconds=current_app.config.get('SCAN_MANIFEST_OVERLAP_SECONDS', 300))
+            query = query.filter(Ticket.updated_at >= cls.from_version(since) - overlap)
+
+        rows = query.order_by(Ticket.id).all()
+
+        version = since
+        entries = []
+        for row in rows:
+            version = max(version, cls.to_version(row.updated_at))
+            entries.append(cls.ENTRY.pack(
+                row.id,
+                cls.STATUS_CODES[row.status],
+                cls.ticket_digest(row.ticket_number)
+            ))
+
+        header = cls.HEADER.pack(
+            cls.MAGIC,
+            cls.FORMAT_VERSION,
+            cls.FLAG_DELTA if since else 0,
+            0,
+            event_id,
+            version,
+            since,
+            len(entries)
+        )
+        body = header + b''.join(entries)
+        return body + hashlib.sha256(body).digest(), version
+
+
+class OfflineScanProcessor:
+    """Ingest offline scan logs resolving conflicts with first-scan-wins"""
+
+    @staticmethod
+    def parse_scanned_at(value):
+        """Parse a scanner timestamp into a naive UTC datetime
+
+        Truncated to whole seconds to match DATETIME columns, so values read
+        back from the database compare equal to the ones we wrote.
+        """
+        if not value:
+            return datetime.utcnow().replace(microsecond=0)
+        try:
+            scanned_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if scanned_at.tzinfo:
+            scanned_at = scanned_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return scanned_at.replace(microsecond=0)
+
+    @classmethod
+    def ingest(cls, event_id, scans, validator_id):
+        """Apply parsed scans for one event; the caller commits
+
+        Each scan is a dict with index, qrCode, ticketNumber, scannedAt and
+        location. Scans are replayed in scannedAt order: the earliest scan of
+        a ticket admits it, later ones (in this batch or already recorded
+        online) are reported as duplicates.
+
+        Returns (results, outcomes) where outcomes is a Counter of
+        'admitted', 'corrected' (an earlier scan of a ticket already admitted
+        online), 'duplicate' and 'cancelled' for the live entry stream.
+        """
+        tickets = load_tickets([scan['ticketNumber'] for scan in scans])
+
+        results = {}
+        first_scans = {}
+        admitted = {}
+        earlier = {}
+        cancelled = 0
+
+        for scan in sorted(scans, key=lambda s: s['scannedAt']):
+            number = scan['ticketNumber']
+            ticket = tickets.get(number)
+            result = {
+                'index': scan['index'],
+                'qrCode': scan['qrCode'],
+                'ticketNumber': number,
+                'scannedAt': scan['scannedAt'].isoformat()
+            }
+            results[scan['index']] = result
+
+            if not ticket:
+                result.update(status='rejected', error='Ticket not found')
+            elif ticket.event_id != event_id:
+                result.update(status='rejected', error='Ticket belongs to another event')
+            elif ticket.status == TicketStatus.CANCELLED:
+                result.update(status='rejected', error='Ticket is cancelled')
+                cancelled += 1
+            elif number in first_scans:
+                result.update(status='duplicate', firstScanAt=first_scans[number].isoformat())
+            elif ticket.status == TicketStatus.VALID:
+                result['status'] = 'admitted'
+                admitted[ticket.id] = scan
+                first_scans[number] = scan['scannedAt']
+            elif ticket.used_at is None or scan['scannedAt'] < ticket.used_at:
+                # Offline scan predates the recorded admission: it is the first scan
+                result.update(status='admitted', supersededUsedAt=ticket.used_at.isoformat() if ticket.used_at else None)
+                earlier[ticket.id] = scan
+                first_scans[number] = scan['scannedAt']
+            else:
+                result.update(status='duplicate', firstScanAt=ticket.used_at.isoformat())
+                first_scans[number] = ticket.used_at
+
+        if admitted:
+            claimed = claim_tickets({ticket_id: scan['scannedAt'] for ticket_id, scan in admitted.items()})
+            lost = set(admitted) - claimed
+            if lost:
+                # Admitidos online o por otro escáner mientras resolvíamos; lectura con bloqueo para ver al ganador
+                current = db.session.query(Ticket.id, Ticket.used_at).filter(
+                    Ticket.id.in_(lost)
+                ).with_for_update().all()
+                for row in current:
+                    scan = admitted.pop(row.id)
+                    if row.used_at and scan['scannedAt'] < row.used_at:
+                        earlier[row.id] = scan
+                        results[scan['index']]['supersededUsedAt'] = row.used_at.isoformat()
+                    else:
+                        results[scan['index']].update(
+                            status='duplicate',
+                            firstScanAt=row.used_at.isoformat() if row.used_at else None
+                        )
+
+        if earlier:
+            # Solo gana quien todavía adelanta used_at: dos subidas del mismo escaneo no lo corrigen dos veces
+            claimed = claim_tickets(
+                {ticket_id: scan['scannedAt'] for ticket_id, scan in earlier.items()},
+                condition=lambda when: db.and_(
+                    Ticket.status == TicketStatus.USED,
+                    db.or_(Ticket.used_at.is_(None), Ticket.used_at > when)
+                )
+            )
+            lost = set(earlier) - claimed
+            if lost:
+                current = db.session.query(Ticket.id, Ticket.used_at).filter(
+                    Ticket.id.in_(lost)
+                ).with_for_update().all()
+                for row in current:
+                    scan = earlier.pop(row.id)
+                    result = results[scan['index']]
+                    result.pop('supersededUsedAt', None)
+                    result.update(
+                        status='duplicate',
+                        firstScanAt=row.used_at.isoformat() if row.used_at else None
+                    )
+
+        winners = {**admitted, **earlier}
+        if winners:
+            db.session.execute(db.insert(TicketValidation), [
+                {
+                    'ticket_id': ticket_id,
+                    'validated_by': validator_id,
+                    'validation_method': ValidationMethod.QR_SCAN,
+                    'location': scan.get('location'),
+                    'validated_at': scan['scannedAt']
+                }
+                for ticket_id, scan in winners.items()
+            ])
+
+        # Un escaneo anterior a una admisión online la corrige: ese ticket ya está contado como admitido
+        outcomes = Counter(
+            'corrected' if 'supersededUsedAt' in result else result['status']
+            for result in results.values() if result['status'] != 'rejected'
+        )
+        if cancelled:
+            outcomes['cancelled'] = cancelled
+
+        return list(results.values()), outcomes
+
+
+class BatchValidator:
+    """Set-based validation of many scanned tickets at once"""
+
+    @staticmethod
+    def validate(company_id, items, validator_id, location=None):
+        """Validate parsed items for a company; the caller commits
+
+        Each item is a dict with qrCode and ticketNumber. Returns one result
+        per item in input order. All tickets are loaded with a single IN query,
+        admitted with one conditional UPDATE and recorded with one bulk INSERT.
+
+        Returns (results, outcomes) where outcomes maps event_id to a Counter
+        of 'admitted' and reject reasons for the live entry stream.
+        """
+        tickets = load_tickets([item['ticketNumber'] for item in items])
+
+        results = []
+        outcomes = defaultdict(Counter)
+        admitted = {}
+        seen = set()
+
+        for item in items:
+            number = item['ticketNumber']
+            ticket = tickets.get(number)
+            result = {'qrCode': item['qrCode'], 'success': False}
+            results.append(result)
+
+            if not ticket:
+                result['error'] = 'Ticket not found'
+                continue
+
+            if ticket.company_id != company_id:
+                result['error'] = 'Not your event'
+                continue
+
+            result['ticketNumber'] = ticket.ticket_number
+
+            if number in seen:
+                result['error'] = 'Duplicate in batch'
+                outcomes[ticket.event_id]['duplicate'] += 1
+                continue
+            seen.add(number)
+
+            if ticket.status == TicketStatus.USED:
+                result['error'] = 'Already used'
+                outcomes[ticket.event_id]['already_used'] += 1
+                continue
+
+            if ticket.status == TicketStatus.CANCELLED:
+                result['error'] = 'Ticket is cancelled'
+                outcomes[ticket.event_id]['cancelled'] += 1
+                continue
+
+            result.update(success=True, eventName=ticket.event_name, holderName=ticket.holder_name)
+            admitted[ticket.id] = (result, ticket.event_id)
+
+        if not admitted:
+            return results, outcomes
+
+        now = datetime.utcnow().replace(microsecond=0)
+        claimed = claim_tickets(dict.fromkeys(admitted, now))
+        for ticket_id in set(admitted) - claimed:
+            # Otra puerta validó este ticket mientras tanto
+            result, event_id = admitted.pop(ticket_id)
+            outcomes[event_id]['already_used'] += 1
+            result['success'] = False
+            result['error'] = 'Already used'
+            result.pop('eventName', None)
+            result.pop('holderName', None)
+
+        if admitted:
+            db.session.execute(db.insert(TicketValidation), [
+                {
+                    'ticket_id': ticket_id,
+                    'validated_by': validator_id,
+                    'validation_method': ValidationMethod.QR_SCAN,
+                    'location': location,
+                    'validated_at': now
+                }
+                for ticket_id in admitted
+            ])
+
+        for _, event_id in admitted.values():
+            outcomes[event_id]['admitted'] += 1
+
+        return results, outcomes
@@ -0,0 +1,293 @@
+"""
+Sistema de Tickets - Sesiones de Refresco
+Almacén de sesiones con límite por usuario, purga por lotes y Redis opcional
+"""
+
+import atexit
+import calendar
+import threading
+import time
+from datetime import datetime
+import sqlalchemy as sa
+from flask import current_app
+from app.models import UserSession, db
+from app.utils.cache import TTLCache, redis_connection
+
+
+def _epoch(moment):
+    return calendar.timegm(moment.utctimetuple())
+
+
+def _in_background(name, lock, fn):
+    """Run fn in a daemon thread with an app context, releasing lock when done"""
+    app = current_app._get_current_object()
+
+    def run():
+        try:
+            with app.app_context():
+                fn()
+        finally:
+            lock.release()
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+
+
+class DatabaseSessionStore:
+    """Refresh-token sessions in the user_sessions table
+
+    Lookups go through the token_hash index. Creating a session revokes
+    the user's oldest active sessions beyond SESSION_MAX_PER_USER, and a
+    revoked session is marked expired so the purge finds it through the
+    expires_at index. purge() deletes expired rows in chunks; it runs from
+    `flask sessions purge` and, every SESSION_PURGE_INTERVAL_SECONDS, in a
+    background thread kicked off by a login.
+
+    Refreshes are read-mostly: valid sessions are cached for
+    SESSION_CACHE_TTL seconds (a revocation made by another worker takes
+    effect there within that TTL), and last_used_at is buffered in memory
+    and written in batches every SESSION_TOUCH_FLUSH_SECONDS or
+    SESSION_TOUCH_BATCH refreshes, so a refresh does not commit.
+    """
+
+    _purge_lock = threading.Lock()
+    _purged_at = 0.0
+
+    valid = TTLCache(maxsize=100000, ttl=30)
+    _touched = {}
+    _touch_lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _flushed_at = time.monotonic()
+    _exit_app = None
+
+    @classmethod
+    def create(cls, user_id, token_hash, device_info, ip_address, expires_at):
+        """Add a session and enforce the per-user cap. The caller commits"""
+        db.session.add(UserSession(
+            user_id=user_id,
+            token_hash=token_hash,
+            device_info=device_info,
+            ip_address=ip_address,
+            expires_at=expires_at
+        ))
+        db.session.flush()
+
+        now = datetime.utcnow().replace(microsecond=0)
+        excess = db.session.query(UserSession.id, UserSession.token_hash).filter(
+            UserSession.user_id == user_id,
+            UserSession.is_active == True,
+            UserSession.expires_at > now
+        ).order_by(UserSession.created_at.desc(), UserSession.id.desc()).offset(
+            current_app.config.get('SESSION_MAX_PER_USER', 10)
+        ).all()
+        if excess:
+            UserSession.query.filter(UserSession.id.in_([row.id for row in excess])).update(
+                {'is_active': False, 'expires_at': now}, synchronize_session=False
+            )
+            for row in excess:
+                cls.valid.delete(row.token_hash)
+        cls.schedule_purge()
+
+    @classmethod
+    def find(cls, token_hash):
+        """Return the user id of an active, unexpired session, else None"""
+        cached = cls.valid.get(token_hash)
+        if cached is None:
+            session = UserSession.query.filter_by(token_hash=token_hash, is_active=True).first()
+            if not session:
+                return None
+            cached = (session.user_id, session.expires_at)
+            cls.valid.set(token_hash, cached, ttl=current_app.config.get('SESSION_CACHE_TTL', 30))
+
+        user_id, expires_at = cached
+        return user_id if expires_at >= datetime.utcnow() else None
+
+    @classmethod
+    def touch(cls, token_hash, used_at):
+        """Buffer a refresh; last_used_at is written later by flush_touches()"""
+        config = current_app.config
+        with cls._touch_lock:
+            cls._touched[token_hash] = used_at
+            due = (
+                len(cls._touched) >= config.get('SESSION_TOUCH_BATCH', 500)
+                or time.monotonic() - cls._flushed_at >= config.get('SESSION_TOUCH_FLUSH_SECONDS', 60)
+            )
+        if cls._exit_app is None:
+            # Volcar lo pendiente al apagar el proceso
+            cls._exit_app = current_app._get_current_object()
+            atexit.register(cls._flush_at_exit)
+        if due and cls._flush_lock.acquire(blocking=False):
+            cls._flushed_at = time.monotonic()
+            _in_background('session-touch-flush', cls._flush_lock, cls.flush_touches)
+
+    @classmethod
+    def flush_touches(cls):
+        """Write buffered last_used_at values in one batched UPDATE; returns sessions written"""
+        with cls._touch_lock:
+            pending, cls._touched = cls._touched, {}
+        if not pending:
+            return 0
+
+        table = UserSession.__table__
+        statement = table.update().where(
+            table.c.token_hash == sa.bindparam('b_token_hash')
+        ).values(last_used_at=sa.bindparam('b_last_used_at'))
+        try:
+            db.session.execute(statement, [
+                {'b_token_hash': token_hash, 'b_last_used_at': used_at}
+                for token_hash, used_at in sorted(pending.items())
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Devolver al búfer lo que no se pudo escribir, salvo si ya hay un valor más reciente
+            with cls._touch_lock:
+                for token_hash, used_at in pending.items():
+                    cls._touched.setdefault(token_hash, used_at)
+            raise
+        return len(pending)
+
+    @classmethod
+    def _flush_at_exit(cls):
+        with cls._exit_app.app_context():
+            cls.flush_touches()
+
+    @classmethod
+    def revoke(cls, token_hash):
+        """Revoke a session; returns False when it does not exist. The caller commits"""
+        cls.valid.delete(token_hash)
+        now = datetime.utcnow().replace(microsecond=0)
+        return UserSession.query.filter_by(token_hash=token_hash).update(
+            {'is_active': False, 'expires_at': now}, synchronize_session=False
+        ) > 0
+
+    @staticmethod
+    def purge(batch_size=1000, max_batches=None):
+        """Delete expired and revoked sessions in chunks; returns rows deleted"""
+        now = datetime.utcnow()
+        deleted = 0
+        batches = 0
+        # Primero las expiradas (índice expires_at); luego revocadas antiguas que conservan su expiración
+        for condition in (UserSession.expires_at < now, UserSession.is_active == False):
+            while max_batches is None or batches < max_batches:
+                ids = [row.id for row in db.session.query(UserSession.id).filter(condition).limit(batch_size)]
+                if not ids:
+                    break
+                UserSession.query.filter(UserSession.id.in_(ids)).delete(synchronize_session=False)
+                db.session.commit()
+                deleted += len(ids)
+                batches += 1
+                if len(ids) < batch_size:
+                    break
+        return deleted
+
+    @classmethod
+    def schedule_purge(cls):
+        """Start a background purge when the last one is older than SESSION_PURGE_INTERVAL_SECONDS"""
+        interval = current_app.config.get('SESSION_PURGE_INTERVAL_SECONDS', 300)
+        if not interval or time.monotonic() - cls._purged_at < interval:
+            return
+        if not cls._purge_lock.acquire(blocking=False):
+            return
+
+        cls._purged_at = time.monotonic()
+        config = current_app.config
+        batch_size = config.get('SESSION_PURGE_BATCH', 1000)
+        max_batches = config.get('SESSION_PURGE_MAX_BATCHES', 50)
+        _in_background('session-purge', cls._purge_lock, lambda: cls.purge(batch_size, max_batches))
+
+
+class RedisSessionStore:
+    """Refresh-token sessions in Redis with native TTLs
+
+    Each session is a hash under session:<token_hash> that expires with the
+    refresh token. A sorted set per user, scored by creation time, tracks
+    the user's sessions for the cap. Nothing needs purging.
+    """
+
+    KEY = 'session:{}'
+    USER_KEY = 'user_sessions:{}'
+
+    @classmethod
+    def _client(cls):
+        client = redis_connection()
+        if client is None:
+            raise RuntimeError("SESSION_STORE='redis' requires the redis package")
+        return client
+
+    @classmethod
+    def create(cls, user_id, token_hash, device_info, ip_address, expires_at):
+        client = cls._client()
+        now = time.time()
+        user_key = cls.USER_KEY.format(user_id)
+        expires = _epoch(expires_at)
+
+        pipe = client.pipeline()
+        pipe.hset(cls.KEY.format(token_hash), mapping={
+            'user_id': user_id,
+            'device_info': device_info or '',
+            'ip_address': ip_address or '',
+            'created_at': now,
+            'last_used_at': now
+        })
+        pipe.expireat(cls.KEY.format(token_hash), expires)
+        pipe.zadd(user_key, {token_hash: now})
+        pipe.expireat(user_key, expires)
+        pipe.execute()
+
+        # Quitar del índice las sesiones ya caducadas y revocar las más antiguas sobre el límite
+        members = client.zrevrange(user_key, 0, -1)
+        alive = client.pipeline()
+        for member in members:
+            alive.exists(cls.KEY.format(member.decode('utf-8')))
+        live = [member for member, exists in zip(members, alive.execute()) if exists]
+        stale = [member for member in members if member not in live]
+        stale += live[current_app.config.get('SESSION_MAX_PER_USER', 10):]
+        if stale:
+            pipe = client.pipeline()
+            pipe.zrem(user_key, *stale)
+            pipe.delete(*[cls.KEY.format(member.decode('utf-8')) for member in stale])
+            pipe.execute()
+
+    @classmethod
+    def find(cls, token_hash):
+        user_id = cls._client().hget(cls.KEY.format(token_hash), 'user_id')
+        return int(user_id) if user_id is not None else None
+
+    @classmethod
+    def touch(cls, token_hash, used_at):
+        key = cls.KEY.format(token_hash)
+        client = cls._client()
+        if client.exists(key):
+            client.hset(key, 'last_used_at', _epoch(used_at))
+
+    @classmethod
+    def revoke(cls, token_hash):
+        client = cls._client()
+        key = cls.KEY.format(token_hash)
+        user_id = client.hget(key, 'user_id')
+        if user_id is None:
+            return False
+        pipe = client.pipeline()
+        pipe.delete(key)
+        pipe.zrem(cls.USER_KEY.format(int(user_id)), token_hash)
+        pipe.execute()
+        return True
+
+    @staticmethod
+    def purge(batch_size=1000, max_batches=None):
+        return 0
+
+    @staticmethod
+    def schedule_purge():
+        pass
+
+    @staticmethod
+    def flush_touches():
+        return 0
+
+
+def session_store():
+    """Session store selected by SESSION_STORE ('database' or 'redis')"""
+    if current_app.config.get('SESSION_STORE') == 'redis':
+        return RedisSessionStore
+    return DatabaseSessionStore
@@ -0,0 +1,173 @@
+"""
+Sistema de Tickets - Claves de Firma JWT
+Firma asimétrica (RS256/EdDSA) con identificadores de clave, rotación y JWKS
+"""
+
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import SigningKey, db
+
+try:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+    from jwt.algorithms import OKPAlgorithm, RSAAlgorithm  # PyJWT solo las define con cryptography
+except ImportError:  # cryptography es opcional: solo hace falta para RS256/EdDSA
+    serialization = None
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'EdDSA')
+
+
+class LoadedKey:
+    """A signing key with its parsed private and public halves"""
+
+    __slots__ = ('kid', 'algorithm', 'private', 'public', 'activates_at', 'retires_at')
+
+    def __init__(self, row, passphrase):
+        self.kid = row.kid
+        self.algorithm = row.algorithm
+        pem = row.private_key.encode('utf-8')
+        try:
+            self.private = serialization.load_pem_private_key(pem, password=passphrase)
+        except TypeError:
+            # Clave guardada sin cifrar (anterior a JWT_KEY_ENCRYPTION_KEY): se usa hasta que se retire
+            self.private = serialization.load_pem_private_key(pem, password=None)
+        self.public = self.private.public_key()
+        self.activates_at = row.activates_at
+        self.retires_at = row.retires_at
+
+    def jwk(self):
+        exporter = RSAAlgorithm if self.algorithm == 'RS256' else OKPAlgorithm
+        return {**exporter.to_jwk(self.public, as_dict=True), 'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'}
+
+
+class SigningKeys:
+    """Per-process cache of the JWT signing keys stored in jwt_signing_keys
+
+    Tokens are signed with the newest active key and carry its kid. A new
+    key is created every JWT_KEY_ROTATION_DAYS, by `flask jwt rotate` or
+    lazily when signing. It is published in the JWKS right away but only
+    signs after JWT_KEY_PUBLISH_SECONDS, so verifiers that cache the JWKS
+    for less than that already know it. Old keys stay published until the
+    longest-lived token they signed has expired. Workers reload keys every
+    JWT_KEYS_REFRESH_SECONDS, or sooner when they see an unknown kid.
+    Private keys are stored as PEM encrypted with JWT_KEY_ENCRYPTION_KEY
+    (JWT_SECRET_KEY when unset), so database or replica access alone does
+    not reveal them.
+    """
+
+    _keys = []
+    _loaded_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        """Whether RS256/EdDSA can be used (the cryptography package is installed)"""
+        return serialization is not None
+
+    @staticmethod
+    def _passphrase():
+        config = current_app.config
+        return (config.get('JWT_KEY_ENCRYPTION_KEY') or config['JWT_SECRET_KEY']).encode('utf-8')
+
+    @classmethod
+    def _load(cls, force=False):
+        config = current_app.config
+        age = time.monotonic() - cls._loaded_at
+        # Un kid desconocido fuerza recarga, pero como mucho una vez por segundo
+        if age < (1 if force else config.get('JWT_KEYS_REFRESH_SECONDS', 60)):
+            return cls._keys
+
+        with cls._lock:
+            now = datetime.utcnow()
+            # Fuera de la sesión de la petición: sin autoflush de sus cambios pendientes ni réplicas
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    db.select(SigningKey.__table__).where(SigningKey.retires_at > now).order_by(SigningKey.activates_at)
+                ).all()
+            known = {key.kid: key for key in cls._keys}
+            passphrase = cls._passphrase()
+            cls._keys = [known.get(row.kid) or LoadedKey(row, passphrase) for row in rows]
+            cls._loaded_at = time.monotonic()
+            return cls._keys
+
+    @classmethod
+    def generate(cls, activates_at=None):
+        """Create and store a key for JWT_ALGORITHM; returns a detached SigningKey with its values"""
+        if not cls.available():
+            raise RuntimeError('RS256/EdDSA signing requires the cryptography package')
+
+        config = current_app.config
+        algorithm = config['JWT_ALGORITHM']
+        if algorithm == 'RS256':
+            private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        elif algorithm == 'EdDSA':
+            private = ed25519.Ed25519PrivateKey.generate()
+        else:
+            raise ValueError(f'Unsupported signing algorithm: {algorithm}')
+
+        activates_at = activates_at or datetime.utcnow()
+        lifetime = timedelta(days=config.get('JWT_KEY_ROTATION_DAYS', 30)) + config['JWT_REFRESH_TOKEN_EXPIRES']
+        values = {
+            'kid': secrets.token_urlsafe(12),
+            'algorithm': algorithm,
+            'private_key': private.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.BestAvailableEncryption(cls._passphrase())
+            ).decode('utf-8'),
+            'activates_at': activates_at,
+            'retires_at': activates_at + lifetime
+        }
+        # Conexión propia: se llama en mitad de logins y refrescos y no debe confirmar la sesión de la petición
+        with db.engine.begin() as conn:
+            conn.execute(db.insert(SigningKey), values)
+        cls._loaded_at = 0.0
+        return SigningKey(**values)
+
+    @classmethod
+    def rotate(cls):
+        """Add a key that starts signing after JWT_KEY_PUBLISH_SECONDS"""
+        lead = timedelta(seconds=current_app.config.get('JWT_KEY_PUBLISH_SECONDS', 600))
+        return cls.generate(datetime.utcnow() + lead)
+
+    @classmethod
+    def signing_key(cls):
+        """Newest active key for JWT_ALGORITHM, creating the first one or rotating when due"""
+        config = current_app.config
+        algorithm = config['JWT_ALGORITHM']
+
+        def usable(keys, now):
+            return [key for key in keys if key.algorithm == algorithm and key.activates_at <= now]
+
+        now = datetime.utcnow()
+        active = usable(cls._load(), now)
+        if not active:
+            cls.generate(now)
+            active = usable(cls._load(force=True), now)
+
+        current = active[-1]
+        if now - current.activates_at >= timedelta(days=config.get('JWT_KEY_ROTATION_DAYS', 30)):
+            # Rotación perezosa; antes se recarga por si otro proceso ya creó la siguiente clave
+            pending = [key for key in cls._load(force=True) if key.algorithm == algorithm and key.activates_at > now]
+            if not pending:
+                cls.rotate()
+        return current
+
+    @classmethod
+    def verification_key(cls, kid):
+        """Published key for kid, or None"""
+        for attempt in (False, True):
+            for key in cls._load(force=attempt):
+                if key.kid == kid:
+                    return key
+        return None
+
+    @classmethod
+    def jwks(cls):
+        """JSON Web Key Set with every published public key"""
+        if current_app.config['JWT_ALGORITHM'] not in ASYMMETRIC_ALGORITHMS:
+            return {'keys': []}
+        return {'keys': [key.jwk() for key in cls._load()]}
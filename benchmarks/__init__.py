@@ -0,0 +1,4 @@
+"""
+Sistema de Tickets - Benchmarks
+Arneses de carga y concurrencia que se ejecutan contra una app local con datos sembrados
+"""
@@ -0,0 +1,236 @@
+"""
+Benchmark for the in-memory sales cube behind /api/company/analytics/query
+
+Seeds one company with --items order items (default 1M) spread over
+events in several categories and cities and a year of purchase times,
+builds the cube once and then times a mix of group-by/filter queries.
+Before timing it checks the cube against SQL: totals, queries that match
+no rows (also on an empty cube) and an order item whose lower id commits
+after a higher one was already read. Exits with status 1 if a check fails.
+
+    python -m benchmarks.analytics_cube
+    python -m benchmarks.analytics_cube --items 200000 --no-numpy
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from app.models import User, Event, TicketType, Order, OrderItem, db, UserType, OrderStatus
+from app.utils import cube as cube_module
+from benchmarks.common import create_benchmark_app, analyze, percentile
+
+ITEMS_PER_ORDER = 4
+CHUNK = 10000
+CATEGORIES = ['Concierto', 'Teatro', 'Deportes', 'Conferencia', 'Festival']
+CITIES = ['Madrid', 'Barcelona', 'Sevilla', 'Valencia', 'Bilbao', 'Málaga']
+
+QUERIES = {
+    'total': {},
+    'byCategory': {'group_by': ['category']},
+    'byCityWeekday': {'group_by': ['city', 'weekday']},
+    'byHourFiltered': {'group_by': ['hour'], 'filters': {'city': ['Madrid', 'Sevilla']}},
+    'byDayEvent': {'group_by': ['day', 'event'], 'limit': 50},
+    'byTicketTypeOrders': {'group_by': ['ticketType'], 'measures': ('revenue', 'orders')},
+}
+
+
+def bulk_insert(model, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(db.insert(model), rows[start:start + CHUNK])
+
+
+def seed_sales(items, events=200, seed=7):
+    """Seed one company with `events` events and `items` order items; returns the company id"""
+    rng = random.Random(seed)
+    company = User(
+        email='cube-bench@example.com',
+        password_hash='!',
+        user_type=UserType.COMPANY,
+        first_name='Bench',
+        last_name='Company',
+        company_name='Bench Eventos'
+    )
+    customer = User(
+        email='cube-customer@example.com',
+        password_hash='!',
+        user_type=UserType.CUSTOMER,
+        first_name='Bench',
+        last_name='Customer'
+    )
+    db.session.add_all([company, customer])
+    db.session.flush()
+
+    bulk_insert(Event, [
+        {
+            'company_id': company.id,
+            'title': f'Evento {index}',
+            'event_date': datetime.utcnow() + timedelta(days=30 + index),
+            'venue': 'Recinto',
+            'city': rng.choice(CITIES),
+            'category': rng.choice(CATEGORIES),
+            'total_tickets': 100000,
+            'available_tickets': 0,
+            'base_price': 25
+        }
+        for index in range(events)
+    ])
+    event_ids = [row.id for row in db.session.query(Event.id).filter_by(company_id=company.id)]
+
+    bulk_insert(TicketType, [
+        {'event_id': event_id, 'name': name, 'price': price, 'quantity_available': 100000}
+        for event_id in event_ids
+        for name, price in (('General', 25), ('VIP', 80), ('Palco', 150))
+    ])
+    ticket_types = {}
+    for row in db.session.query(TicketType.id, TicketType.event_id, TicketType.price):
+        ticket_types.setdefault(row.event_id, []).append((row.id, float(row.price)))
+
+    orders = items // ITEMS_PER_ORDER
+    start = datetime.utcnow() - timedelta(days=365)
+    created = [start + timedelta(seconds=rng.randrange(365 * 86400)) for _ in range(orders)]
+    bulk_insert(Order, [
+        {
+            'user_id': customer.id,
+            'order_number': f'ORD-CUBE-{index:08d}',
+            'total_amount': 0,
+            'status': OrderStatus.COMPLETED,
+            'created_at': created[index]
+        }
+        for index in range(orders)
+    ])
+    order_ids = [row.id for row in db.session.query(Order.id).filter_by(user_id=customer.id).order_by(Order.id)]
+
+    rows = []
+    for order_id in order_ids:
+        for _ in range(ITEMS_PER_ORDER):
+            event_id = rng.choice(event_ids)
+            ticket_type_id, price = rng.choice(ticket_types[event_id])
+            quantity = rng.randint(1, 4)
+            rows.append({
+                'order_id': order_id,
+                'event_id': event_id,
+                'ticket_type_id': ticket_type_id,
+                'quantity': quantity,
+                'unit_price': price,
+                'total_price': price * quantity
+            })
+        if len(rows) >= CHUNK * 10:
+            bulk_insert(OrderItem, rows)
+            rows = []
+    bulk_insert(OrderItem, rows)
+    db.session.commit()
+    return company.id
+
+
+def sql_revenue(company_id):
+    return float(db.session.query(db.func.coalesce(db.func.sum(OrderItem.total_price), 0)).join(
+        Event, OrderItem.event_id == Event.id
+    ).filter(Event.company_id == company_id).scalar())
+
+
+def add_item(company_id, item_id, price):
+    """Insert one order item with an explicit id for the company's first event and ticket type"""
+    event_id, ticket_type_id = db.session.query(TicketType.event_id, TicketType.id).join(
+        Event, TicketType.event_id == Event.id
+    ).filter(Event.company_id == company_id).order_by(TicketType.id).first()
+    customer_id = db.session.query(User.id).filter_by(email='cube-customer@example.com').scalar()
+    order = Order(user_id=customer_id, order_number=f'ORD-CUBE-LATE-{item_id}', total_amount=price,
+                  status=OrderStatus.COMPLETED, created_at=datetime.utcnow())
+    db.session.add(order)
+    db.session.flush()
+    db.session.execute(db.insert(OrderItem), [{
+        'id': item_id, 'order_id': order.id, 'event_id': event_id, 'ticket_type_id': ticket_type_id,
+        'quantity': 1, 'unit_price': price, 'total_price': price
+    }])
+    db.session.commit()
+
+
+def run_checks(cube, company_id):
+    """Compare the cube with SQL and with the expected empty results; returns {check: ok}"""
+    checks = {}
+
+    def revenue():
+        return cube.query(measures=('revenue',))['totals']['revenue']
+
+    checks['totalsMatchSql'] = abs(revenue() - sql_revenue(company_id)) < 0.01
+
+    empty = cube.query(measures=('orders',), filters={'city': ['Ninguna']})
+    checks['ungroupedNoMatch'] = empty['rows'] == [] and empty['totals']['orders'] == 0
+    grouped = cube.query(group_by=['city'], measures=('revenue', 'orders'), filters={'city': ['Ninguna']})
+    checks['groupedNoMatch'] = grouped['rows'] == [] and grouped['groups'] == 0
+
+    empty_cube = cube_module.SalesCube(-1)
+    empty_cube.refresh()
+    result = empty_cube.query(measures=('orders',))
+    checks['emptyCube'] = result['rows'] == [] and result['totals']['orders'] == 0
+
+    # Un id menor que confirma después de que el cubo ya leyera uno mayor
+    last_id = db.session.query(db.func.max(OrderItem.id)).scalar()
+    add_item(company_id, last_id + 2, 10.0)
+    cube.refresh()
+    add_item(company_id, last_id + 1, 20.0)
+    cube.refresh()
+    cube.refresh()
+    checks['lateCommitCounted'] = abs(revenue() - sql_revenue(company_id)) < 0.01
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--no-numpy', action='store_true', help='Measure the pure Python fallback')
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    if args.no_numpy:
+        cube_module.np = None
+
+    app = create_benchmark_app(args.database_url)
+    with app.app_context():
+        started = time.perf_counter()
+        company_id = seed_sales(args.items)
+        analyze()
+        seed_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        cube = cube_module.SalesCube(company_id)
+        cube.refresh()
+        build_seconds = time.perf_counter() - started
+
+        checks = run_checks(cube, company_id)
+
+    report = {
+        'items': len(cube),
+        'numpy': cube_module.np is not None,
+        'seedSeconds': round(seed_seconds, 1),
+        'buildSeconds': round(build_seconds, 2),
+        'checks': checks,
+        'queries': {}
+    }
+    repeat = 3 if args.no_numpy else args.repeat
+    for name, query in QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = cube.query(**query)
+            samples.append((time.perf_counter() - started) * 1000)
+        report['queries'][name] = {
+            'groups': result['groups'],
+            'p50Ms': round(percentile(samples, 50), 2),
+            'p95Ms': round(percentile(samples, 95), 2)
+        }
+
+    print(json.dumps(report, indent=2))
+    failed = [name for name, ok in checks.items() if not ok]
+    if failed:
+        print(f'FAIL: {", ".join(failed)}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Benchmark for the streaming attendee export
+
+Seeds one event with --tickets tickets (default 50k) and downloads
+GET /api/company/events/<id>/attendees/export in each format, reporting
+time to first byte, total time, bytes and peak Python memory while the
+response is consumed.
+
+    python -m benchmarks.attendee_export
+    python -m benchmarks.attendee_export --tickets 200000 --database-url mysql+pymysql://root:@localhost/tickets_bench
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from benchmarks.common import create_benchmark_app, auth_headers, seed_event, analyze
+
+
+def consume(client, url, headers):
+    """Download url chunk by chunk; returns (status, seconds to first chunk, seconds, bytes)"""
+    started = time.perf_counter()
+    response = client.get(url, headers=headers, buffered=False)
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - started
+    return response.status_code, first_byte or elapsed, elapsed, size
+
+
+def measure(client, url, headers):
+    status, first_byte, elapsed, size = consume(client, url, headers)
+
+    # Memoria en una segunda descarga: tracemalloc distorsiona los tiempos
+    tracemalloc.start()
+    consume(client, url, headers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status': status,
+        'firstByteMs': round(first_byte * 1000, 2),
+        'totalMs': round(elapsed * 1000, 2),
+        'bytes': size,
+        'peakMemoryKb': round(peak / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickets', type=int, default=50000)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    app = create_benchmark_app(args.database_url)
+    with app.app_context():
+        company, event, _ = seed_event(args.tickets)
+        analyze()
+        headers = auth_headers(app, company)
+        event_id = event.id
+
+    client = app.test_client()
+    report = {'tickets': args.tickets}
+    for fmt in ('csv', 'ndjson'):
+        report[fmt] = measure(client, f'/api/company/events/{event_id}/attendees/export?format={fmt}', headers)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Shared setup for the benchmark harnesses: app factory and seed helpers
+"""
+
+import os
+from datetime import datetime, timedelta
+from config import TestingConfig
+from main import create_app
+from app.models import User, Event, TicketType, Order, Ticket, db, UserType, OrderStatus, TicketStatus
+from app.utils.auth import JWTManager
+
+DEFAULT_DATABASE_URL = 'sqlite:///' + os.path.join(os.path.dirname(__file__), 'benchmark.db')
+
+
+class BenchmarkConfig(TestingConfig):
+    """Testing config with long-lived tokens and no rate limits"""
+    DEBUG = False
+    SQLALCHEMY_DATABASE_URI = DEFAULT_DATABASE_URL
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=1)
+    RATELIMIT_ENABLED = False
+
+
+def create_benchmark_app(database_url=None, reset=True):
+    """Create an app bound to the benchmark database, optionally recreating the schema"""
+    attrs = {}
+    if database_url and not database_url.startswith('sqlite'):
+        attrs = {
+            'SQLALCHEMY_DATABASE_URI': database_url,
+            'SQLALCHEMY_ENGINE_OPTIONS': {'pool_pre_ping': True, 'pool_size': 32, 'max_overflow': 32},
+        }
+    elif database_url:
+        attrs = {'SQLALCHEMY_DATABASE_URI': database_url}
+
+    app = create_app(type('BenchmarkRunConfig', (BenchmarkConfig,), attrs))
+    if reset:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+    return app
+
+
+def auth_headers(app, user):
+    """Issue an access token for user and return request headers"""
+    with app.test_request_context():
+        access_token, _ = JWTManager.generate_tokens(user)
+    return {'Authorization': f'Bearer {access_token}'}
+
+
+def seed_event(tickets=1000, email='bench-company@example.com'):
+    """Seed a company, one event and `tickets` valid tickets; returns (company, event, ticket_numbers)"""
+    company = User(
+        email=email,
+        password_hash='!',
+        user_type=UserType.COMPANY,
+        first_name='Bench',
+        last_name='Company',
+        company_name='Bench Eventos'
+    )
+    customer = User(
+        email=f'customer-{email}',
+        password_hash='!',
+        user_type=UserType.CUSTOMER,
+        first_name='Bench',
+        last_name='Customer'
+    )
+    db.session.add_all([company, customer])
+    db.session.flush()
+
+    event = Event(
+        company_id=company.id,
+        title='Bench Event',
+        event_date=datetime.utcnow() + timedelta(days=30),
+        venue='Estadio Benchmark',
+        city='Madrid',
+        total_tickets=tickets,
+        available_tickets=0,
+        base_price=10
+    )
+    db.session.add(event)
+    db.session.flush()
+
+    ticket_type = TicketType(event_id=event.id, name='General', price=10, quantity_available=tickets, quantity_sold=tickets)
+    order = Order(
+        user_id=customer.id,
+        order_number=f'ORD-BENCH-{event.id}',
+        total_amount=10 * tickets,
+        status=OrderStatus.COMPLETED
+    )
+    db.session.add_all([ticket_type, order])
+    db.session.flush()
+
+    ticket_numbers = [f'TCK-B{event.id}-{i:07d}' for i in range(tickets)]
+    db.session.execute(db.insert(Ticket), [
+        {
+            'order_id': order.id,
+            'event_id': event.id,
+            'ticket_type_id': ticket_type.id,
+            'ticket_number': number,
+            'qr_code': f'QR-{number}',
+            'event_name': event.title,
+            'event_location': event.venue,
+            'event_date': event.event_date,
+            'status': TicketStatus.VALID
+        }
+        for number in ticket_numbers
+    ])
+    db.session.commit()
+    return company, event, ticket_numbers
+
+
+def analyze():
+    """Refresh planner statistics after bulk seeding, as a long-lived database would have"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        db.session.execute(db.text('ANALYZE'))
+    elif dialect == 'mysql':
+        tables = ', '.join(db.metadata.tables)
+        db.session.execute(db.text(f'ANALYZE TABLE {tables}'))
+    db.session.commit()
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
@@ -0,0 +1,219 @@
+"""
+Benchmark for GET /api/company/buyers on a synthetic company
+
+Seeds one company with --buyers customers and --tickets tickets (default
+100k buyers / 1M tickets), then walks every page of the endpoint and
+reports per-page latency and the peak Python memory of a single page.
+With --sparse N only one customer in N bought from the company; the rest
+bought one ticket each from another company, so pages must skip them.
+
+    python -m benchmarks.company_buyers
+    python -m benchmarks.company_buyers --tickets 100000 --buyers 10000 --per-page 100
+    python -m benchmarks.company_buyers --tickets 20000 --buyers 2000 --sparse 50
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from app.models import User, Event, TicketType, Order, OrderItem, Ticket, db, UserType, OrderStatus, TicketStatus
+from benchmarks.common import create_benchmark_app, auth_headers, analyze, percentile
+
+TICKETS_PER_ORDER = 4
+CHUNK = 10000
+
+
+def bulk_insert(model, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(db.insert(model), rows[start:start + CHUNK])
+
+
+def seed_event(company, title, tickets):
+    event_date = datetime.utcnow() + timedelta(days=60)
+    event = Event(
+        company_id=company.id,
+        title=title,
+        event_date=event_date,
+        venue='Recinto Ferial',
+        city='Madrid',
+        total_tickets=tickets,
+        available_tickets=0,
+        base_price=25
+    )
+    db.session.add(event)
+    db.session.flush()
+
+    ticket_type = TicketType(event_id=event.id, name='General', price=25, quantity_available=tickets, quantity_sold=tickets)
+    db.session.add(ticket_type)
+    db.session.flush()
+    return event, ticket_type
+
+
+def seed_orders(event, ticket_type, user_ids, tickets, per_order, prefix):
+    """Orders of `per_order` tickets for `event`, assigned round-robin to `user_ids`"""
+    orders = (tickets + per_order - 1) // per_order
+    first_order_id = (db.session.query(db.func.max(Order.id)).scalar() or 0) + 1
+    now = datetime.utcnow()
+    bulk_insert(Order, [
+        {
+            'id': first_order_id + i,
+            'user_id': user_ids[i % len(user_ids)],
+            'order_number': f'ORD-{prefix}-{i:08d}',
+            'total_amount': 25 * per_order,
+            'status': OrderStatus.COMPLETED,
+            'created_at': now
+        }
+        for i in range(orders)
+    ])
+    bulk_insert(OrderItem, [
+        {
+            'order_id': first_order_id + i,
+            'event_id': event.id,
+            'ticket_type_id': ticket_type.id,
+            'quantity': per_order,
+            'unit_price': 25,
+            'total_price': 25 * per_order
+        }
+        for i in range(orders)
+    ])
+
+    for start in range(0, tickets, CHUNK):
+        db.session.execute(db.insert(Ticket), [
+            {
+                'order_id': first_order_id + i // per_order,
+                'event_id': event.id,
+                'ticket_type_id': ticket_type.id,
+                'ticket_number': f'TCK-{prefix}-{i:09d}',
+                'qr_code': f'QR-{prefix}-{i:09d}',
+                'event_name': event.title,
+                'event_location': event.venue,
+                'event_date': event.event_date,
+                'status': TicketStatus.VALID
+            }
+            for i in range(start, min(tickets, start + CHUNK))
+        ])
+
+
+def seed_company(tickets, buyers, sparse=1):
+    """Seed one company with one event, `buyers` customers and `tickets` tickets
+
+    With `sparse` > 1 there are `buyers * sparse` customers; all but one in
+    `sparse` bought a single ticket from another company instead.
+    """
+    company = User(
+        email='buyers-bench@example.com',
+        password_hash='!',
+        user_type=UserType.COMPANY,
+        first_name='Bench',
+        last_name='Company',
+        company_name='Bench Eventos'
+    )
+    db.session.add(company)
+    db.session.flush()
+
+    event, ticket_type = seed_event(company, 'Festival Benchmark', tickets)
+
+    first_user_id = company.id + 1
+    bulk_insert(User, [
+        {
+            'id': first_user_id + i,
+            'email': f'buyer{i}@example.com',
+            'password_hash': '!',
+            'user_type': UserType.CUSTOMER,
+            'first_name': 'Comprador',
+            'last_name': str(i),
+            'is_active': True
+        }
+        for i in range(buyers * sparse)
+    ])
+    user_ids = range(first_user_id, first_user_id + buyers * sparse)
+    seed_orders(event, ticket_type, user_ids[::sparse], tickets, TICKETS_PER_ORDER, 'BB')
+
+    others = [user_id for user_id in user_ids if (user_id - first_user_id) % sparse]
+    if others:
+        # Clientes de otra empresa intercalados entre los compradores
+        other = User(
+            email='buyers-bench-other@example.com',
+            password_hash='!',
+            user_type=UserType.COMPANY,
+            first_name='Other',
+            last_name='Company',
+            company_name='Otros Eventos'
+        )
+        db.session.add(other)
+        db.session.flush()
+        other_event, other_type = seed_event(other, 'Otro Festival', len(others))
+        seed_orders(other_event, other_type, others, len(others), 1, 'BO')
+
+    db.session.commit()
+    return company
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database-url', help='defaults to a SQLite file next to this script')
+    parser.add_argument('--tickets', type=int, default=1000000)
+    parser.add_argument('--buyers', type=int, default=100000)
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--sparse', type=int, default=1, help='one customer in N bought from the company')
+    parser.add_argument('--max-pages', type=int, default=50, help='stop after this many pages (0 = all)')
+    args = parser.parse_args(argv)
+
+    app = create_benchmark_app(args.database_url)
+    started = time.perf_counter()
+    with app.app_context():
+        company = seed_company(args.tickets, args.buyers, max(1, args.sparse))
+        analyze()
+        headers = auth_headers(app, company)
+        db.session.remove()
+    seed_seconds = time.perf_counter() - started
+
+    client = app.test_client()
+    latencies = []
+    buyers_seen = 0
+    cursor = 0
+
+    # Memoria pico de una página (tracemalloc distorsiona la latencia, se mide aparte)
+    tracemalloc.start()
+    client.get(f'/api/company/buyers?per_page={args.per_page}', headers=headers)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    while True:
+        started = time.perf_counter()
+        response = client.get(f'/api/company/buyers?per_page={args.per_page}&cursor={cursor}', headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        if response.status_code != 200:
+            print(f'FAIL: status {response.status_code}: {response.get_data(as_text=True)[:200]}', file=sys.stderr)
+            return 1
+
+        body = response.get_json()
+        buyers_seen += len(body['buyers'])
+        if not body['pagination']['hasNext'] or (args.max_pages and len(latencies) >= args.max_pages):
+            break
+        cursor = body['pagination']['nextCursor']
+
+    if not args.max_pages and buyers_seen != args.buyers:
+        print(f'FAIL: walked {buyers_seen} buyers, expected {args.buyers}', file=sys.stderr)
+        return 1
+
+    print(json.dumps({
+        'tickets': args.tickets,
+        'buyers': args.buyers,
+        'sparse': args.sparse,
+        'seedSeconds': round(seed_seconds, 1),
+        'pages': len(latencies),
+        'buyersSeen': buyers_seen,
+        'p50Ms': round(percentile(latencies, 50), 2),
+        'p95Ms': round(percentile(latencies, 95), 2),
+        'maxMs': round(max(latencies), 2),
+        'peakPageMemoryKb': round(peak_bytes / 1024, 1)
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
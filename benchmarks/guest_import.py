@@ -0,0 +1,96 @@
+"""
+Bulk guest import through /api/company/guests/import
+
+Seeds some existing customers, then imports a guest list where a share of
+rows already exist, repeat within the file or are invalid, and reports
+wall time and the per-status counts. --with-passwords makes that share of
+rows carry a password, which costs one bcrypt hash each.
+
+    python -m benchmarks.guest_import --rows 10000
+    python -m benchmarks.guest_import --rows 10000 --format csv --with-passwords 0.01
+"""
+
+import argparse
+import csv
+import io
+import json
+import time
+from app.models import User, db, UserType
+from benchmarks.common import auth_headers, create_benchmark_app, seed_event
+
+
+def build_rows(count, existing, with_passwords):
+    rows = []
+    password_every = int(1 / with_passwords) if with_passwords else 0
+    for index in range(count):
+        row = {'email': f'guest-{index}@example.com', 'firstName': 'Bench', 'lastName': 'Guest'}
+        if index % 50 == 1:
+            row['email'] = f'existing-{(index // 50) % existing}@example.com'
+        elif index % 50 == 2:
+            row['email'] = f'guest-{index - 2}@example.com'
+        elif index % 50 == 3:
+            row['email'] = 'not-an-email'
+        if password_every and index % password_every == 0:
+            row['password'] = 'Bench-Passw0rd!'
+        rows.append(row)
+    return rows
+
+
+def encode(rows, fmt):
+    if fmt == 'ndjson':
+        return '\n'.join(json.dumps(row) for row in rows), 'application/x-ndjson'
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=['email', 'firstName', 'lastName', 'password'])
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue(), 'text/csv'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='defaults to a SQLite file next to this script')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--existing', type=int, default=1000, help='customers seeded before the import')
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+    parser.add_argument('--with-passwords', type=float, default=0.0, help='fraction of rows with a password')
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS during the run')
+    args = parser.parse_args(argv)
+
+    app = create_benchmark_app(args.database_url)
+    app.config['BCRYPT_LOG_ROUNDS'] = args.rounds
+    app.config['GUEST_IMPORT_MAX_ROWS'] = max(args.rows, app.config['GUEST_IMPORT_MAX_ROWS'])
+    with app.app_context():
+        company, _, _ = seed_event(10)
+        db.session.execute(db.insert(User), [
+            {
+                'email': f'existing-{index}@example.com',
+                'password_hash': '!',
+                'user_type': UserType.CUSTOMER,
+                'first_name': 'Bench',
+                'last_name': 'Existing'
+            }
+            for index in range(args.existing)
+        ])
+        db.session.commit()
+        headers = auth_headers(app, company)
+        db.session.remove()
+
+    body, content_type = encode(build_rows(args.rows, args.existing, args.with_passwords), args.format)
+    client = app.test_client()
+    started = time.perf_counter()
+    response = client.post('/api/company/guests/import', headers=headers, data=body, content_type=content_type)
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'format': args.format,
+        'rows': args.rows,
+        'bodyBytes': len(body.encode('utf-8')),
+        'status': response.status_code,
+        'seconds': round(elapsed, 3),
+        'rowsPerSecond': round(args.rows / elapsed, 1),
+        'summary': response.get_json().get('summary')
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
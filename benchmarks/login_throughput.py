@@ -0,0 +1,134 @@
+"""
+Login throughput under concurrent load for /api/auth/login
+
+N threads log in as distinct users while a probe thread keeps requesting
+the public event list, so the report shows both login throughput and how
+much a login burst slows unrelated requests. --inline runs bcrypt in the
+request thread (the old behaviour) for comparison.
+
+    python -m benchmarks.login_throughput --threads 32 --logins 256
+    python -m benchmarks.login_throughput --inline
+    python -m benchmarks.login_throughput --stale-rounds 10   # every login also rehashes
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from app.models import User, db, UserType
+from app.utils.passwords import PasswordHasher
+from benchmarks.common import create_benchmark_app, seed_event, percentile
+
+PASSWORD = 'Bench-Passw0rd!'
+
+
+def seed_users(count, rounds):
+    """Seed `count` customers sharing one precomputed hash; returns their emails"""
+    password_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+    emails = [f'login-bench-{index}@example.com' for index in range(count)]
+    db.session.execute(db.insert(User), [
+        {
+            'email': email,
+            'password_hash': password_hash,
+            'user_type': UserType.CUSTOMER,
+            'first_name': 'Bench',
+            'last_name': 'Login'
+        }
+        for email in emails
+    ])
+    db.session.commit()
+    return emails
+
+
+def stats(samples, elapsed=None):
+    latencies = [latency * 1000 for _, latency in samples]
+    report = {
+        'requests': len(samples),
+        'ok': sum(1 for status, _ in samples if status == 200),
+        'shed': sum(1 for status, _ in samples if status == 503),
+        'p50Ms': round(percentile(latencies, 50), 2),
+        'p95Ms': round(percentile(latencies, 95), 2),
+        'p99Ms': round(percentile(latencies, 99), 2)
+    }
+    if elapsed:
+        report['seconds'] = round(elapsed, 3)
+        report['throughput'] = round(len(samples) / elapsed, 1)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='defaults to a SQLite file next to this script')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--logins', type=int, default=256)
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS during the run')
+    parser.add_argument('--stale-rounds', type=int, help='seed hashes at this cost so logins rehash them')
+    parser.add_argument('--inline', action='store_true', help='run bcrypt in the request thread')
+    args = parser.parse_args(argv)
+
+    if args.inline:
+        PasswordHasher._run = classmethod(lambda cls, fn, *fn_args: fn(*fn_args))
+
+    app = create_benchmark_app(args.database_url)
+    app.config['BCRYPT_LOG_ROUNDS'] = args.rounds
+    with app.app_context():
+        seed_event(10)
+        emails = seed_users(args.logins, args.stale_rounds or args.rounds)
+        db.session.remove()
+
+    client = app.test_client()
+    done = threading.Event()
+    probes = []
+
+    def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            response = client.get('/api/events')
+            probes.append((response.status_code, time.perf_counter() - started))
+            time.sleep(0.01)
+
+    def login(email):
+        started = time.perf_counter()
+        response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+        return response.status_code, time.perf_counter() - started
+
+    # Línea base del probe sin logins en curso
+    done.clear()
+    baseline_thread = threading.Thread(target=probe)
+    baseline_thread.start()
+    time.sleep(1)
+    done.set()
+    baseline_thread.join()
+    baseline, probes = probes, []
+
+    done.clear()
+    probe_thread = threading.Thread(target=probe)
+    probe_thread.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        samples = list(pool.map(login, emails))
+    elapsed = time.perf_counter() - started
+    done.set()
+    probe_thread.join()
+
+    with app.app_context():
+        rehashed = sum(
+            1 for (password_hash,) in db.session.query(User.password_hash).filter(User.email.in_(emails))
+            if not PasswordHasher.needs_rehash(password_hash)
+        ) if args.stale_rounds else None
+
+    print(json.dumps({
+        'mode': 'inline' if args.inline else 'pool',
+        'rounds': args.rounds,
+        'threads': args.threads,
+        'logins': stats(samples, elapsed),
+        'probeIdle': stats(baseline),
+        'probeUnderLoad': stats(probes),
+        'hashesAtConfiguredCost': rehashed
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""
+SQL query budgets for every API route
+
+Seeds the same fixture data set through the API at two sizes (--scale and
+four times that), requests every route once per size under
+app.utils.querycount.QueryCounter, and fails when a route exceeds its
+budget, runs more queries on the larger data set (which is how an N+1
+shows up) or answers with an unexpected status. Exits with status 1 on
+any failure, so it can gate CI.
+
+    python -m benchmarks.query_budgets
+    python -m benchmarks.query_budgets --scale 3 --verbose
+    python -m benchmarks.query_budgets --only /api/users
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+from app.models import db
+from app.utils.identity import IdentityCache
+from app.utils.querycount import QueryCounter
+from benchmarks.common import create_benchmark_app
+
+PASSWORD = 'Bench-Passw0rd!'
+PAYMENT_METHOD = {'type': 'CREDIT_CARD', 'cardType': 'visa', 'expiryMonth': 12, 'expiryYear': 2030,
+                  'cardNumber': '4111111111111111'}
+
+# (método, ruta, quién, cuerpo, presupuesto); {event}, {spare}, {ticket} y {method} se rellenan con el fixture
+ROUTES = [
+    ('POST', '/api/auth/register', None, 'register', 6),
+    ('POST', '/api/auth/login', None, 'login', 4),
+    ('POST', '/api/auth/refresh-token', None, 'refresh', 2),
+    ('GET', '/api/auth/me', 'customer', None, 1),
+    ('POST', '/api/auth/verify-email', 'customer', None, 2),
+    ('POST', '/api/auth/change-password', 'customer', 'change_password', 2),
+    ('POST', '/api/auth/logout', 'customer', 'logout', 2),
+    ('POST', '/api/auth/accept-invite', None, 'accept_invite', 6),
+    ('GET', '/api/users/profile', 'customer', None, 1),
+    ('PUT', '/api/users/profile', 'customer', 'profile', 3),
+    ('GET', '/api/users/tickets', 'customer', None, 2),
+    ('GET', '/api/users/orders', 'customer', None, 3),
+    ('POST', '/api/users/orders', 'customer', 'order', 13),
+    ('GET', '/api/users/payment-methods', 'customer', None, 1),
+    ('POST', '/api/users/payment-methods', 'customer', 'payment_method', 2),
+    ('PUT', '/api/users/payment-methods/{method}', 'customer', 'payment_method_update', 3),
+    ('DELETE', '/api/users/payment-methods/{method}', 'customer', None, 2),
+    ('POST', '/api/users/upload-avatar', 'customer', None, 0),
+    ('GET', '/api/payment-methods', 'customer', None, 1),
+    ('GET', '/api/events', None, None, 3),
+    ('GET', '/api/events/{event}', None, None, 2),
+    ('GET', '/api/events/featured', None, None, 1),
+    ('GET', '/api/events/categories', None, None, 1),
+    ('GET', '/api/events/cities', None, None, 1),
+    ('POST', '/api/events', 'company', 'event', 4),
+    ('POST', '/api/events/{event}/ticket-types', 'company', 'ticket_type', 3),
+    ('PATCH', '/api/events/{event}/status', 'company', 'status', 3),
+    ('DELETE', '/api/events/{spare}', 'company', None, 4),
+    ('GET', '/api/tickets/{ticket}', 'customer', None, 1),
+    ('GET', '/api/tickets/{ticket}/qr', 'customer', None, 1),
+    ('GET', '/api/tickets/{ticket}/download', 'customer', None, 1),
+    ('POST', '/api/tickets/validate', 'company', 'validate', 3),
+    ('POST', '/api/tickets/batch-validate', 'company', 'batch_validate', 3),
+    ('GET', '/api/tickets/events/{event}/manifest', 'company', None, 2),
+    ('POST', '/api/tickets/offline-scans', 'company', 'offline_scans', 2),
+    ('GET', '/api/company/events', 'company', None, 1),
+    ('GET', '/api/company/customers', 'company', None, 1),
+    ('GET', '/api/company/analytics', 'company', None, 5),
+    ('POST', '/api/company/analytics/query', 'company', 'analytics_query', 1),
+    ('GET', '/api/company/analytics/unique-buyers', 'company', None, 1),
+    ('GET', '/api/company/analytics/leaderboard', 'company', None, 2),
+    ('GET', '/api/company/events/{event}/attendees', 'company', None, 3),
+    ('GET', '/api/company/events/{event}/attendees/export', 'company', None, 2),
+    ('GET', '/api/company/events/{event}/entries/stream', 'company', None, 2),
+    ('GET', '/api/company/orders/export', 'company', None, 1),
+    ('GET', '/api/company/dashboard', 'company', None, 2),
+    ('GET', '/api/company/buyers', 'company', None, 3),
+    ('POST', '/api/company/guests/import', 'company', 'guests', 3),
+    ('GET', '/api/health', None, None, 0),
+    ('GET', '/api/version', None, None, 0),
+    ('GET', '/api/metrics', None, None, 0),
+    ('GET', '/.well-known/jwks.json', None, None, 0),
+    ('POST', '/api/init-db', None, None, 15),
+]
+
+# Estado esperado cuando no es 2xx
+EXPECTED_STATUS = {('POST', '/api/users/upload-avatar'): 501}
+
+# Respuestas SSE que no terminan: solo se lee el primer mensaje
+STREAMS = {'/api/company/events/{event}/entries/stream'}
+
+# Rutas cuyo número de consultas crece con el tamaño de la respuesta a propósito (streams por lotes)
+GROWS_WITH_DATA = {'/api/company/events/{event}/attendees/export', '/api/company/orders/export'}
+
+
+def seed(client, scale):
+    """Create companies, events, customers and orders through the API; returns the fixture"""
+    def register(email, user_type):
+        response = client.post('/api/auth/register', json={
+            'email': email, 'password': PASSWORD, 'firstName': 'Bench', 'lastName': 'User',
+            'userType': user_type, 'companyName': 'Bench Eventos' if user_type == 'company' else None
+        })
+        assert response.status_code == 201, response.get_json()
+        body = response.get_json()
+        return {'Authorization': f"Bearer {body['token']}"}, body
+
+    company, _ = register(f'company-{scale}@example.com', 'company')
+    events = []
+    for index in range(3 * scale):
+        response = client.post('/api/events', headers=company, json={
+            'title': f'Evento {index}', 'description': 'Fixture', 'venue': 'Estadio', 'city': f'Ciudad {index % 4}',
+            'category': f'Categoría {index % 3}', 'totalTickets': 1000, 'basePrice': 20,
+            'eventDate': (datetime.utcnow() + timedelta(days=10 + index)).isoformat()
+        })
+        assert response.status_code == 201, response.get_json()
+        event = response.get_json()['event']
+        for name in ('VIP', 'Palco'):
+            client.post(f"/api/events/{event['id']}/ticket-types", headers=company, json={
+                'name': name, 'price': 50, 'quantityAvailable': 100
+            })
+        events.append(event)
+
+    customers = []
+    for index in range(2 * scale):
+        headers, body = register(f'customer-{scale}-{index}@example.com', 'customer')
+        customers.append((headers, body))
+        for first in range(0, len(events), 2):
+            items = [
+                {'eventId': event['id'], 'ticketTypeId': event['ticketTypes'][0]['id'], 'quantity': 2, 'unitPrice': 20, 'totalPrice': 40}
+                for event in events[first:first + 2]
+            ]
+            response = client.post('/api/users/orders', headers=headers, json={'items': items, 'paymentMethod': 'credit-card'})
+            assert response.status_code == 201, response.get_json()
+
+    # Evento sin pedidos para poder borrarlo, método de pago e invitación pendiente
+    response = client.post('/api/events', headers=company, json={
+        'title': 'Sin ventas', 'description': 'Fixture', 'venue': 'Sala', 'totalTickets': 10, 'basePrice': 10,
+        'eventDate': (datetime.utcnow() + timedelta(days=90)).isoformat()
+    })
+    assert response.status_code == 201, response.get_json()
+    spare = response.get_json()['event']['id']
+
+    customer_headers, customer = customers[0]
+    response = client.post('/api/users/payment-methods', headers=customer_headers, json=PAYMENT_METHOD)
+    assert response.status_code == 201, response.get_json()
+    method = response.get_json()['paymentMethod']['id']
+
+    response = client.post('/api/company/guests/import', headers=company, content_type='application/x-ndjson', data=json.dumps(
+        {'email': f'invited-{scale}@example.com', 'firstName': 'Invitado', 'lastName': 'Bench'}
+    ))
+    assert response.status_code == 200, response.get_json()
+    invite_token = response.get_json()['results'][0]['inviteToken']
+
+    tickets = client.get('/api/users/tickets', headers=customer_headers).get_json()['tickets']
+    return {
+        'company': company,
+        'customer': customer_headers,
+        'customerBody': customer,
+        'events': events,
+        'event': events[0]['id'],
+        'spare': spare,
+        'method': method,
+        'inviteToken': invite_token,
+        'ticket': tickets[0]['id'],
+        'ticketNumbers': [ticket['ticketNumber'] for ticket in tickets],
+        'scale': scale
+    }
+
+
+def body_for(name, fixture, run):
+    """Request body for a route; `run` keeps unique values unique across sizes"""
+    tag = f"{fixture['scale']}-{run}"
+    ticket_numbers = fixture['ticketNumbers']
+    # Las rutas por lotes reciben más elementos en la pasada grande: su coste debe seguir constante
+    bodies = {
+        'register': {'email': f'new-{tag}@example.com', 'password': PASSWORD, 'firstName': 'Nuevo',
+                     'lastName': 'Cliente', 'userType': 'customer'},
+        'login': {'email': fixture['customerBody']['user']['email'], 'password': PASSWORD},
+        'refresh': {'refreshToken': fixture['customerBody']['refreshToken']},
+        'change_password': {'currentPassword': PASSWORD, 'newPassword': PASSWORD},
+        'logout': {},
+        'profile': {'firstName': 'Cambiado'},
+        'order': {'items': [
+            {'eventId': other['id'], 'ticketTypeId': other['ticketTypes'][0]['id'], 'quantity': 1, 'unitPrice': 20, 'totalPrice': 20}
+            for other in fixture['events']
+        ], 'paymentMethod': 'credit-card'},
+        'payment_method': PAYMENT_METHOD,
+        'payment_method_update': {'isDefault': True},
+        'accept_invite': {'token': fixture['inviteToken'], 'password': PASSWORD},
+        'event': {'title': f'Nuevo {tag}', 'description': 'Fixture', 'venue': 'Sala', 'totalTickets': 100, 'basePrice': 10,
+                  'eventDate': (datetime.utcnow() + timedelta(days=60)).isoformat()},
+        'ticket_type': {'name': f'Extra {tag}', 'price': 30, 'quantityAvailable': 10},
+        'status': {'isActive': True},
+        'validate': {'qrCode': ticket_numbers[0], 'validationMethod': 'qr_scan'},
+        'batch_validate': {'qrCodes': ticket_numbers[1:]},
+        'offline_scans': {'eventId': fixture['event'], 'scans': [
+            {'qrCode': number, 'scannedAt': datetime.utcnow().isoformat()} for number in ticket_numbers
+        ]},
+        'analytics_query': {'groupBy': ['event'], 'measures': ['revenue', 'tickets']},
+    }
+    return bodies[name]
+
+
+def measure(app, fixture, routes, run):
+    client = app.test_client()
+    results = {}
+    for method, path, who, body_name, _ in routes:
+        url = path.format(event=fixture['event'], spare=fixture['spare'], ticket=fixture['ticket'], method=fixture['method'])
+        headers = fixture[who] if who else {}
+        kwargs = {'headers': headers}
+        if body_name == 'guests':
+            kwargs.update(data='\n'.join(
+                json.dumps({'email': f'guest-{fixture["scale"]}-{run}-{index}@example.com', 'firstName': 'Invitado', 'lastName': 'Bench'})
+                for index in range(20 * fixture['scale'])
+            ), content_type='application/x-ndjson')
+        elif body_name:
+            kwargs['json'] = body_for(body_name, fixture, run)
+        if body_name == 'logout':
+            # Cerrar sesión revoca el token: se usa uno nuevo, emitido fuera del contador
+            login = client.post('/api/auth/login', json=body_for('login', fixture, run)).get_json()
+            kwargs['headers'] = {'Authorization': f"Bearer {login['token']}"}
+
+        with app.app_context():
+            # Principal del usuario en caché, como en un proceso ya caliente
+            IdentityCache.local.clear()
+        if who:
+            client.get('/api/auth/me', headers=kwargs['headers'])
+
+        with QueryCounter() as counter:
+            if path in STREAMS:
+                response = client.open(url, method=method, buffered=False, **kwargs)
+                next(iter(response.response), None)
+                response.close()
+            else:
+                response = client.open(url, method=method, **kwargs)
+                response.get_data()
+        results[method, path] = (response.status_code, counter.count, counter.statements)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='defaults to a SQLite file next to this script')
+    parser.add_argument('--scale', type=int, default=1, help='fixture size; the second pass uses 4x')
+    parser.add_argument('--only', help='only routes whose path starts with this prefix')
+    parser.add_argument('--verbose', action='store_true', help='print the statements of failing routes')
+    args = parser.parse_args(argv)
+
+    routes = [route for route in ROUTES if not args.only or route[1].startswith(args.only)]
+    passes = []
+    for run, scale in enumerate((args.scale, args.scale * 4)):
+        app = create_benchmark_app(args.database_url)
+        client = app.test_client()
+        fixture = seed(client, scale)
+        passes.append(measure(app, fixture, routes, run))
+        with app.app_context():
+            db.session.remove()
+
+    small, large = passes
+    failures = 0
+    print(f"{'route':<58} {'status':>6} {'small':>6} {'large':>6} {'budget':>6}")
+    for method, path, _, _, budget in routes:
+        small_status, small_count, _ = small[method, path]
+        status, large_count, statements = large[method, path]
+        expected = EXPECTED_STATUS.get((method, path))
+        problems = []
+        if any(code != expected if expected else not 200 <= code < 300 for code in (small_status, status)):
+            problems.append(f'status {small_status}/{status}')
+        if large_count > budget:
+            problems.append('over budget')
+        if large_count > small_count and path not in GROWS_WITH_DATA:
+            problems.append('grows with data')
+        failures += bool(problems)
+        print(f"{method + ' ' + path:<58} {status:>6} {small_count:>6} {large_count:>6} {budget:>6}  {', '.join(problems)}")
+        if problems and args.verbose:
+            for index, statement in enumerate(statements, 1):
+                print(f"    {index}. {' '.join(statement.split())[:160]}")
+
+    print(f'\n{len(routes) - failures}/{len(routes)} routes within budget with the expected status')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
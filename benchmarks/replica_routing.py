@@ -0,0 +1,135 @@
+"""
+Read-replica routing check with two SQLite files
+
+Seeds a primary database, copies it to a replica file and renames the
+event on the replica only, so each response shows which database served
+it. Checks that @replica_reads routes read from a healthy replica, that
+routes without it and users who just wrote read from the primary, and
+that a lagging or unreachable replica is skipped. The lag probe runs in
+a background thread; the check refreshes it after each change instead of
+waiting for the interval. Exits with status 1 on any failure.
+
+    python -m benchmarks.replica_routing
+    python -m benchmarks.replica_routing --dir /tmp/replicas
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+import sqlalchemy as sa
+from main import create_app
+from app.models import db
+from app.utils.replicas import heartbeat_table, replica_router
+from benchmarks.common import BenchmarkConfig, auth_headers, seed_event
+
+
+def set_replica_beat(engine, beat_at):
+    """Write the replica's heartbeat row as if replication had copied it at `beat_at`"""
+    with engine.begin() as conn:
+        conn.execute(sa.delete(heartbeat_table))
+        conn.execute(sa.insert(heartbeat_table).values(id=1, beat_at=beat_at))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--dir', help='directory for primary.db and replica.db (defaults to a temporary one)')
+    args = parser.parse_args(argv)
+
+    directory = args.dir or tempfile.mkdtemp(prefix='replica-routing-')
+    os.makedirs(directory, exist_ok=True)
+    primary_path = os.path.join(directory, 'primary.db')
+    replica_path = os.path.join(directory, 'replica.db')
+    for path in (primary_path, replica_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    # La sonda en segundo plano no se repite sola durante la prueba: cada escenario la refresca
+    app = create_app(type('ReplicaRoutingConfig', (BenchmarkConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary_path}',
+        'SQLALCHEMY_BINDS': {'replica_0': f'sqlite:///{replica_path}'},
+        'REPLICA_LAG_CHECK_SECONDS': 3600,
+        'REPLICA_MAX_LAG_SECONDS': 10,
+        'REPLICA_STICKY_SECONDS': 60
+    }))
+
+    with app.app_context():
+        db.create_all()
+        company, event, _ = seed_event(tickets=10)
+        company_headers = auth_headers(app, company)
+        event_id = event.id
+        primary_title = event.title
+        replica_title = f'{event.title} (replica)'
+        db.session.remove()
+        db.engines[None].dispose()
+
+        # "Replicación": copia del fichero y una diferencia visible solo en la réplica
+        shutil.copyfile(primary_path, replica_path)
+        replica = db.engines['replica_0']
+        with replica.begin() as conn:
+            conn.execute(sa.text('UPDATE events SET title = :title WHERE id = :id'), {'title': replica_title, 'id': event_id})
+        set_replica_beat(replica, datetime.utcnow() + timedelta(hours=1))
+        replica_router.start(db.engines)
+        replica_router.refresh(db.engines)
+
+    client = app.test_client()
+    results = []
+
+    def check(name, response, expected, titles):
+        found = titles(response.get_json() or {}) if response.status_code == 200 else []
+        ok = response.status_code == 200 and expected in found
+        results.append({'check': name, 'status': response.status_code, 'expected': expected, 'titles': found, 'ok': ok})
+
+    def event_title(body):
+        return [body.get('event', body).get('title')]
+
+    def company_titles(body):
+        return [event['title'] for event in body.get('events', [])]
+
+    def dashboard_titles(body):
+        return [event['title'] for event in body.get('dashboard', {}).get('recentEvents', [])]
+
+    check('catalog read uses the healthy replica',
+          client.get(f'/api/events/{event_id}'), replica_title, event_title)
+    check('company read uses the healthy replica',
+          client.get('/api/company/events', headers=company_headers), replica_title, company_titles)
+    check('route without @replica_reads stays on the primary',
+          client.get('/api/company/dashboard', headers=company_headers), primary_title, dashboard_titles)
+
+    response = client.post('/api/events', headers=company_headers, json={
+        'title': 'Escrito en el primario', 'description': 'Replica check', 'venue': 'Sala', 'totalTickets': 10,
+        'basePrice': 10, 'eventDate': (datetime.utcnow() + timedelta(days=30)).isoformat()
+    })
+    results.append({'check': 'write accepted', 'status': response.status_code, 'ok': response.status_code == 201})
+    check('writer is pinned to the primary',
+          client.get('/api/company/events', headers=company_headers), 'Escrito en el primario', company_titles)
+    check('other readers keep using the replica',
+          client.get(f'/api/events/{event_id}'), replica_title, event_title)
+
+    with app.app_context():
+        set_replica_beat(db.engines['replica_0'], datetime.utcnow() - timedelta(hours=1))
+        replica_router.refresh(db.engines)
+    check('lagging replica falls back to the primary',
+          client.get(f'/api/events/{event_id}'), primary_title, event_title)
+
+    with app.app_context():
+        with db.engines['replica_0'].begin() as conn:
+            conn.execute(sa.text('DROP TABLE replica_heartbeat'))
+        replica_router.refresh(db.engines)
+    check('unreachable replica falls back to the primary',
+          client.get(f'/api/events/{event_id}'), primary_title, event_title)
+
+    print(json.dumps({'directory': directory, 'lags': replica_router.lags, 'checks': results}, indent=2, default=str))
+    failed = [result['check'] for result in results if not result['ok']]
+    if failed:
+        print(f'FAIL: {len(failed)} check(s) failed: {", ".join(failed)}', file=sys.stderr)
+        return 1
+    print(f'{len(results)}/{len(results)} replica routing checks passed')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
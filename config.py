@@ -27,11 +27,23 @@ class Config:
         'max_overflow': 10,
     }
     
+    # Read Replica Configuration
+    DATABASE_REPLICA_URLS = [url.strip() for url in config('DATABASE_REPLICA_URLS', default='').split(',') if url.strip()]
+    SQLALCHEMY_BINDS = {f'replica_{index}': url for index, url in enumerate(DATABASE_REPLICA_URLS)}
+    REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=10, cast=int)
+    REPLICA_LAG_CHECK_SECONDS = config('REPLICA_LAG_CHECK_SECONDS', default=5, cast=int)
+    REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+    
     # JWT Configuration
     JWT_SECRET_KEY = config('JWT_SECRET_KEY', default='your-super-secret-jwt-key-change-in-production-12345')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(seconds=config('JWT_ACCESS_TOKEN_EXPIRES', default=900, cast=int))  # 15 minutes
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(seconds=config('JWT_REFRESH_TOKEN_EXPIRES', default=604800, cast=int))  # 7 days
-    JWT_ALGORITHM = 'HS256'
+    JWT_ALGORITHM = config('JWT_ALGORITHM', default='HS256')  # HS256, RS256 o EdDSA (JWKS)
+    JWT_KEY_ROTATION_DAYS = config('JWT_KEY_ROTATION_DAYS', default=30, cast=int)
+    JWT_KEY_PUBLISH_SECONDS = config('JWT_KEY_PUBLISH_SECONDS', default=600, cast=int)
+    JWT_KEYS_REFRESH_SECONDS = config('JWT_KEYS_REFRESH_SECONDS', default=60, cast=int)
+    JWT_KEY_ENCRYPTION_KEY = config('JWT_KEY_ENCRYPTION_KEY', default='')  # Cifra las claves privadas en BD; vacío: JWT_SECRET_KEY
+    JWKS_MAX_AGE = config('JWKS_MAX_AGE', default=300, cast=int)
     JWT_TOKEN_LOCATION = ['headers']
     JWT_HEADER_NAME = 'Authorization'
     JWT_HEADER_TYPE = 'Bearer'
@@ -47,6 +59,25 @@ class Config:
     REDIS_DB = config('REDIS_DB', default=0, cast=int)
     REDIS_PASSWORD = config('REDIS_PASSWORD', default=None)
     REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
+    REDIS_CACHE_ENABLED = config('REDIS_CACHE_ENABLED', default=False, cast=bool)  # Caché compartida entre procesos
+    
+    # Session Configuration
+    SESSION_STORE = config('SESSION_STORE', default='database')  # 'database' o 'redis'
+    SESSION_MAX_PER_USER = config('SESSION_MAX_PER_USER', default=10, cast=int)
+    SESSION_PURGE_INTERVAL_SECONDS = config('SESSION_PURGE_INTERVAL_SECONDS', default=300, cast=int)  # 0 = solo CLI
+    SESSION_PURGE_BATCH = config('SESSION_PURGE_BATCH', default=1000, cast=int)
+    SESSION_PURGE_MAX_BATCHES = config('SESSION_PURGE_MAX_BATCHES', default=50, cast=int)
+    SESSION_CACHE_TTL = config('SESSION_CACHE_TTL', default=30, cast=int)
+    SESSION_TOUCH_FLUSH_SECONDS = config('SESSION_TOUCH_FLUSH_SECONDS', default=60, cast=int)
+    SESSION_TOUCH_BATCH = config('SESSION_TOUCH_BATCH', default=500, cast=int)
+    
+    # Token Revocation Configuration
+    BLOCKLIST_CAPACITY = config('BLOCKLIST_CAPACITY', default=100000, cast=int)
+    BLOCKLIST_FALSE_POSITIVE_RATE = config('BLOCKLIST_FALSE_POSITIVE_RATE', default=0.001, cast=float)
+    BLOCKLIST_SYNC_SECONDS = config('BLOCKLIST_SYNC_SECONDS', default=1, cast=int)
+    
+    # Identity Cache Configuration
+    IDENTITY_CACHE_TTL = config('IDENTITY_CACHE_TTL', default=30, cast=int)
     
     # File Upload Configuration
     MAX_CONTENT_LENGTH = config('MAX_CONTENT_LENGTH', default=5242880, cast=int)  # 5MB
@@ -54,8 +85,17 @@ class Config:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
     
     # Rate Limiting Configuration
-    RATELIMIT_STORAGE_URL = config('RATELIMIT_STORAGE_URL', default='memory://')
-    RATELIMIT_DEFAULT = "100 per minute"
+    RATELIMIT_STORAGE_URL = config('RATELIMIT_STORAGE_URL', default='memory://')  # redis://host:6379/1 para compartir entre workers
+    RATELIMIT_STRATEGY = config('RATELIMIT_STRATEGY', default='sliding-window-counter')
+    RATELIMIT_DEFAULT = config('RATELIMIT_DEFAULT', default='100 per minute;1000 per hour')
+    RATELIMIT_HEADERS_ENABLED = True
+    RATELIMIT_SWALLOW_ERRORS = True  # Si Redis cae, no se bloquean peticiones
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = True
+    RATELIMIT_LOGIN = config('RATELIMIT_LOGIN', default='10 per minute')  # Por IP
+    RATELIMIT_LOGIN_ACCOUNT = config('RATELIMIT_LOGIN_ACCOUNT', default='5 per minute')  # Por email
+    RATELIMIT_REGISTER = config('RATELIMIT_REGISTER', default='5 per minute')
+    RATELIMIT_CATALOG = config('RATELIMIT_CATALOG', default='600 per minute')
+    RATELIMIT_SCANS = config('RATELIMIT_SCANS', default='60 per minute')  # Cuentas no-escáner
     
     # CORS Configuration
     CORS_ORIGINS = [
@@ -67,7 +107,9 @@ class Config:
     ]
     
     # Security Configuration
-    BCRYPT_LOG_ROUNDS = 12
+    BCRYPT_LOG_ROUNDS = config('BCRYPT_LOG_ROUNDS', default=12, cast=int)
+    PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=0, cast=int)  # 0 = un hilo por núcleo
+    PASSWORD_HASH_QUEUE = config('PASSWORD_HASH_QUEUE', default=64, cast=int)
     PASSWORD_MIN_LENGTH = 8
     
     # Pagination defaults
@@ -82,6 +124,26 @@ class Config:
     QR_CODE_SIZE = 10
     QR_CODE_BORDER = 4
     
+    # Scanner Configuration
+    BATCH_VALIDATE_LIMIT = config('BATCH_VALIDATE_LIMIT', default=5000, cast=int)
+    OFFLINE_SCAN_BATCH_LIMIT = config('OFFLINE_SCAN_BATCH_LIMIT', default=5000, cast=int)
+    SCAN_MANIFEST_OVERLAP_SECONDS = config('SCAN_MANIFEST_OVERLAP_SECONDS', default=300, cast=int)  # Margen para commits tardíos en deltas
+    
+    # Guest Import Configuration
+    GUEST_IMPORT_MAX_ROWS = config('GUEST_IMPORT_MAX_ROWS', default=20000, cast=int)
+    GUEST_IMPORT_BATCH = config('GUEST_IMPORT_BATCH', default=1000, cast=int)
+    GUEST_INVITE_EXPIRES = timedelta(days=config('GUEST_INVITE_DAYS', default=14, cast=int))
+    
+    # Analytics Configuration
+    DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=60, cast=int)
+    ANALYTICS_CUBE_REFRESH_SECONDS = config('ANALYTICS_CUBE_REFRESH_SECONDS', default=5, cast=int)
+    ANALYTICS_CUBE_REBUILD_SECONDS = config('ANALYTICS_CUBE_REBUILD_SECONDS', default=3600, cast=int)
+    ANALYTICS_CUBE_RESCAN_SECONDS = config('ANALYTICS_CUBE_RESCAN_SECONDS', default=120, cast=int)  # Transacciones más largas esperan al rebuild
+    
+    # Metrics Configuration
+    METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+    METRICS_TOKEN = config('METRICS_TOKEN', default='')  # Si se define, /api/metrics exige "Authorization: Bearer <token>"
+    
     # Email Configuration (for future email verification)
     MAIL_SERVER = config('MAIL_SERVER', default='smtp.gmail.com')
     MAIL_PORT = config('MAIL_PORT', default=587, cast=int)
@@ -1,4 +1,5 @@
-from flask import Flask, request
+import hmac
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from config import Config
 from app.models import db
@@ -8,14 +9,21 @@ from app.routes.events import events_bp
 from app.routes.tickets import tickets_bp
 from app.routes.company import company_bp
 from app.routes.payment_methods import payment_methods_bp
-from app.middleware import init_limiter
+from app.middleware import init_limiter, limiter
 from app.utils.auth import init_jwt
+from app.utils.replicas import init_replicas
+from app.utils.metrics import init_metrics, metrics, pool_gauges
+from app.utils.signing import SigningKeys
+from app.commands import init_commands
 
 def create_app(config_class=Config):
     """Application factory pattern"""
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # ✅ Métricas antes de la base de datos: fijan la clase de pool de cada engine
+    init_metrics(app)
+    
     # ✅ Inicializar base de datos
     db.init_app(app)
     
@@ -28,7 +36,9 @@ def create_app(config_class=Config):
     
     # ✅ JWT y Limiter
     init_jwt(app)
+    init_replicas(app)
     init_limiter(app)
+    init_commands(app)
     
     print(f"🔧 Configuración de base de datos: {app.config['SQLALCHEMY_DATABASE_URI']}")
     
@@ -45,6 +55,24 @@ def create_app(config_class=Config):
     def health_check():
         return {'status': 'OK', 'message': 'API is running'}, 200
 
+    @app.route('/.well-known/jwks.json', methods=['GET'])
+    def jwks():
+        """Public keys for verifying RS256/EdDSA tokens offline"""
+        response = jsonify(SigningKeys.jwks())
+        response.headers['Cache-Control'] = f"public, max-age={app.config['JWKS_MAX_AGE']}"
+        return response
+
+    if app.config.get('METRICS_ENABLED', True):
+        @app.route('/api/metrics', methods=['GET'])
+        @limiter.exempt
+        def prometheus_metrics():
+            """Prometheus scrape endpoint with this worker's counters"""
+            token = app.config.get('METRICS_TOKEN')
+            if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+                return jsonify({'error': 'Unauthorized'}), 401
+            body = metrics.render(pool_gauges(db.engines))
+            return Response(body, mimetype='text/plain; version=0.0.4')
+
     @app.route('/api/version', methods=['GET'])
     def version():
         return {'version': '1.0.0', 'build': 'MVP'}, 200